@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+resource_sampler.py — per-process GPU memory + RSS sampler shared by the
+llamafile tools (map_llm_memory, tune_llamafile)
+
+- ResourceSampler: one thread per probed process, ring-buffered samples with
+  peak / percentile / time-weighted average queries
+- GPU memory via one persistent NVML session per GPU set; only when pynvml
+  is unavailable, one long-lived `nvidia-smi -lms` reporting every
+  `smi_interval` seconds (no fork per sample)
+- RSS from /proc. The kernel exposes no per-process GPU memory under /proc,
+  so there is no /proc fallback for the GPU side: without NVML or nvidia-smi
+  only RSS is sampled
+- FakeNVML stands in for pynvml so the sampler can be exercised without a GPU
+
+The tools add this directory to sys.path and import from here.
+"""
+
+import atexit
+import os
+import re
+import subprocess
+import threading
+import time
+from array import array
+from pathlib import Path
+from shutil import which
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+# nvidia-smi report interval; matches the per-tool GPU monitors this replaced
+DEFAULT_SMI_INTERVAL_S = 0.1
+
+try:
+    import numpy as np  # optional: ring buffers and percentiles
+except ImportError:
+    np = None
+
+def _parse_kib_from_status_val(s: str) -> Optional[int]:
+    m = re.search(r"(\d+)\s*kB", s or "")
+    return int(m.group(1)) if m else None
+
+
+class RingBuffer:
+    """
+    Fixed-size (timestamp, value) store; once full, the oldest samples are
+    overwritten. numpy arrays when available, array('d') otherwise.
+    """
+    def __init__(self, capacity: int = 4096):
+        self.capacity = max(2, int(capacity))
+        if np is not None:
+            self._t = np.zeros(self.capacity)
+            self._v = np.zeros(self.capacity)
+        else:
+            self._t = array("d", bytes(8 * self.capacity))
+            self._v = array("d", bytes(8 * self.capacity))
+        self._n = 0  # samples ever appended
+
+    def __len__(self) -> int:
+        return min(self._n, self.capacity)
+
+    def append(self, t: float, v: float):
+        i = self._n % self.capacity
+        self._t[i] = t
+        self._v[i] = v
+        self._n += 1
+
+    def values(self):
+        """Buffered values, oldest first."""
+        n = len(self)
+        if self._n <= self.capacity:
+            return self._v[:n]
+        i = self._n % self.capacity
+        if np is not None:
+            return np.concatenate((self._v[i:], self._v[:i]))
+        return self._v[i:] + self._v[:i]
+
+class SampleSeries:
+    """
+    One metric: a ring buffer for percentiles over the recent window, plus a
+    running peak and time-weighted mean over the whole run (kept outside the
+    ring so they survive wrap-around).
+    """
+    def __init__(self, capacity: int = 4096):
+        self.ring = RingBuffer(capacity)
+        self.peak: Optional[float] = None
+        self._area = 0.0
+        self._span = 0.0
+        self._last: Optional[Tuple[float, float]] = None
+
+    def add(self, t: float, v: float):
+        if self._last is not None:
+            dt_s = t - self._last[0]
+            if dt_s > 0:
+                self._area += self._last[1] * dt_s  # value holds until the next sample
+                self._span += dt_s
+        self._last = (t, v)
+        self.peak = v if self.peak is None else max(self.peak, v)
+        self.ring.append(t, v)
+
+    def percentile(self, q: float) -> Optional[float]:
+        vals = self.ring.values()
+        if not len(vals):
+            return None
+        if np is not None:
+            return float(np.percentile(vals, q))
+        s = sorted(vals)
+        k = (len(s) - 1) * min(100.0, max(0.0, q)) / 100.0
+        lo = int(k)
+        hi = min(lo + 1, len(s) - 1)
+        return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+    def time_weighted_avg(self) -> Optional[float]:
+        if self._span > 0:
+            return self._area / self._span
+        return self._last[1] if self._last else None
+
+class NVMLBackend:
+    """
+    Persistent NVML session: per-process GPU memory (MiB) summed over
+    `gpu_indices` (None = all GPUs). `nvml` defaults to the pynvml module;
+    pass a FakeNVML to run without a GPU.
+    """
+    def __init__(self, gpu_indices: Optional[List[int]] = None, nvml=None):
+        if nvml is None:
+            import pynvml as nvml  # type: ignore  # ImportError -> caller falls back
+        self.nvml = nvml
+        nvml.nvmlInit()
+        indices = range(nvml.nvmlDeviceGetCount()) if gpu_indices is None else gpu_indices
+        self.handles = [nvml.nvmlDeviceGetHandleByIndex(i) for i in indices]
+        self._procs_v2 = hasattr(nvml, "nvmlDeviceGetComputeRunningProcesses_v2")
+
+    def _procs(self, handle):
+        if self._procs_v2:
+            try:
+                return self.nvml.nvmlDeviceGetComputeRunningProcesses_v2(handle)
+            except Exception:
+                self._procs_v2 = False  # older driver; use v1 from now on
+        return self.nvml.nvmlDeviceGetComputeRunningProcesses(handle)
+
+    def pid_used_mib(self, pid: int) -> Optional[float]:
+        total, ok = 0, False
+        for h in self.handles:
+            try:
+                procs = self._procs(h)
+            except Exception:
+                continue
+            ok = True
+            for p in procs:
+                if int(p.pid) == int(pid):
+                    total += int(getattr(p, "usedGpuMemory", 0) or 0)
+        return total / (1024 * 1024) if ok else None
+
+    def close(self):
+        try:
+            self.nvml.nvmlShutdown()
+        except Exception:
+            pass
+
+class SmiBackend:
+    """
+    nvidia-smi fallback: one `nvidia-smi --query-compute-apps ... -lms <ms>`
+    runs for the whole session and a reader thread keeps the latest MiB per
+    (GPU, pid), so a sample is a dict lookup rather than a fork. Rows that
+    haven't been refreshed for a few intervals (process left that GPU) are
+    ignored. `cmd` replaces the nvidia-smi command line (tests).
+    """
+    def __init__(self, gpu_indices: Optional[List[int]] = None, interval_s: float = DEFAULT_SMI_INTERVAL_S,
+                 cmd: Optional[List[str]] = None):
+        self.gpu_indices = gpu_indices
+        self.interval_s = max(0.01, float(interval_s))
+        self.stale_s = max(1.0, 3 * self.interval_s)
+        self.cmd = cmd or self.command(gpu_indices, self.interval_s)
+        self._latest: Dict[Tuple[str, int], Tuple[float, float]] = {}  # (gpu, pid) -> (seen at, MiB)
+        self._reporting = False
+        self._failed = False
+        self._lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+
+    @staticmethod
+    def command(gpu_indices: Optional[List[int]], interval_s: float) -> List[str]:
+        cmd = ["nvidia-smi", "--query-compute-apps=gpu_uuid,pid,used_memory", "--format=csv,noheader,nounits",
+               "-lms", str(max(1, int(round(interval_s * 1000))))]
+        if gpu_indices is not None:
+            cmd.insert(1, "--id=" + ",".join(str(i) for i in gpu_indices))
+        return cmd
+
+    def _ensure_running(self) -> bool:
+        if self._proc is None and not self._failed:
+            try:
+                self._proc = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                              text=True, bufsize=1)
+            except OSError:
+                self._failed = True
+                return False
+            threading.Thread(target=self._read, args=(self._proc,), daemon=True).start()
+        return self._proc is not None and self._proc.poll() is None
+
+    def _read(self, proc: subprocess.Popen):
+        for line in proc.stdout:
+            parts = [x.strip() for x in line.split(",")]
+            if len(parts) != 3:
+                continue
+            try:
+                key, mib = (parts[0], int(parts[1])), float(parts[2])
+            except ValueError:
+                continue
+            now = time.monotonic()
+            with self._lock:
+                self._reporting = True
+                self._latest[key] = (now, mib)
+                if len(self._latest) > 256:
+                    self._latest = {k: v for k, v in self._latest.items() if now - v[0] <= self.stale_s}
+
+    def pid_used_mib(self, pid: int) -> Optional[float]:
+        if not self._ensure_running():
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if not self._reporting:
+                return None
+            return float(sum(mib for (_gpu, p), (seen, mib) in self._latest.items()
+                             if p == int(pid) and now - seen <= self.stale_s))
+
+    def close(self):
+        proc, self._proc = self._proc, None
+        self._failed = True
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=1.0)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+class FakeNVML:
+    """
+    Stand-in for the pynvml module on GPU-less machines/CI:
+        NVMLBackend(nvml=FakeNVML({pid: [100, 900, 2400]}))
+    Each query replays the next value (MiB) for every pid, then holds the last one.
+    """
+    class _Proc:
+        def __init__(self, pid: int, used_bytes: int):
+            self.pid = pid
+            self.usedGpuMemory = used_bytes
+
+    def __init__(self, usage_mib: Dict[int, List[float]], device_count: int = 1, total_mib: int = 24576):
+        self.usage_mib = usage_mib
+        self.device_count = device_count
+        self.total_mib = total_mib
+        self._calls: Dict[int, int] = {}
+
+    def nvmlInit(self):
+        pass
+
+    def nvmlShutdown(self):
+        pass
+
+    def nvmlDeviceGetCount(self) -> int:
+        return self.device_count
+
+    def nvmlDeviceGetHandleByIndex(self, index: int) -> int:
+        return index
+
+    def nvmlDeviceGetComputeRunningProcesses(self, handle: int):
+        if handle != 0:
+            return []
+        procs = []
+        for pid, seq in self.usage_mib.items():
+            k = self._calls.get(pid, 0)
+            self._calls[pid] = k + 1
+            procs.append(self._Proc(pid, int(seq[min(k, len(seq) - 1)] * 1024 * 1024)))
+        return procs
+
+    def nvmlDeviceGetMemoryInfo(self, handle: int):
+        used = sum(seq[-1] for seq in self.usage_mib.values()) if handle == 0 else 0
+        mib = 1024 * 1024
+        return SimpleNamespace(total=self.total_mib * mib, used=int(used * mib), free=int((self.total_mib - used) * mib))
+
+_GPU_BACKENDS: Dict[Tuple[Optional[Tuple[int, ...]], float], object] = {}
+
+def shared_gpu_backend(gpu_indices: Optional[List[int]] = None, smi_interval: float = DEFAULT_SMI_INTERVAL_S):
+    """One NVML session per GPU set for the whole run (nvidia-smi if NVML is missing, else None)."""
+    key = (tuple(gpu_indices) if gpu_indices is not None else None, float(smi_interval))
+    if key not in _GPU_BACKENDS:
+        try:
+            _GPU_BACKENDS[key] = NVMLBackend(gpu_indices)
+        except Exception:
+            _GPU_BACKENDS[key] = SmiBackend(gpu_indices, smi_interval) if which("nvidia-smi") else None
+        if _GPU_BACKENDS[key] is not None:
+            atexit.register(_GPU_BACKENDS[key].close)
+    return _GPU_BACKENDS[key]
+
+class ResourceSampler(threading.Thread):
+    """
+    One thread samples a process's GPU memory and CPU RSS into ring buffers:
+    - GPU: shared NVML session (persistent handles); a looping nvidia-smi
+      reporting every `smi_interval` seconds only when NVML is unavailable
+    - RSS: /proc/<pid>/statm each tick; VmHWM from /proc/<pid>/status every
+      `hwm_every` ticks so spikes between ticks still count toward the peak
+    Query with peak() / percentile() / time_weighted_avg() on "gpu_mib" or "rss_mib".
+    """
+    def __init__(self, pid: int, interval: float = 0.05, capacity: int = 4096,
+                 gpu: bool = True, gpu_indices: Optional[List[int]] = None, gpu_backend=None,
+                 proc_root: str = "/proc", hwm_every: int = 10,
+                 smi_interval: float = DEFAULT_SMI_INTERVAL_S):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.series: Dict[str, SampleSeries] = {"gpu_mib": SampleSeries(capacity), "rss_mib": SampleSeries(capacity)}
+        self.gpu_backend = gpu_backend if gpu_backend is not None else (shared_gpu_backend(gpu_indices, smi_interval) if gpu else None)
+        self.proc_dir = Path(proc_root) / str(pid)
+        self.hwm_every = max(1, int(hwm_every))
+        self.hwm_kib = 0
+        self._page_mib = (os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096) / (1024 * 1024)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _read_rss_mib(self) -> Optional[float]:
+        try:
+            with open(self.proc_dir / "statm", "rb") as f:
+                return int(f.read().split()[1]) * self._page_mib
+        except Exception:
+            return None
+
+    def _read_hwm(self):
+        try:
+            txt = (self.proc_dir / "status").read_text()
+            m = re.search(r"^VmHWM:\s*(.+)$", txt, re.MULTILINE)
+            kib = _parse_kib_from_status_val(m.group(1)) if m else None
+            if kib is not None and kib > self.hwm_kib:
+                self.hwm_kib = kib
+        except Exception:
+            pass
+
+    def run(self):
+        tick = 0
+        while not self._stop_event.is_set():
+            t = time.monotonic()
+            if self.gpu_backend is not None:
+                v = self.gpu_backend.pid_used_mib(self.pid)
+                if v is not None:
+                    self.series["gpu_mib"].add(t, v)
+            rss = self._read_rss_mib()
+            if rss is not None:
+                self.series["rss_mib"].add(t, rss)
+            if tick % self.hwm_every == 0:
+                self._read_hwm()
+            tick += 1
+            self._stop_event.wait(self.interval)
+        self._read_hwm()
+
+    def peak(self, name: str) -> Optional[float]:
+        return self.series[name].peak
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        return self.series[name].percentile(q)
+
+    def time_weighted_avg(self, name: str) -> Optional[float]:
+        return self.series[name].time_weighted_avg()
+
+    @property
+    def peak_gpu_mib(self) -> Optional[int]:
+        p = self.peak("gpu_mib")
+        return int(p) if p else None
+
+    @property
+    def peak_rss_kib(self) -> Optional[int]:
+        p = self.peak("rss_mib")
+        kib = max(self.hwm_kib, int(p * 1024) if p else 0)
+        return kib or None
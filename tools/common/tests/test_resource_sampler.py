@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+from resource_sampler import (  # noqa: E402
+    DEFAULT_SMI_INTERVAL_S,
+    FakeNVML,
+    NVMLBackend,
+    ResourceSampler,
+    RingBuffer,
+    SampleSeries,
+    SmiBackend,
+)
+
+
+def test_fake_nvml_replays_usage_into_peak():
+    backend = NVMLBackend(nvml=FakeNVML({1234: [100, 900, 2400]}))
+    series = SampleSeries()
+    for t in range(5):
+        series.add(float(t), backend.pid_used_mib(1234))
+    assert series.peak == 2400
+    # 100 for 1s, 900 for 1s, then 2400 held for 2s
+    assert series.time_weighted_avg() == (100 + 900 + 2400 * 2) / 4
+    assert backend.pid_used_mib(999) == 0
+    backend.close()
+
+
+def test_ring_buffer_keeps_newest_values_after_wrap():
+    ring = RingBuffer(capacity=4)
+    for i in range(10):
+        ring.append(float(i), float(i))
+    assert len(ring) == 4
+    assert list(ring.values()) == [6.0, 7.0, 8.0, 9.0]
+
+
+def test_sampler_thread_with_fake_nvml_and_proc(tmp_path):
+    pid = 4321
+    proc = tmp_path / str(pid)
+    proc.mkdir()
+    (proc / "statm").write_text("1000 256 0 0 0 0 0\n")
+    (proc / "status").write_text("Name:\tllamafile\nVmHWM:\t  8192 kB\nVmRSS:\t  1024 kB\n")
+
+    backend = NVMLBackend(nvml=FakeNVML({pid: [100, 900, 2400]}))
+    mon = ResourceSampler(pid, interval=0.001, gpu_backend=backend, proc_root=str(tmp_path))
+    mon.start()
+    deadline = time.monotonic() + 5.0
+    while len(mon.series["gpu_mib"].ring) < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    mon.stop()
+    mon.join(timeout=1.0)
+
+    assert mon.peak_gpu_mib == 2400
+    assert mon.percentile("gpu_mib", 0) == 100
+    assert mon.peak_rss_kib == 8192  # VmHWM beats the sampled statm RSS
+
+
+def test_smi_backend_uses_one_looping_nvidia_smi(tmp_path):
+    assert SmiBackend.command([0], DEFAULT_SMI_INTERVAL_S)[-2:] == ["-lms", "100"]
+    launches = tmp_path / "launches"
+    fake_smi = tmp_path / "fake_smi.py"
+    fake_smi.write_text(
+        "import sys, time\n"
+        f"open({str(launches)!r}, 'a').write('x')\n"
+        "for used in (100, 900, 2400, 2400, 2400, 2400):\n"
+        "    print('GPU-0, 4321, %d' % used)\n"
+        "    print('GPU-1, 4321, 50')\n"
+        "    print('GPU-0, 77, 999')\n"
+        "    sys.stdout.flush()\n"
+        "    time.sleep(0.02)\n"
+        "time.sleep(30)\n"
+    )
+    smi = SmiBackend(interval_s=0.02, cmd=[sys.executable, str(fake_smi)])
+    seen = []
+    deadline = time.monotonic() + 5.0
+    while (not seen or seen[-1] != 2450) and time.monotonic() < deadline:
+        v = smi.pid_used_mib(4321)
+        if v is not None:
+            seen.append(v)
+        time.sleep(0.005)
+    proc = smi._proc
+    smi.close()
+    assert seen[-1] == 2450  # summed over both GPUs, other pids ignored
+    assert launches.read_text() == "x"  # sampled many times, forked once
+    assert proc.poll() is not None
+    assert smi.pid_used_mib(4321) is None
@@ -1,9 +1,23 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-cpu_pack_bench.py  (v1.1)
+cpu_pack_bench.py  (v1.2)
 CPU-only concurrency benchmark for llamafile/llama.cpp.
 
+What's new in v1.2
+- Topology-aware pinning (--layout cores|smt|roundrobin, default cores):
+  reads /sys/devices/system/cpu/*/topology, L3 cache sharing and
+  /sys/devices/system/node, gives every instance whole physical cores inside
+  one L3 domain where possible (else one NUMA node), and binds its memory to
+  that node with numactl --membind when the host has more than one node.
+- --sysfs-root points the topology reader at a fixture tree instead of /sys.
+- --search optimise: explores instances x threads/instance x layout with short
+  proxy packs, confirms the Pareto front at full length and writes pareto.csv
+  (aggregate tok/s vs slowest-stream tok/s, --min-tokps as the per-stream floor).
+- Packs are supervised from one selector loop (pipes + pidfd) instead of a
+  0.05 s poll; output is streamed to the log files live and a pack is killed
+  early when an instance OOMs, crashes, or drops below --min-tokps.
+
 What’s new in v1.1
 - Packs run CONCURRENTLY: for each (instances=m, threads/instance=tpi),
   start m processes together, pin to disjoint CPU sets, and wait for all.
@@ -29,6 +43,7 @@ import math
 import os
 import platform
 import re
+import selectors
 import shlex
 import statistics as stats
 import subprocess
@@ -295,27 +310,203 @@ def warmup_probe(args, outdir: Path, threads_probe: int) -> Dict[str, float]:
         "cmd": " ".join(shlex.quote(c) for c in cmd),
     }
 
-# --------------------------- CPU affinity planning ---------------------------
+# --------------------------- CPU topology (sysfs) ---------------------------
+
+def parse_cpulist(s: str) -> List[int]:
+    """Kernel cpulist format: '0-3,8,10-11' -> [0,1,2,3,8,10,11]."""
+    out: List[int] = []
+    for part in (s or "").strip().split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            a, b = part.split("-", 1)
+            out.extend(range(int(a), int(b) + 1))
+        else:
+            out.append(int(part))
+    return sorted(set(out))
 
-def plan_cpu_groups(num_instances: int, threads_per_instance: int, reserve_cores: int) -> Optional[List[List[int]]]:
-    logical = detect_logical_cpus()
-    avail_total = max(0, logical - reserve_cores)
-    need = num_instances * threads_per_instance
-    if need > avail_total:
+def _read_sysfs(path: Path) -> Optional[str]:
+    try:
+        return path.read_text().strip()
+    except Exception:
         return None
-    cpus = list(range(avail_total))  # reserve the last 'reserve_cores'
-    cpus = cpus[:need]
-    groups = [[] for _ in range(num_instances)]
-    for idx, cpu in enumerate(cpus):
-        groups[idx % num_instances].append(cpu)
-    for g in groups:
-        if len(g) != threads_per_instance:
+
+class PhysCore:
+    """One physical core: its logical CPUs (SMT siblings), L3 domain and NUMA node."""
+    def __init__(self, key: Tuple[int, int], cpus: List[int], l3: int, node: int):
+        self.key = key
+        self.cpus = sorted(cpus)
+        self.l3 = l3
+        self.node = node
+
+    @property
+    def first(self) -> int:
+        return self.cpus[0]
+
+class CpuTopology:
+    """
+    Physical cores grouped by NUMA node and L3 (last-level cache) domain,
+    read from <sysfs_root>/devices/system/{cpu,node}. Missing files degrade
+    gracefully: no siblings info -> one CPU per core, no cache info -> one L3
+    per package, no node dir -> everything on node 0.
+    """
+    def __init__(self, cores: List[PhysCore]):
+        self.cores = sorted(cores, key=lambda c: c.first)
+
+    @classmethod
+    def read(cls, sysfs_root: str = "/sys") -> "CpuTopology":
+        base = Path(sysfs_root) / "devices" / "system"
+        cpu_dir = base / "cpu"
+        online = _read_sysfs(cpu_dir / "online")
+        if online:
+            cpus = parse_cpulist(online)
+        else:
+            cpus = sorted(int(d.name[3:]) for d in cpu_dir.glob("cpu[0-9]*") if d.name[3:].isdigit())
+        if not cpus:
+            return cls.flat(detect_logical_cpus())
+
+        node_of: Dict[int, int] = {}
+        for nd in (base / "node").glob("node[0-9]*"):
+            for c in parse_cpulist(_read_sysfs(nd / "cpulist") or ""):
+                node_of[c] = int(nd.name[4:])
+
+        by_key: Dict[Tuple[int, int], PhysCore] = {}
+        for c in cpus:
+            cdir = cpu_dir / f"cpu{c}"
+            pkg = int(_read_sysfs(cdir / "topology" / "physical_package_id") or 0)
+            sib = (_read_sysfs(cdir / "topology" / "core_cpus_list")
+                   or _read_sysfs(cdir / "topology" / "thread_siblings_list"))
+            if sib:
+                key = (pkg, min(parse_cpulist(sib)))
+            else:
+                core_id = _read_sysfs(cdir / "topology" / "core_id")
+                key = (pkg, int(core_id)) if core_id is not None else (pkg, c)
+            l3 = None
+            for idx in cdir.glob("cache/index[0-9]*"):
+                if _read_sysfs(idx / "level") == "3":
+                    shared = parse_cpulist(_read_sysfs(idx / "shared_cpu_list") or "")
+                    l3 = min(shared) if shared else None
+                    break
+            core = by_key.get(key)
+            if core is None:
+                by_key[key] = PhysCore(key, [c], l3 if l3 is not None else -1 - pkg, node_of.get(c, 0))
+            else:
+                core.cpus = sorted(core.cpus + [c])
+        return cls(list(by_key.values()))
+
+    @classmethod
+    def flat(cls, logical: int) -> "CpuTopology":
+        return cls([PhysCore((0, c), [c], -1, 0) for c in range(logical)])
+
+    @property
+    def nodes(self) -> List[int]:
+        return sorted({c.node for c in self.cores})
+
+    @property
+    def threads_per_core(self) -> int:
+        return max((len(c.cpus) for c in self.cores), default=1)
+
+    def domains(self) -> Dict[Tuple[int, int], List[PhysCore]]:
+        out: Dict[Tuple[int, int], List[PhysCore]] = {}
+        for c in self.cores:
+            out.setdefault((c.node, c.l3), []).append(c)
+        return out
+
+    def summary(self) -> str:
+        return (f"{len(self.nodes)} NUMA node(s), {len(self.domains())} L3 domain(s), "
+                f"{len(self.cores)} cores, {sum(len(c.cpus) for c in self.cores)} CPUs "
+                f"({self.threads_per_core} thread(s)/core)")
+
+# --------------------------- CPU affinity planning ---------------------------
+
+LAYOUTS = ("cores", "smt", "roundrobin")
+
+class CpuGroup:
+    """CPUs one instance is pinned to, the NUMA nodes its memory should live on, and how tightly it was placed."""
+    def __init__(self, cpus: List[int], nodes: Optional[List[int]] = None, scope: str = "any"):
+        self.cpus = cpus
+        self.nodes = nodes
+        self.scope = scope  # l3 | node | any
+
+def plan_cpu_groups(num_instances: int, threads_per_instance: int, reserve_cores: int,
+                    topo: Optional[CpuTopology] = None, layout: str = "cores") -> Optional[List[CpuGroup]]:
+    """
+    layout=cores: one thread per physical core, siblings left idle but owned by the instance.
+    layout=smt:   ceil(tpi / threads_per_core) whole cores, all their siblings used.
+    layout=roundrobin: the pre-v1.2 logical-CPU round robin (no topology, no membind).
+    Instances are packed into one L3 domain when they fit, else one NUMA node, else
+    anywhere. Among domains that fit, the one with most free cores wins so instances
+    spread over caches/nodes. Returns None when there aren't enough cores.
+    """
+    if layout == "roundrobin" or topo is None:
+        logical = detect_logical_cpus() if topo is None else sum(len(c.cpus) for c in topo.cores)
+        avail_total = max(0, logical - reserve_cores)
+        need = num_instances * threads_per_instance
+        if need > avail_total:
             return None
+        cpus = list(range(avail_total))  # reserve the last 'reserve_cores'
+        cpus = cpus[:need]
+        groups = [[] for _ in range(num_instances)]
+        for idx, cpu in enumerate(cpus):
+            groups[idx % num_instances].append(cpu)
+        for g in groups:
+            if len(g) != threads_per_instance:
+                return None
+        return [CpuGroup(g) for g in groups]
+
+    cores = topo.cores[:max(0, len(topo.cores) - reserve_cores)]  # reserve the highest-numbered cores
+    per_core = topo.threads_per_core if layout == "smt" else 1
+    need = int(math.ceil(threads_per_instance / per_core))
+    if need * num_instances > len(cores):
+        return None
+
+    free: Dict[Tuple[int, int], List[PhysCore]] = {}
+    for c in cores:
+        free.setdefault((c.node, c.l3), []).append(c)
+
+    def take(keys: List[Tuple[int, int]], n: int) -> List[PhysCore]:
+        got: List[PhysCore] = []
+        # drain the fullest domains first so the remainder stays contiguous
+        for k in sorted(keys, key=lambda k: (-len(free[k]), k)):
+            while free[k] and len(got) < n:
+                got.append(free[k].pop(0))
+        return got
+
+    groups: List[CpuGroup] = []
+    placed: Dict[int, int] = {}  # instances per node, to alternate nodes on ties
+    for _ in range(num_instances):
+        fits = [k for k, v in free.items() if len(v) >= need]
+        if fits:
+            best = max(fits, key=lambda k: (len(free[k]), -placed.get(k[0], 0), -k[0], -k[1]))
+            chosen, scope = take([best], need), "l3"
+        else:
+            per_node: Dict[int, int] = {}
+            for (node, _l3), v in free.items():
+                per_node[node] = per_node.get(node, 0) + len(v)
+            node_fits = [n for n, cnt in per_node.items() if cnt >= need]
+            if node_fits:
+                node = max(node_fits, key=lambda n: (per_node[n], -n))
+                chosen, scope = take([k for k in free if k[0] == node], need), "node"
+            else:
+                chosen, scope = take(list(free), need), "any"
+        if layout == "smt":
+            cpus = [cpu for c in chosen for cpu in c.cpus][:threads_per_instance]
+        else:
+            cpus = [c.first for c in chosen]
+        for n in {c.node for c in chosen}:
+            placed[n] = placed.get(n, 0) + 1
+        groups.append(CpuGroup(sorted(cpus), sorted({c.node for c in chosen}), scope))
     return groups
 
 # --------------------------- concurrent pack run ---------------------------
 
 class RunningProc:
+    """
+    One child of a pack. stdout/stderr come back over pipes and are teed into the
+    usual log files by the pack supervisor, which also keeps a live view of the
+    instance (parsed tok/s, output rate, OOM markers) so a pack can be cut short.
+    """
     def __init__(self, proc: subprocess.Popen, mon: CPUProcessMonitor, stdout_path: Path, stderr_path: Path,
                  cpu_affinity: List[int], threads: int, cmd: List[str]):
         self.proc = proc
@@ -325,6 +516,65 @@ class RunningProc:
         self.cpu_affinity = cpu_affinity
         self.threads = threads
         self.cmd = cmd
+        self.files = {"out": open(stdout_path, "wb"), "err": open(stderr_path, "wb")}
+        self.open_pipes = {"out", "err"}
+        self.partial = {"out": b"", "err": b""}
+        self.pidfd: Optional[int] = None
+        self.t_start = time.time()
+        self.t_exit: Optional[float] = None
+        self.rc: Optional[int] = None
+        self.t_first_out: Optional[float] = None
+        self.out_bytes = 0
+        self.out_bytes_first = 0
+        self.live_tokps: Optional[float] = None
+        self.oom = False
+        self.killed_by_us = False
+
+    def feed(self, kind: str, data: bytes) -> None:
+        self.files[kind].write(data)
+        if kind == "out":
+            if self.t_first_out is None:
+                self.t_first_out = time.time()
+                self.out_bytes_first = len(data)
+            self.out_bytes += len(data)
+        # only complete lines are parsed; a timing line split across reads waits for its tail
+        buf = self.partial[kind] + data
+        lines, _, self.partial[kind] = buf.rpartition(b"\n")
+        if lines:
+            text = lines.decode("utf-8", errors="ignore")
+            toks = parse_tokps(text)
+            tok = toks["decode_tokps"] or toks["fallback_tokps"]
+            if tok is not None:
+                self.live_tokps = tok
+            if kind == "err" and RE_OOM.search(text):
+                self.oom = True
+
+    def est_tokps(self, now: float) -> Optional[float]:
+        """Parsed tok/s if the runner printed one, else stdout growth at ~BYTES_PER_TOKEN."""
+        if self.live_tokps is not None:
+            return self.live_tokps
+        if self.t_first_out is None or now - self.t_first_out <= 0:
+            return None
+        if self.out_bytes == self.out_bytes_first:
+            return None  # nothing streamed after the first chunk (prompt echo): runner doesn't stream, no estimate
+        return (self.out_bytes - self.out_bytes_first) / BYTES_PER_TOKEN / (now - self.t_first_out)
+
+    def close_pipe(self, kind: str) -> None:
+        self.open_pipes.discard(kind)
+        pipe = self.proc.stdout if kind == "out" else self.proc.stderr
+        try:
+            pipe.close()
+        except Exception:
+            pass
+        tail = self.partial[kind]
+        if tail:
+            self.partial[kind] = b""
+            self.feed(kind, tail + b"\n")
+        self.files[kind].close()
+
+    @property
+    def done(self) -> bool:
+        return self.rc is not None and not self.open_pipes
 
 class OneProcResult:
     def __init__(self, ok: bool, rc: int, tokps: Optional[float], wall_s: float,
@@ -341,11 +591,23 @@ class OneProcResult:
         self.threads = threads
         self.cpu_affinity = cpu_affinity
 
-def start_one(args, threads: int, run_tag: str, outdir: Path, cpu_affinity: List[int]) -> RunningProc:
+def membind_prefix(args, group: CpuGroup, multi_node: bool) -> List[str]:
+    """numactl --membind for multi-node hosts; affinity itself is set via sched_setaffinity."""
+    if args.membind == "off" or not group.nodes:
+        return []
+    if args.membind == "auto" and not multi_node:
+        return []
+    if not cmd_exists("numactl"):
+        return []
+    return ["numactl", "--membind=" + ",".join(str(n) for n in group.nodes), "--"]
+
+def start_one(args, threads: int, run_tag: str, outdir: Path, group: CpuGroup,
+              multi_node: bool = False) -> RunningProc:
     stdout_path = outdir / f"{run_tag}.stdout.txt"
     stderr_path = outdir / f"{run_tag}.stderr.txt"
     argv = build_base_argv(args, threads=threads)
-    cmd = compose_command(args.exec_via, str(args.binary), argv)
+    cmd = membind_prefix(args, group, multi_node) + compose_command(args.exec_via, str(args.binary), argv)
+    cpu_affinity = group.cpus
 
     env = os.environ.copy()
     env["CUDA_VISIBLE_DEVICES"] = ""
@@ -357,39 +619,42 @@ def start_one(args, threads: int, run_tag: str, outdir: Path, cpu_affinity: List
         except Exception:
             pass
 
-    fo = open(stdout_path, "w")
-    fe = open(stderr_path, "w")
-    proc = subprocess.Popen(cmd, stdout=fo, stderr=fe, env=env, preexec_fn=_preexec)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, preexec_fn=_preexec)
     mon = CPUProcessMonitor(proc.pid, interval=0.2); mon.start()
-    # Parent can close file objects; child's fds remain open
-    fo.close(); fe.close()
-    return RunningProc(proc=proc, mon=mon, stdout_path=stdout_path, stderr_path=stderr_path,
-                       cpu_affinity=cpu_affinity, threads=threads, cmd=cmd)
+    rp = RunningProc(proc=proc, mon=mon, stdout_path=stdout_path, stderr_path=stderr_path,
+                     cpu_affinity=cpu_affinity, threads=threads, cmd=cmd)
+    for pipe in (proc.stdout, proc.stderr):
+        os.set_blocking(pipe.fileno(), False)
+    if hasattr(os, "pidfd_open"):
+        try:
+            rp.pidfd = os.pidfd_open(proc.pid)
+        except OSError:
+            rp.pidfd = None  # kernel < 5.3; exits are picked up by poll() on the select timeout
+    return rp
 
 def finish_one(rp: RunningProc) -> OneProcResult:
-    t0 = time.time()
-    rc = rp.proc.wait()
     rp.mon.stop(); rp.mon.join(timeout=1.0)
-    wall = time.time() - t0  # wait time; not full run wall (we aggregate separately)
+    wall = (rp.t_exit or time.time()) - rp.t_start
     logs = read_merged(Path(rp.stdout_path), Path(rp.stderr_path))
     toks = parse_tokps(logs)
     tokps = toks["decode_tokps"] or toks["fallback_tokps"]
-    ok = (rc == 0 and tokps is not None)
+    ok = (rp.rc == 0 and tokps is not None and not rp.killed_by_us)
     cpu_peak_mib = (rp.mon.peak_kib // 1024) if rp.mon.peak_kib else None
-    return OneProcResult(ok=ok, rc=rc, tokps=tokps, wall_s=wall,
+    return OneProcResult(ok=ok, rc=rp.rc, tokps=tokps, wall_s=wall,
                          stdout_path=Path(rp.stdout_path), stderr_path=Path(rp.stderr_path),
                          cmd=rp.cmd, cpu_peak_mib=cpu_peak_mib,
                          threads=rp.threads, cpu_affinity=rp.cpu_affinity)
 
 class PackResult:
     def __init__(self, instances: int, threads_per_instance: int, procs: List[OneProcResult],
-                 started_at: str, start_time: float, end_time: float):
+                 started_at: str, start_time: float, end_time: float, abort_reason: Optional[str] = None):
         self.instances = instances
         self.threads_per_instance = threads_per_instance
         self.procs = procs
         self.started_at = started_at
         self.start_time = start_time
         self.end_time = end_time
+        self.abort_reason = abort_reason
 
     def aggregate(self) -> Dict[str, object]:
         ok_tok = [p.tokps for p in self.procs if p.ok and p.tokps is not None]
@@ -408,64 +673,135 @@ class PackResult:
             "wall_s_wait_median": float(stats.median(walls)) if walls else None,
             "rcs": rcs,
             "cpu_peak_mib_median": (float(stats.median(cpu_peaks)) if cpu_peaks else None),
+            "abort_reason": self.abort_reason,
             "stdout_paths": [p.stdout_path for p in self.procs],
             "stderr_paths": [p.stderr_path for p in self.procs],
         }
 
-def run_pack_concurrent(args, m: int, tpi: int, outdir: Path, groups: List[List[int]],
-                        stagger_ms: int, pack_timeout: int) -> PackResult:
+RE_OOM = re.compile(r"out of memory|failed to allocate|cannot allocate memory|std::bad_alloc|"
+                    r"unable to allocate|mmap failed|failed to mmap", re.IGNORECASE)
+BYTES_PER_TOKEN = 4.0  # rough English average; only used when the runner prints no tok/s
+
+def run_pack_concurrent(args, m: int, tpi: int, outdir: Path, groups: List[CpuGroup],
+                        stagger_ms: int, pack_timeout: int,
+                        min_tokps: float = 0.0, floor_grace_s: float = 20.0,
+                        multi_node: bool = False) -> PackResult:
+    """
+    Start m instances (staggered if asked) and supervise them from one selector:
+    pipes are drained as data arrives, exits arrive via pidfd where the kernel
+    has it, and the loop sleeps in select() instead of polling. The pack is
+    aborted (every survivor killed) as soon as one instance OOMs, exits
+    non-zero, or runs below min_tokps once floor_grace_s has passed since its
+    first output. A failing pack therefore costs seconds, not the full run.
+    """
     run_tag_base = f"m{m}_t{tpi}_{uuid.uuid4().hex[:8]}"
     runners: List[RunningProc] = []
+    sel = selectors.DefaultSelector()
     t_pack_start = time.time()
-
-    # Start all processes
-    for i in range(m):
-        tag = f"{run_tag_base}_p{i+1}"
-        rp = start_one(args, threads=tpi, run_tag=tag, outdir=outdir, cpu_affinity=groups[i])
-        runners.append(rp)
-        if stagger_ms > 0:
-            time.sleep(stagger_ms / 1000.0)
-
-    # Wait for all or until pack_timeout expires
     deadline = t_pack_start + pack_timeout if pack_timeout > 0 else None
-    finished: List[OneProcResult] = []
-    alive = set(range(m))
-
-    while alive:
-        for idx in list(alive):
-            p = runners[idx].proc
-            rc = p.poll()
-            if rc is not None:
-                res = finish_one(runners[idx])
-                finished.append(res)
-                alive.remove(idx)
-        if not alive:
-            break
-        if deadline and time.time() > deadline:
-            # Kill all remaining
-            for idx in alive:
+    next_start = t_pack_start
+    abort_reason: Optional[str] = None
+
+    def register(rp: RunningProc) -> None:
+        sel.register(rp.proc.stdout, selectors.EVENT_READ, (rp, "out"))
+        sel.register(rp.proc.stderr, selectors.EVENT_READ, (rp, "err"))
+        if rp.pidfd is not None:
+            sel.register(rp.pidfd, selectors.EVENT_READ, (rp, "exit"))
+
+    def reap(rp: RunningProc) -> None:
+        if rp.rc is not None:
+            return
+        rc = rp.proc.poll()
+        if rc is None:
+            return
+        rp.rc, rp.t_exit = rc, time.time()
+        if rp.pidfd is not None:
+            try:
+                sel.unregister(rp.pidfd)
+            except Exception:
+                pass
+            os.close(rp.pidfd)
+            rp.pidfd = None
+
+    def abort(reason: str) -> None:
+        nonlocal abort_reason
+        if abort_reason is not None:
+            return
+        abort_reason = reason
+        print(f"[abort] m={m}, tpi={tpi}: {reason}; killing the pack.", file=sys.stderr)
+        for rp in runners:
+            if rp.rc is None:
+                rp.killed_by_us = True
                 try:
-                    runners[idx].proc.kill()
+                    rp.proc.kill()
                 except Exception:
                     pass
-            # Finish them
-            for idx in alive:
-                try:
-                    res = finish_one(runners[idx])
-                except Exception:
-                    # fabricate a failed result
-                    rp = runners[idx]
-                    res = OneProcResult(ok=False, rc=-9, tokps=None, wall_s=0.0,
-                                        stdout_path=Path(rp.stdout_path), stderr_path=Path(rp.stderr_path),
-                                        cmd=rp.cmd, cpu_peak_mib=None, threads=rp.threads, cpu_affinity=rp.cpu_affinity)
-                finished.append(res)
-            alive.clear()
-            break
-        time.sleep(0.05)
 
+    while True:
+        now = time.time()
+        if abort_reason is None and len(runners) < m and now >= next_start:
+            i = len(runners)
+            rp = start_one(args, threads=tpi, run_tag=f"{run_tag_base}_p{i+1}", outdir=outdir, group=groups[i],
+                           multi_node=multi_node)
+            runners.append(rp)
+            register(rp)
+            next_start = now + stagger_ms / 1000.0
+            continue
+        if len(runners) == m or abort_reason is not None:
+            if all(rp.done for rp in runners):
+                break
+
+        timeout = 0.5
+        if len(runners) < m and abort_reason is None:
+            timeout = min(timeout, max(0.0, next_start - now))
+        if deadline and abort_reason is None:
+            timeout = min(timeout, max(0.0, deadline - now))
+        for key, _ in sel.select(timeout):
+            rp, kind = key.data
+            if kind == "exit":
+                reap(rp)
+                continue
+            try:
+                data = os.read(key.fd, 65536)
+            except BlockingIOError:
+                continue
+            if data:
+                rp.feed(kind, data)
+            else:
+                sel.unregister(key.fileobj)
+                rp.close_pipe(kind)
+
+        now = time.time()
+        for i, rp in enumerate(runners):
+            if rp.pidfd is None:
+                reap(rp)
+            if rp.rc is not None and rp.open_pipes and now - rp.t_exit > 2.0:
+                # a grandchild is holding the pipes open; don't wait on it
+                for kind in list(rp.open_pipes):
+                    try:
+                        sel.unregister(rp.proc.stdout if kind == "out" else rp.proc.stderr)
+                    except Exception:
+                        pass
+                    rp.close_pipe(kind)
+            if abort_reason is not None:
+                continue
+            if rp.oom:
+                abort(f"instance p{i+1} ran out of memory")
+            elif rp.rc is not None and rp.rc != 0:
+                abort(f"instance p{i+1} exited rc={rp.rc}" + (" (OOM killer?)" if rp.rc == -9 else ""))
+            elif min_tokps > 0 and rp.t_first_out is not None and now - rp.t_first_out >= floor_grace_s:
+                est = rp.est_tokps(now)
+                if est is not None and est < min_tokps:
+                    abort(f"instance p{i+1} at ~{est:.2f} tok/s < floor {min_tokps}")
+        if abort_reason is None and deadline and now > deadline:
+            abort(f"pack timeout {pack_timeout}s")
+
+    sel.close()
+    finished = [finish_one(rp) for rp in runners]
     t_pack_end = time.time()
     return PackResult(instances=m, threads_per_instance=tpi, procs=finished,
-                      started_at=now_iso_utc(), start_time=t_pack_start, end_time=t_pack_end)
+                      started_at=now_iso_utc(), start_time=t_pack_start, end_time=t_pack_end,
+                      abort_reason=abort_reason)
 
 # --------------------------- plan instance counts ---------------------------
 
@@ -488,6 +824,156 @@ def auto_instances(physical_cores: int) -> List[int]:
     cand = {3, 4, 6, 7, base-2, base-1, base, base+1, base+2}
     return sorted([n for n in cand if n >= 1])
 
+# --------------------------- one pack + optimiser ---------------------------
+
+def bench_pack(args, m: int, tpi: int, layout: str, topo: CpuTopology, outdir: Path,
+               per_inst_est: float, cap_mib: int, results_rows: List[Dict[str, object]],
+               phase: str = "full") -> Optional[Dict[str, object]]:
+    """Plan, run and record one (instances, threads/instance, layout) pack. phase='proxy' runs --proxy-n-predict tokens."""
+    groups = plan_cpu_groups(m, tpi, args.reserve_cores, topo=topo, layout=layout)
+    if groups is None:
+        print(f"[skip] m={m}, tpi={tpi}, layout={layout}: not enough CPUs after reserve")
+        return None
+    if layout != "roundrobin":
+        scopes = {g.scope for g in groups}
+        print(f"[plan] m={m}, tpi={tpi}, layout={layout}: placement "
+              f"{'/'.join(sorted(scopes))}, nodes {[g.nodes for g in groups]}")
+
+    run_args = args
+    if phase == "proxy":
+        run_args = argparse.Namespace(**vars(args))
+        run_args.n_predict = args.proxy_n_predict
+
+    print(f"[run] m={m}, tpi={tpi}{' (proxy)' if phase == 'proxy' else ''} -> starting {m} procs concurrently ...")
+    pack = run_pack_concurrent(run_args, m, tpi, outdir, groups,
+                               stagger_ms=args.stagger_ms,
+                               pack_timeout=(args.pack_timeout or args.timeout * 2),
+                               min_tokps=args.min_tokps,
+                               floor_grace_s=(min(args.floor_grace, args.proxy_floor_grace) if phase == "proxy"
+                                              else args.floor_grace),
+                               multi_node=len(topo.nodes) > 1)
+    agg = pack.aggregate()
+    print(f"[done] m={m}, tpi={tpi}: sum={agg['tokps_sum']} tok/s, "
+          f"median={agg['tokps_median']}, min={agg['tokps_min']}, "
+          f"max={agg['tokps_max']}, wall_pack_s={agg['wall_s_pack']}")
+
+    row = {
+        "timestamp": pack.started_at,
+        "mode": "cpu-pack",
+        "phase": phase,
+        "binary": str(args.binary),
+        "instances": m,
+        "threads_per_instance": tpi,
+        "layout": layout,
+        "tokps_sum": agg["tokps_sum"],
+        "tokps_median": agg["tokps_median"],
+        "tokps_min": agg["tokps_min"],
+        "tokps_max": agg["tokps_max"],
+        "wall_s_pack": agg["wall_s_pack"],
+        "ok_count": agg["ok_count"],
+        "prompt_len": len(args.prompt),
+        "n_predict": int(run_args.n_predict),
+        "per_instance_mem_mib_est": float(per_inst_est),
+        "total_mem_mib_est": float(per_inst_est * m),
+        "mem_cap_mib": int(cap_mib),
+        "abort_reason": agg["abort_reason"] or "",
+        "stdout_paths": ";".join(agg["stdout_paths"]),
+        "stderr_paths": ";".join(agg["stderr_paths"]),
+    }
+    results_rows.append(row)
+    return row
+
+PARETO_FIELDS = ["instances", "threads_per_instance", "layout", "phase", "tokps_sum", "tokps_min",
+                 "tokps_median", "meets_floor", "pareto"]
+
+def pareto_front(rows: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    """Rows not dominated on (aggregate tok/s, slowest stream tok/s); both higher-is-better."""
+    front = []
+    for r in rows:
+        dominated = any(
+            o is not r
+            and o["tokps_sum"] >= r["tokps_sum"] and o["tokps_min"] >= r["tokps_min"]
+            and (o["tokps_sum"] > r["tokps_sum"] or o["tokps_min"] > r["tokps_min"])
+            for o in rows)
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=lambda r: -r["tokps_sum"])
+
+def optimise_packs(args, inst_list: List[int], layouts: List[str], topo: CpuTopology, physical: int,
+                   bench) -> List[Dict[str, object]]:
+    """
+    Search instances x threads/instance x layout for the highest aggregate tok/s
+    whose slowest stream stays >= --min-tokps.
+
+    1) proxy: every candidate runs --proxy-n-predict tokens (model load dominates,
+       so this ranks packs for a fraction of the cost). Packs below the floor are
+       killed early by run_pack_concurrent (after --proxy-floor-grace). Per layout,
+       m stops growing once no tpi at that m meets the floor (per-stream speed only
+       drops with more instances) or once the best aggregate tok/s at m no longer
+       beats a smaller m, so a search without a floor doesn't bench every m.
+    2) confirm: the --confirm-top best proxy packs on the Pareto front rerun at full length.
+    bench(m, tpi, layout, phase) -> row is the single-pack runner (injectable).
+    Returns the Pareto table rows (proxy + full), best first.
+    """
+    floor = args.min_tokps
+    proxy_rows: List[Dict[str, object]] = []
+    for layout in layouts:
+        best_sum: Optional[float] = None
+        units = max(0, physical - args.reserve_cores) * (topo.threads_per_core if layout == "smt" else 1)
+        print(f"\n=== optimise layout={layout} ({units} CPU units) ===")
+        for m in sorted(set(inst_list)):
+            full = units // m
+            if full < args.threads_min:
+                break
+            tpis = sorted({min(args.threads_max, full) - d for d in range(args.ladder_span + 1)
+                           if min(args.threads_max, full) - d >= args.threads_min}, reverse=True)
+            rows = [r for r in (bench(m, tpi, layout, "proxy") for tpi in tpis) if r is not None]
+            good = [r for r in rows if r["ok_count"] == m and r["tokps_min"] is not None]
+            proxy_rows.extend(good)
+            if floor > 0 and not any(r["tokps_min"] >= floor for r in good):
+                print(f"[optimise] layout={layout}: no pack with m={m} meets {floor} tok/s/stream; stopping here.")
+                break
+            here = max((r["tokps_sum"] for r in good if r["tokps_sum"] is not None), default=None)
+            if here is None or (best_sum is not None and here <= best_sum):
+                print(f"[optimise] layout={layout}: m={m} doesn't raise aggregate tok/s "
+                      f"({here} vs {best_sum}); stopping here.")
+                break
+            best_sum = here
+
+    feasible = [r for r in proxy_rows if r["tokps_min"] >= floor] if floor > 0 else list(proxy_rows)
+    front = pareto_front(feasible)
+    confirm = front[:max(0, args.confirm_top)]
+    full_rows: List[Dict[str, object]] = []
+    if confirm:
+        print(f"\n=== optimise confirm: {[(r['instances'], r['threads_per_instance'], r['layout']) for r in confirm]} ===")
+    for r in confirm:
+        row = bench(r["instances"], r["threads_per_instance"], r["layout"], "full")
+        if row is not None and row["ok_count"] == row["instances"] and row["tokps_min"] is not None:
+            full_rows.append(row)
+
+    table: List[Dict[str, object]] = []
+    for phase, rows in (("full", full_rows), ("proxy", proxy_rows)):
+        on_front = {id(r) for r in pareto_front(rows)}
+        for r in sorted(rows, key=lambda r: -r["tokps_sum"]):
+            table.append(dict(r, meets_floor=(r["tokps_min"] >= floor), pareto=(id(r) in on_front)))
+
+    print("\n[optimise] Pareto table (aggregate vs slowest stream tok/s):")
+    print(f"  {'phase':<6} {'m':>3} {'tpi':>4} {'layout':<10} {'sum':>9} {'min/stream':>11}  floor  pareto")
+    for r in table:
+        if r["pareto"]:
+            print(f"  {r['phase']:<6} {r['instances']:>3} {r['threads_per_instance']:>4} {r['layout']:<10} "
+                  f"{r['tokps_sum']:>9.2f} {r['tokps_min']:>11.2f}  {'ok' if r['meets_floor'] else '--':<5}  *")
+    pool = [r for r in table if r["meets_floor"]]
+    pool = [r for r in pool if r["phase"] == "full"] or pool
+    if pool:
+        best = max(pool, key=lambda r: r["tokps_sum"])
+        print(f"[optimise] best: instances={best['instances']} threads/instance={best['threads_per_instance']} "
+              f"layout={best['layout']}  sum={best['tokps_sum']:.2f} tok/s  "
+              f"slowest stream={best['tokps_min']:.2f} tok/s ({best['phase']})")
+    else:
+        print(f"[optimise] no pack met the per-stream floor of {floor} tok/s.")
+    return table
+
 # --------------------------- main ---------------------------
 
 def main():
@@ -514,12 +1000,33 @@ def main():
     ap.add_argument("--threads-min", type=int, default=2)
     ap.add_argument("--threads-max", type=int, default=None)
     ap.add_argument("--ladder-span", type=int, default=2, help="Ladder ±span around base threads/instance.")
+    ap.add_argument("--layout", choices=list(LAYOUTS), default="cores",
+                    help="CPU pinning: cores = one thread per physical core inside one L3/NUMA domain (default); "
+                         "smt = use SMT siblings of whole cores; roundrobin = pre-v1.2 logical CPU round robin.")
+    ap.add_argument("--membind", choices=["auto", "on", "off"], default="auto",
+                    help="Bind each instance's memory to its NUMA node(s) via numactl (auto = only on multi-node hosts).")
+    ap.add_argument("--search", choices=["ladder", "optimise"], default="ladder",
+                    help="ladder: bench the given instance counts (default); optimise: search instances x threads x "
+                         "layout for max aggregate tok/s with every stream >= --min-tokps, and write pareto.csv.")
+    ap.add_argument("--layouts", default=None,
+                    help="optimise: comma list of layouts to search (default cores,smt on SMT hosts, else cores).")
+    ap.add_argument("--proxy-n-predict", type=int, default=32,
+                    help="optimise: tokens per instance for the cheap screening runs (default 32).")
+    ap.add_argument("--proxy-floor-grace", type=float, default=3.0,
+                    help="optimise: --floor-grace for the screening runs, which usually end well before 20s (default 3).")
+    ap.add_argument("--confirm-top", type=int, default=3,
+                    help="optimise: rerun this many Pareto-front packs at full --n-predict (default 3).")
+    ap.add_argument("--sysfs-root", default="/sys", help="Read CPU topology from this sysfs root (fixture trees for testing).")
 
     # system
     ap.add_argument("--outdir", default="cpu_pack_runs")
     ap.add_argument("--timeout", type=int, default=1800, help="Per-process timeout (seconds).")
     ap.add_argument("--pack-timeout", type=int, default=0, help="Optional group timeout for a whole pack (seconds). 0=disabled.")
     ap.add_argument("--stagger-ms", type=int, default=0, help="Delay between starting each process (ms).")
+    ap.add_argument("--min-tokps", type=float, default=0.0,
+                    help="Abort a pack as soon as any instance runs below this tok/s (0=disabled).")
+    ap.add_argument("--floor-grace", type=float, default=20.0,
+                    help="Seconds after an instance's first output before --min-tokps is enforced (default 20).")
     ap.add_argument("--mem-headroom", type=float, default=0.90, help="Use ≤ this fraction of MemAvailable (default 0.90).")
     ap.add_argument("--no-preflight", action="store_true")
 
@@ -528,10 +1035,16 @@ def main():
     if not args.no_preflight:
         preflight(args.binary, args.exec_via)
 
-    physical = detect_physical_cores()
-    logical = detect_logical_cpus()
+    topo = CpuTopology.read(args.sysfs_root)
+    physical = len(topo.cores)
+    logical = detect_logical_cpus() if args.sysfs_root == "/sys" else sum(len(c.cpus) for c in topo.cores)
+    multi_node = len(topo.nodes) > 1
     if args.threads_max is None:
         args.threads_max = physical
+    print(f"[topo] {topo.summary()}")
+    if args.membind == "on" or (args.membind == "auto" and multi_node):
+        if not cmd_exists("numactl"):
+            print("[topo] numactl not found; memory will not be NUMA-bound.", file=sys.stderr)
 
     outdir = Path(args.outdir); outdir.mkdir(parents=True, exist_ok=True)
 
@@ -549,7 +1062,8 @@ def main():
 
     # plan instances
     if args.instances.strip().lower() == "auto":
-        inst_list = auto_instances(physical)
+        inst_list = (list(range(1, max(1, physical - args.reserve_cores) + 1)) if args.search == "optimise"
+                     else auto_instances(physical))
     else:
         inst_list = parse_instances(args.instances)
 
@@ -585,81 +1099,46 @@ def main():
     print(f"[bench] instance counts:", inst_list)
 
     results_rows: List[Dict[str, object]] = []
-    best_by_instances: Dict[int, Dict[str, object]] = {}
 
-    for m in inst_list:
-        base_threads = max(args.threads_min, min(args.threads_max, (physical - args.reserve_cores) // m))
-        ladder = sorted(set(t for t in [base_threads + d for d in range(-args.ladder_span, args.ladder_span + 1)]
-                            if args.threads_min <= t <= args.threads_max))
-        print(f"\n=== instances {m} ===")
-        print(f"[plan] threads/instance ladder around base={base_threads}: {ladder}")
-
-        per_m_runs: List[Dict[str, object]] = []
-        for tpi in ladder:
-            groups = plan_cpu_groups(m, tpi, args.reserve_cores)
-            if groups is None:
-                print(f"[skip] m={m}, tpi={tpi}: not enough CPUs after reserve")
-                continue
+    def bench(m: int, tpi: int, layout: str, phase: str = "full") -> Optional[Dict[str, object]]:
+        return bench_pack(args, m, tpi, layout, topo, outdir, per_inst_est, cap_mib, results_rows, phase=phase)
 
-            print(f"[run] m={m}, tpi={tpi} -> starting {m} procs concurrently ...")
-            pack = run_pack_concurrent(args, m, tpi, outdir, groups,
-                                       stagger_ms=args.stagger_ms,
-                                       pack_timeout=(args.pack_timeout or args.timeout * 2))
-            agg = pack.aggregate()
-            agg.update({
-                "timestamp": pack.started_at,
-                "binary": str(args.binary),
-                "prompt_len": len(args.prompt),
-                "n_predict": int(args.n_predict),
-                "per_instance_mem_mib_est": float(per_inst_est),
-                "total_mem_mib_est": float(per_inst_est * m),
-                "mem_cap_mib": int(cap_mib),
-                "ok": (agg["ok_count"] == m)
-            })
-            per_m_runs.append(agg)
-
-            print(f"[done] m={m}, tpi={tpi}: sum={agg['tokps_sum']} tok/s, "
-                  f"median={agg['tokps_median']}, min={agg['tokps_min']}, "
-                  f"max={agg['tokps_max']}, wall_pack_s={agg['wall_s_pack']}")
-
-            results_rows.append({
-                "timestamp": agg["timestamp"],
-                "mode": "cpu-pack",
-                "binary": agg["binary"],
-                "instances": m,
-                "threads_per_instance": tpi,
-                "tokps_sum": agg["tokps_sum"],
-                "tokps_median": agg["tokps_median"],
-                "tokps_min": agg["tokps_min"],
-                "tokps_max": agg["tokps_max"],
-                "wall_s_pack": agg["wall_s_pack"],
-                "ok_count": agg["ok_count"],
-                "prompt_len": agg["prompt_len"],
-                "n_predict": agg["n_predict"],
-                "per_instance_mem_mib_est": agg["per_instance_mem_mib_est"],
-                "total_mem_mib_est": agg["total_mem_mib_est"],
-                "mem_cap_mib": agg["mem_cap_mib"],
-                "stdout_paths": ";".join(agg["stdout_paths"]),
-                "stderr_paths": ";".join(agg["stderr_paths"]),
-            })
-
-        if per_m_runs:
-            per_m_runs.sort(key=lambda r: (r["tokps_sum"] if r["tokps_sum"] is not None else -1,
-                                           -(r["wall_s_pack"] if r["wall_s_pack"] is not None else 1e9)), reverse=True)
-            best_by_instances[m] = {
-                "instances": m,
-                "best_threads_per_instance": per_m_runs[0]["threads_per_instance"],
-                "tokps_sum": per_m_runs[0]["tokps_sum"],
-                "tokps_median": per_m_runs[0]["tokps_median"],
-                "tokps_min": per_m_runs[0]["tokps_min"],
-                "tokps_max": per_m_runs[0]["tokps_max"],
-                "wall_s_pack": per_m_runs[0]["wall_s_pack"],
-                "per_instance_mem_mib_est": per_m_runs[0]["per_instance_mem_mib_est"],
-                "total_mem_mib_est": per_m_runs[0]["total_mem_mib_est"],
-            }
-            print(f"[best@m={m}] tpi={best_by_instances[m]['best_threads_per_instance']}  "
-                  f"sum={best_by_instances[m]['tokps_sum']}  "
-                  f"median={best_by_instances[m]['tokps_median']}")
+    pareto_rows: List[Dict[str, object]] = []
+    if args.search == "optimise":
+        layouts = [l.strip() for l in args.layouts.split(",") if l.strip()] if args.layouts else \
+                  (["cores", "smt"] if topo.threads_per_core > 1 else ["cores"])
+        pareto_rows = optimise_packs(args, inst_list, layouts, topo, physical, bench)
+    else:
+        for m in inst_list:
+            base_threads = max(args.threads_min, min(args.threads_max, (physical - args.reserve_cores) // m))
+            ladder = sorted(set(t for t in [base_threads + d for d in range(-args.ladder_span, args.ladder_span + 1)]
+                                if args.threads_min <= t <= args.threads_max))
+            print(f"\n=== instances {m} ===")
+            print(f"[plan] threads/instance ladder around base={base_threads}: {ladder}")
+            for tpi in ladder:
+                bench(m, tpi, args.layout)
+
+    best_by_instances: Dict[int, Dict[str, object]] = {}
+    for m in sorted({r["instances"] for r in results_rows}):
+        per_m_runs = [r for r in results_rows if r["instances"] == m and r["phase"] == "full"]
+        if not per_m_runs:
+            continue
+        per_m_runs.sort(key=lambda r: (r["tokps_sum"] if r["tokps_sum"] is not None else -1,
+                                       -(r["wall_s_pack"] if r["wall_s_pack"] is not None else 1e9)), reverse=True)
+        best_by_instances[m] = {
+            "instances": m,
+            "best_threads_per_instance": per_m_runs[0]["threads_per_instance"],
+            "tokps_sum": per_m_runs[0]["tokps_sum"],
+            "tokps_median": per_m_runs[0]["tokps_median"],
+            "tokps_min": per_m_runs[0]["tokps_min"],
+            "tokps_max": per_m_runs[0]["tokps_max"],
+            "wall_s_pack": per_m_runs[0]["wall_s_pack"],
+            "per_instance_mem_mib_est": per_m_runs[0]["per_instance_mem_mib_est"],
+            "total_mem_mib_est": per_m_runs[0]["total_mem_mib_est"],
+        }
+        print(f"[best@m={m}] tpi={best_by_instances[m]['best_threads_per_instance']}  "
+              f"sum={best_by_instances[m]['tokps_sum']}  "
+              f"median={best_by_instances[m]['tokps_median']}")
 
     results_csv = outdir / "results.csv"
     best_csv = outdir / "best_by_instances.csv"
@@ -667,11 +1146,11 @@ def main():
 
     with results_csv.open("w", newline="") as f:
         w = csv.DictWriter(f, fieldnames=[
-            "timestamp","mode","binary","instances","threads_per_instance",
+            "timestamp","mode","phase","binary","instances","threads_per_instance","layout",
             "tokps_sum","tokps_median","tokps_min","tokps_max","wall_s_pack",
             "ok_count","prompt_len","n_predict",
             "per_instance_mem_mib_est","total_mem_mib_est","mem_cap_mib",
-            "stdout_paths","stderr_paths"
+            "abort_reason","stdout_paths","stderr_paths"
         ])
         w.writeheader()
         for r in results_rows:
@@ -690,10 +1169,19 @@ def main():
     with results_json.open("w") as f:
         json.dump(results_rows, f, indent=2)
 
+    if pareto_rows:
+        with (outdir / "pareto.csv").open("w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=PARETO_FIELDS)
+            w.writeheader()
+            for r in pareto_rows:
+                w.writerow({k: r.get(k) for k in PARETO_FIELDS})
+
     print("\n[pack] done.")
     print(f"[pack] all runs:       {results_csv}")
     print(f"[pack] best per m:     {best_csv}")
     print(f"[pack] all runs (json):{results_json}")
+    if pareto_rows:
+        print(f"[pack] pareto table:   {outdir / 'pareto.csv'}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,80 @@
+import os
+import sys
+from types import SimpleNamespace
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+from cpu_pack_bench import CpuTopology, optimise_packs, pareto_front  # noqa: E402
+
+
+def _row(m, tpi, tokps_sum, tokps_min, layout="cores", phase="proxy"):
+    return {"instances": m, "threads_per_instance": tpi, "layout": layout, "phase": phase,
+            "tokps_sum": tokps_sum, "tokps_min": tokps_min, "ok_count": m}
+
+
+def _args(**kw):
+    base = dict(min_tokps=0.0, reserve_cores=0, threads_min=1, threads_max=16, ladder_span=1, confirm_top=2)
+    base.update(kw)
+    return SimpleNamespace(**base)
+
+
+class FakeBench:
+    """Aggregate tok/s peaks at 4 instances; each stream gets an equal share."""
+    PEAK = {1: 10.0, 2: 18.0, 3: 24.0, 4: 26.0, 5: 25.0, 6: 23.0, 7: 20.0, 8: 16.0}
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, m, tpi, layout, phase):
+        self.calls.append((m, tpi, layout, phase))
+        total = self.PEAK[m] - 0.1 * (16 // m - tpi)  # fewer threads than the full share is a bit slower
+        return _row(m, tpi, total, total / m, layout, phase)
+
+
+def test_pareto_front_keeps_only_undominated_rows():
+    a = _row(1, 8, 10.0, 10.0)
+    b = _row(2, 4, 18.0, 9.0)
+    c = _row(3, 2, 17.0, 5.0)   # dominated by b
+    d = _row(4, 2, 20.0, 5.0)
+    e = _row(4, 2, 20.0, 5.0)   # equal to d: neither dominates
+    assert pareto_front([a, b, c, d, e]) == [d, e, b, a]
+    assert pareto_front([]) == []
+
+
+def test_optimise_stops_growing_m_once_aggregate_stops_improving():
+    bench = FakeBench()
+    table = optimise_packs(_args(), list(range(1, 9)), ["cores"], CpuTopology.flat(16), 16, bench)
+    proxy_ms = sorted({m for m, _t, _l, phase in bench.calls if phase == "proxy"})
+    assert proxy_ms == [1, 2, 3, 4, 5]  # 5 is worse than 4, so 6..8 are never loaded
+    assert {(m, t) for m, t, _l, p in bench.calls if p == "proxy" and m == 4} == {(4, 4), (4, 3)}
+    full = [(m, t) for m, t, _l, phase in bench.calls if phase == "full"]
+    assert len(full) == 2 and full[0] == (4, 4)
+    best = max((r for r in table if r["phase"] == "full"), key=lambda r: r["tokps_sum"])
+    assert (best["instances"], best["threads_per_instance"]) == (4, 4)
+
+
+def test_optimise_floor_limits_instances_and_feasible_set():
+    bench = FakeBench()
+    # 2 instances give 9 tok/s per stream, 3 give 8: nothing past 2 meets a floor of 8.5
+    table = optimise_packs(_args(min_tokps=8.5, confirm_top=5), list(range(1, 9)), ["cores"],
+                           CpuTopology.flat(16), 16, bench)
+    assert max(m for m, _t, _l, _p in bench.calls) == 3
+    assert {m for m, _t, _l, p in bench.calls if p == "full"} <= {1, 2}
+    assert all(r["meets_floor"] == (r["tokps_min"] >= 8.5) for r in table)
+
+
+def test_optimise_keeps_failed_packs_out_of_the_table():
+    def bench(m, tpi, layout, phase):
+        if m == 2 and tpi == 4:
+            return None  # could not be placed
+        row = _row(m, tpi, 10.0 * m, 10.0, layout, phase)
+        if m == 3:
+            row["ok_count"] = 2  # one instance died
+        return row
+
+    table = optimise_packs(_args(), [1, 2, 3, 4], ["cores"], CpuTopology.flat(8), 8, bench)
+    assert sorted((r["instances"], r["threads_per_instance"]) for r in table if r["phase"] == "proxy") == \
+        [(1, 7), (1, 8), (2, 3)]
@@ -0,0 +1,35 @@
+import os
+import selectors
+import sys
+from types import SimpleNamespace
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+import cpu_pack_bench  # noqa: E402
+from cpu_pack_bench import CpuGroup, run_pack_concurrent  # noqa: E402
+
+
+class CountingSelector(selectors.DefaultSelector):
+    calls = 0
+
+    def select(self, timeout=None):
+        CountingSelector.calls += 1
+        return super().select(timeout)
+
+
+def test_timed_out_pack_waits_for_stragglers_without_spinning(tmp_path, monkeypatch):
+    # the runner leaves a grandchild holding its pipes, so the pack outlives its deadline
+    binary = tmp_path / "runner.sh"
+    binary.write_text("#!/bin/sh\nsleep 4 &\nexec sleep 30\n")
+    binary.chmod(0o755)
+    args = SimpleNamespace(model=None, n_predict=8, seed=1, prompt="p", ctx_size=0, temp=None, top_p=None,
+                           top_k=None, extra_args="", exec_via="direct", binary=binary, membind="off")
+    monkeypatch.setattr(cpu_pack_bench.selectors, "DefaultSelector", CountingSelector)
+    pack = run_pack_concurrent(args, 1, 1, tmp_path, [CpuGroup(sorted(os.sched_getaffinity(0)))],
+                               stagger_ms=0, pack_timeout=1)
+    assert pack.aggregate()["abort_reason"] == "pack timeout 1s"
+    # ~1s to the deadline plus the 2s pipe grace, at one select per 0.5s
+    assert CountingSelector.calls < 20
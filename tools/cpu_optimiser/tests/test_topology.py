@@ -0,0 +1,74 @@
+import os
+import sys
+from types import SimpleNamespace
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+import cpu_pack_bench  # noqa: E402
+from cpu_pack_bench import CpuTopology, membind_prefix, parse_cpulist, plan_cpu_groups  # noqa: E402
+
+# 2 NUMA nodes x 2 L3 domains x 2 cores, SMT2: core N owns CPUs N and N+8
+TWO_NODE = os.path.join(THIS_DIR, "fixtures", "sysfs_2node_smt2")
+# 1 NUMA node, 1 L3 domain, 4 cores, no SMT
+ONE_NODE = os.path.join(THIS_DIR, "fixtures", "sysfs_1node")
+
+
+def test_parse_cpulist():
+    assert parse_cpulist("0-3,8,10-11") == [0, 1, 2, 3, 8, 10, 11]
+    assert parse_cpulist("") == []
+
+
+def test_smt_siblings_pair_into_one_core():
+    topo = CpuTopology.read(TWO_NODE)
+    assert [c.cpus for c in topo.cores] == [[n, n + 8] for n in range(8)]
+    assert topo.threads_per_core == 2
+    assert topo.nodes == [0, 1]
+    assert sorted(topo.domains()) == [(0, 0), (0, 2), (1, 4), (1, 6)]
+    assert topo.summary() == "2 NUMA node(s), 4 L3 domain(s), 8 cores, 16 CPUs (2 thread(s)/core)"
+
+
+def test_instances_pack_within_one_l3_domain():
+    topo = CpuTopology.read(TWO_NODE)
+    groups = plan_cpu_groups(2, 2, 0, topo=topo, layout="cores")
+    # one thread per physical core, each instance inside one L3, spread over nodes
+    assert [(g.cpus, g.nodes, g.scope) for g in groups] == [([0, 1], [0], "l3"), ([4, 5], [1], "l3")]
+
+    groups = plan_cpu_groups(2, 4, 0, topo=topo, layout="smt")
+    # two whole cores per instance, siblings included
+    assert [(g.cpus, g.scope) for g in groups] == [([0, 1, 8, 9], "l3"), ([4, 5, 12, 13], "l3")]
+
+
+def test_numa_fallback_when_l3_domain_is_too_small():
+    topo = CpuTopology.read(TWO_NODE)
+    groups = plan_cpu_groups(2, 3, 0, topo=topo, layout="cores")
+    assert [(g.cpus, g.nodes, g.scope) for g in groups] == [([0, 1, 2], [0], "node"), ([4, 5, 6], [1], "node")]
+
+    (g,) = plan_cpu_groups(1, 6, 0, topo=topo, layout="cores")
+    assert (len(g.cpus), g.nodes, g.scope) == (6, [0, 1], "any")
+
+    assert plan_cpu_groups(3, 3, 0, topo=topo, layout="cores") is None
+
+
+def test_membind_follows_the_group_nodes_on_multi_node_hosts(monkeypatch):
+    monkeypatch.setattr(cpu_pack_bench, "cmd_exists", lambda name: True)
+    topo = CpuTopology.read(TWO_NODE)
+    groups = plan_cpu_groups(2, 3, 0, topo=topo, layout="cores")
+    assert membind_prefix(SimpleNamespace(membind="auto"), groups[1], len(topo.nodes) > 1) == \
+        ["numactl", "--membind=1", "--"]
+    assert membind_prefix(SimpleNamespace(membind="off"), groups[1], True) == []
+
+
+def test_single_node_host_skips_membind(monkeypatch):
+    monkeypatch.setattr(cpu_pack_bench, "cmd_exists", lambda name: True)
+    topo = CpuTopology.read(ONE_NODE)
+    assert topo.nodes == [0]
+    assert topo.threads_per_core == 1
+
+    # reserve the last core; the rest still packs into the single L3
+    groups = plan_cpu_groups(1, 3, 1, topo=topo, layout="cores")
+    assert [(g.cpus, g.nodes, g.scope) for g in groups] == [([0, 1, 2], [0], "l3")]
+    assert membind_prefix(SimpleNamespace(membind="auto"), groups[0], len(topo.nodes) > 1) == []
+    assert membind_prefix(SimpleNamespace(membind="on"), groups[0], False) == ["numactl", "--membind=0", "--"]
@@ -0,0 +1,104 @@
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+from tune_llamafile import HalvingSearch, RunResult, coarse_levels, halving_configs  # noqa: E402
+
+
+class FakeRunner:
+    """run_fn for HalvingSearch: tok/s comes from `speed(cfg)`; None means the run fails."""
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.calls = []
+
+    def __call__(self, cfg, run_id):
+        self.calls.append(cfg)
+        tokps = self.speed(cfg)
+        ngl, threads, batch, ctx = cfg
+        return RunResult(ok=tokps is not None, rc=0 if tokps is not None else 1, wall_s=1.0,
+                         ngl=ngl, threads=threads, decode_tokps=tokps, prompt_tokps=None, fallback_tokps=None,
+                         gpu_peak_mib=None, cpu_peak_kib=None, offloaded_layers=None, total_layers=None,
+                         n_predict=16, prompt_len=4, stdout_path=Path("out"), stderr_path=Path("err"),
+                         cmd=[], started_at=run_id, batch=batch, ctx=ctx)
+
+
+def _search(speed, max_repeats=3, eta=3):
+    runner = FakeRunner(speed)
+    return HalvingSearch(runner, max_repeats=max_repeats, eta=eta, log=lambda msg: None), runner
+
+
+def _grid(ngls, threads):
+    return [(n, t, None, None) for n in ngls for t in threads]
+
+
+def test_coarse_levels_keep_both_ends():
+    assert coarse_levels(list(range(1, 34)), 4) == [1, 12, 22, 33]
+    assert coarse_levels([8, 4, 4, 16], 5) == [4, 8, 16]
+    assert coarse_levels([3, 9, 6], 1) == [9]
+
+
+def test_halving_configs_subsample_keeps_the_all_offload_corner():
+    args = SimpleNamespace(halving_ngl_levels=3, batch=None, ctx="2048,4096", halving_max_configs=32, seed=7)
+    full = halving_configs(args, list(range(0, 21)), [8, 12])
+    assert len(full) == 12 and {c[0] for c in full} == {0, 10, 20} and {c[3] for c in full} == {2048, 4096}
+
+    args.halving_max_configs = 5
+    small = halving_configs(args, list(range(0, 21)), [8, 12])
+    assert len(small) == 5 and len(set(small)) == 5
+    assert small[0][0] == 20 and set(small) <= set(full)
+    assert halving_configs(args, list(range(0, 21)), [8, 12]) == small  # seeded
+
+    args.halving_max_configs = 1
+    assert halving_configs(args, list(range(0, 21)), [8, 12]) == [(20, 8, None, 2048)]
+
+
+def test_rungs_shrink_by_eta_and_only_survivors_get_repeats():
+    configs = _grid([0, 10, 20, 30], [4, 6, 8, 10])
+    search, runner = _search(lambda c: c[0] + c[1] / 10.0)
+    assert search.run(configs) == (30, 10, None, None)
+    assert [(r["candidates"], r["repeats"]) for r in search.rungs] == [(16, 1), (6, 3), (2, 3), (1, 3)]
+    runs = Counter(runner.calls)
+    survivors = sorted(configs, key=lambda c: -(c[0] + c[1] / 10.0))[:6]
+    assert all(runs[c] == 3 for c in survivors)
+    assert all(runs[c] == 1 for c in configs if c not in survivors)
+    assert len(search.results) == 16 + 6 * 2
+
+
+def test_ties_go_to_fewer_layers_then_fewer_threads():
+    search, _ = _search(lambda c: 50.0)
+    assert search.run(_grid([10, 20], [8, 4])) == (10, 4, None, None)
+
+
+def test_failed_configs_are_never_run_again():
+    def speed(c):
+        return None if c[1] == 4 else float(c[0] + c[1])
+
+    configs = _grid([10, 20], [4, 8, 12])
+    search, runner = _search(speed, max_repeats=2, eta=2)
+    assert search.run(configs) == (20, 12, None, None)
+    runs = Counter(runner.calls)
+    assert runs[(10, 4, None, None)] == runs[(20, 4, None, None)] == 1
+    assert all(r["survivors"] <= 4 for r in search.rungs)
+    # failed trials during ngl refinement are not topped up either
+    search.refine_ngl((20, 12, None, None), list(range(10, 31)), [10, 20, 30])
+    assert all(n == 1 for c, n in Counter(runner.calls).items() if c[1] == 4)
+
+
+def test_refine_ngl_bisects_to_the_peak_between_coarse_levels():
+    ngl_list = list(range(0, 33))
+    tested = coarse_levels(ngl_list, 4)  # [0, 11, 21, 32]
+    for peak in (5, 14, 27, 32):
+        search, runner = _search(lambda c, peak=peak: 100.0 - abs(c[0] - peak), max_repeats=2)
+        best = search.run(_grid(tested, [8]))
+        refined = search.refine_ngl(best, ngl_list, tested)
+        assert refined == (peak, 8, None, None), (peak, best)
+        # a bisection, not a sweep of every ngl in the bracket
+        assert len({c[0] for c in runner.calls} - set(tested)) <= 8
@@ -1,9 +1,21 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-tune_llamafile.py  (v4.0)
+tune_llamafile.py  (v4.1)
 Benchmark a llamafile or llama.cpp binary across -ngl (GPU-offloaded layers) and CPU threads.
 
+New in v4.1
+- Tuning cache (--cache, on by default):
+    * Keyed by model hash, GPU name/VRAM/driver, CPU model, core counts and runner --version.
+    * A cached best config for the same workload is returned without running anything (--refresh re-measures).
+    * Cached probes skip probe_ngl_bounds; cached per-ngl threads warm-start hill-climb / halving.
+- Successive-halving search (--search halving, default):
+    * Runs a coarse sample of (ngl, threads[, batch, ctx]) once each, keeps the top 1/eta,
+      and spends extra repeats only on the survivors; then bisects ngl around the winner.
+    * --batch / --ctx add -b / -c values to the search space.
+    * --search ladder keeps the old per-ngl sweep + hill-climb.
+    * Writes search_summary.json alongside the usual CSV/JSON outputs.
+
 New in v4.0
 - AUTO NGL detection:
     * If --ngl is 'auto' (default), run fast probes with ngl=1 and (if possible) ngl=2 to detect:
@@ -31,14 +43,16 @@ import datetime as dt
 import json
 import os
 import platform
+import random
 import re
 import shlex
 import statistics as stats
 import subprocess
 import sys
-import threading
 import time
 import errno
+import hashlib
+import sqlite3
 from types import SimpleNamespace
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
@@ -54,9 +68,8 @@ ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
 def strip_ansi(s: str) -> str:
     return ANSI_RE.sub("", s or "")
 
-def _parse_kib_from_status_val(s: str) -> Optional[int]:
-    m = re.search(r"(\d+)\s*kB", s or "")
-    return int(m.group(1)) if m else None
+def now_iso() -> str:
+    return dt.datetime.now().isoformat(timespec="seconds")
 
 def round_to_even(x: int) -> int:
     return x if x % 2 == 0 else x - 1 if x > 1 else x
@@ -136,114 +149,13 @@ def detect_physical_cores() -> int:
     logical = os.cpu_count() or 1
     return max(1, logical // 2)
 
-# --------------------------- CPU RSS monitor ---------------------------
-
-class CPUProcessMonitor(threading.Thread):
-    """
-    Polls /proc/<pid>/status for VmRSS / VmHWM and keeps the peak (KiB).
-    """
-    def __init__(self, pid: int, interval: float = 0.25):
-        super().__init__(daemon=True)
-        self.pid = pid
-        self.interval = interval
-        self._stop_event = threading.Event()
-        self.peak_kib = 0
-
-    def stop(self):
-        self._stop_event.set()
-
-    def run(self):
-        status_path = Path(f"/proc/{self.pid}/status")
-        while not self._stop_event.is_set():
-            try:
-                txt = status_path.read_text()
-                m_hwm = re.search(r"^VmHWM:\s*(.+)$", txt, re.MULTILINE)
-                m_rss = re.search(r"^VmRSS:\s*(.+)$", txt, re.MULTILINE)
-                kib = None
-                if m_hwm:
-                    kib = _parse_kib_from_status_val(m_hwm.group(1))
-                if kib is None and m_rss:
-                    kib = _parse_kib_from_status_val(m_rss.group(1))
-                if kib is not None and kib > self.peak_kib:
-                    self.peak_kib = kib
-            except Exception:
-                pass
-            self._stop_event.wait(self.interval)
-
-# --------------------------- GPU memory monitor + VRAM total ---------------------------
-
-class GPUMonitor(threading.Thread):
-    """
-    Polls nvidia-smi (or NVML if available) to track per-process GPU memory.
-    Records peak used memory (MiB) for the target pid on a given GPU index.
-    """
-    def __init__(self, pid: int, gpu_index: int = 0, interval: float = 0.25):
-        super().__init__(daemon=True)
-        self.pid = pid
-        self.gpu_index = gpu_index
-        self.interval = interval
-        self._stop_event = threading.Event()
-        self.peak_mib = 0
-        self._use_nvml = False
-        try:
-            import pynvml  # optional
-            self.pynvml = pynvml
-            self.pynvml.nvmlInit()
-            self._handle = self.pynvml.nvmlDeviceGetHandleByIndex(gpu_index)
-            self._use_nvml = True
-        except Exception:
-            self._use_nvml = False
-
-    def stop(self):
-        self._stop_event.set()
-
-    def _poll_nvml(self):
-        try:
-            try:
-                procs = self.pynvml.nvmlDeviceGetComputeRunningProcesses_v2(self._handle)
-            except Exception:
-                procs = self.pynvml.nvmlDeviceGetComputeRunningProcesses(self._handle)
-            for p in procs:
-                if int(p.pid) == int(self.pid):
-                    used = getattr(p, "usedGpuMemory", 0)
-                    if used and used > self.peak_mib * 1024 * 1024:
-                        self.peak_mib = int(used // (1024 * 1024))
-        except Exception:
-            pass
+# --------------------------- resource sampler (GPU memory + RSS) ---------------------------
 
-    def _poll_nvidia_smi(self):
-        try:
-            out = subprocess.run(
-                ["nvidia-smi",
-                 f"--id={self.gpu_index}",
-                 "--query-compute-apps=pid,used_memory",
-                 "--format=csv,noheader,nounits"],
-                capture_output=True, text=True, timeout=1.0
-            )
-            if out.returncode != 0:
-                return
-            for line in out.stdout.strip().splitlines():
-                parts = [x.strip() for x in line.split(",")]
-                if len(parts) != 2:
-                    continue
-                pid_str, mem_str = parts
-                try:
-                    if int(pid_str) == int(self.pid):
-                        used_mib = int(mem_str)
-                        if used_mib > self.peak_mib:
-                            self.peak_mib = used_mib
-                except Exception:
-                    continue
-        except Exception:
-            pass
+# shared with the other llamafile tools: tools/common/resource_sampler.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "common"))
+from resource_sampler import DEFAULT_SMI_INTERVAL_S, ResourceSampler  # noqa: E402
 
-    def run(self):
-        while not self._stop_event.is_set():
-            if self._use_nvml:
-                self._poll_nvml()
-            elif cmd_exists("nvidia-smi"):
-                self._poll_nvidia_smi()
-            self._stop_event.wait(self.interval)
+# --------------------------- VRAM total ---------------------------
 
 def detect_total_vram_mib(gpu_index: int = 0) -> Optional[int]:
     # NVML first
@@ -361,12 +273,15 @@ class RunResult:
                  gpu_peak_mib: Optional[int], cpu_peak_kib: Optional[int],
                  offloaded_layers: Optional[int], total_layers: Optional[int],
                  n_predict: int, prompt_len: int,
-                 stdout_path: Path, stderr_path: Path, cmd: List[str], started_at: str):
+                 stdout_path: Path, stderr_path: Path, cmd: List[str], started_at: str,
+                 batch: Optional[int] = None, ctx: Optional[int] = None):
         self.ok = ok
         self.rc = rc
         self.wall_s = wall_s
         self.ngl = ngl
         self.threads = threads
+        self.batch = batch
+        self.ctx = ctx
         self.decode_tokps = decode_tokps
         self.prompt_tokps = prompt_tokps
         self.fallback_tokps = fallback_tokps
@@ -409,7 +324,8 @@ class RunResult:
 
 # ------------------------------ command build ---------------------------------
 
-def build_base_argv(args, ngl: int, threads: int, n_predict_override: Optional[int] = None, prompt_override: Optional[str] = None) -> List[str]:
+def build_base_argv(args, ngl: int, threads: int, n_predict_override: Optional[int] = None, prompt_override: Optional[str] = None,
+                    batch: Optional[int] = None, ctx: Optional[int] = None) -> List[str]:
     argv = []
     if args.model:
         argv += ["-m", str(args.model)]
@@ -420,8 +336,11 @@ def build_base_argv(args, ngl: int, threads: int, n_predict_override: Optional[i
         "-s", str(args.seed),
         "-p", (prompt_override if prompt_override is not None else args.prompt),
     ]
-    if args.ctx_size:
-        argv += ["-c", str(args.ctx_size)]
+    ctx = ctx if ctx is not None else args.ctx_size
+    if ctx:
+        argv += ["-c", str(ctx)]
+    if batch:
+        argv += ["-b", str(batch)]
     if args.temp is not None:
         argv += ["--temp", str(args.temp)]
     if args.top_p is not None:
@@ -460,10 +379,16 @@ class ProcessLogs:
         return (a + "\n" + b)
 
 def run_once(args, ngl: int, threads: int, run_id: str, outdir: Path,
-             n_predict_override: Optional[int] = None, prompt_override: Optional[str] = None) -> RunResult:
+             n_predict_override: Optional[int] = None, prompt_override: Optional[str] = None,
+             batch: Optional[int] = None, ctx: Optional[int] = None) -> RunResult:
     started_at = dt.datetime.now(dt.timezone.utc).isoformat()
-    base_argv = build_base_argv(args, ngl, threads, n_predict_override, prompt_override)
-    tag = f"ngl{ngl}_t{threads}_{run_id}"
+    base_argv = build_base_argv(args, ngl, threads, n_predict_override, prompt_override, batch, ctx)
+    tag = f"ngl{ngl}_t{threads}"
+    if batch:
+        tag += f"_b{batch}"
+    if ctx:
+        tag += f"_c{ctx}"
+    tag += f"_{run_id}"
     stdout_path = outdir / f"{tag}.stdout.txt"
     stderr_path = outdir / f"{tag}.stderr.txt"
 
@@ -489,10 +414,9 @@ def run_once(args, ngl: int, threads: int, run_id: str, outdir: Path,
             else:
                 raise
 
-        gpu_mon = None if args.no_gpu_mon else GPUMonitor(proc.pid, gpu_index=args.gpu or 0, interval=0.2)
-        if gpu_mon: gpu_mon.start()
-        cpu_mon = CPUProcessMonitor(proc.pid, interval=0.2)
-        cpu_mon.start()
+        mon = ResourceSampler(proc.pid, interval=0.1, gpu=not args.no_gpu_mon, gpu_indices=[args.gpu or 0],
+                              smi_interval=args.smi_interval)
+        mon.start()
 
         try:
             rc = proc.wait(timeout=args.timeout)
@@ -500,13 +424,11 @@ def run_once(args, ngl: int, threads: int, run_id: str, outdir: Path,
             proc.kill()
             rc = -9
 
-        if gpu_mon:
-            gpu_mon.stop()
-            gpu_mon.join(timeout=1.0)
-            gpu_peak_mib = gpu_mon.peak_mib
-        cpu_mon.stop()
-        cpu_mon.join(timeout=1.0)
-        cpu_peak_kib = cpu_mon.peak_kib
+        mon.stop()
+        mon.join(timeout=1.0)
+        if not args.no_gpu_mon:
+            gpu_peak_mib = mon.peak_gpu_mib or 0
+        cpu_peak_kib = mon.peak_rss_kib or 0
 
     wall = time.time() - t0
 
@@ -527,7 +449,8 @@ def run_once(args, ngl: int, threads: int, run_id: str, outdir: Path,
         n_predict=(n_predict_override if n_predict_override is not None else args.n_predict),
         prompt_len=len(prompt_override if prompt_override is not None else args.prompt),
         stdout_path=stdout_path, stderr_path=stderr_path,
-        cmd=cmd, started_at=started_at
+        cmd=cmd, started_at=started_at,
+        batch=batch, ctx=ctx
     )
 
 # ----------------------------- search strategy --------------------------------
@@ -601,6 +524,315 @@ def hill_climb(args, ngl: int, base_threads: int, step: int, outdir: Path) -> Tu
     all_runs = [r for runs in tried.values() for r in runs]
     return best_t, all_runs
 
+# ------------------------- successive halving search --------------------------
+#
+# The ladder search (first sweep + hill_climb for every ngl) pays a full model
+# load x repeats for every point it touches. Successive halving instead runs a
+# coarse sample of (ngl, threads, batch, ctx) once, keeps the top 1/eta, gives
+# only those survivors more repeats, and repeats until one is left. A final
+# bisection between the coarse ngl levels refines the winner's ngl.
+
+Config = Tuple[int, int, Optional[int], Optional[int]]  # (ngl, threads, batch, ctx)
+
+def coarse_levels(values: List[int], k: int) -> List[int]:
+    """k evenly spaced picks from a sorted list, always including both ends."""
+    vals = sorted(set(values))
+    if k <= 1 or len(vals) <= k:
+        return vals if k > 1 else vals[-1:]
+    picks = {vals[round(i * (len(vals) - 1) / (k - 1))] for i in range(k)}
+    return sorted(picks)
+
+class HalvingSearch:
+    """
+    Successive halving over a list of configurations.
+
+    run_fn(cfg, run_id) -> RunResult does the actual work; it is injectable so the
+    schedule can be exercised without a model. Every RunResult lands in .results
+    in execution order, ready for the usual results.csv/json writers.
+    """
+
+    def __init__(self, run_fn, max_repeats: int, eta: int = 3, log=print):
+        self.run_fn = run_fn
+        self.max_repeats = max(1, max_repeats)
+        self.eta = max(2, eta)
+        self.log = log
+        self.runs: Dict[Config, List[RunResult]] = {}
+        self.results: List[RunResult] = []
+        self.rungs: List[Dict[str, object]] = []
+
+    def _top_up(self, cfg: Config, repeats: int) -> None:
+        have = self.runs.setdefault(cfg, [])
+        # a config that failed outright is not worth another model load
+        if have and not any(r.ok for r in have):
+            return
+        while len(have) < repeats:
+            r = self.run_fn(cfg, f"rep{len(have) + 1}")
+            have.append(r)
+            self.results.append(r)
+            if not r.ok:
+                break
+
+    def score(self, cfg: Config) -> float:
+        m = median_tokps(self.runs.get(cfg, []))
+        return m if m is not None else -1.0
+
+    def _rank(self, pool: List[Config]) -> List[Config]:
+        # ties go to the config with fewer resources (lower ngl, then threads)
+        return sorted(pool, key=lambda c: (-self.score(c), c[0], c[1]))
+
+    def run(self, configs: List[Config]) -> Optional[Config]:
+        pool = list(dict.fromkeys(configs))
+        rung, repeats = 0, 1
+        while pool:
+            for cfg in pool:
+                self._top_up(cfg, repeats)
+            ranked = self._rank(pool)
+            alive = [c for c in ranked if self.score(c) > 0]
+            self.rungs.append({"rung": rung, "repeats": repeats, "candidates": len(pool),
+                               "survivors": len(alive),
+                               "best": list(alive[0]) if alive else None,
+                               "best_tokps": round(self.score(alive[0]), 4) if alive else None})
+            self.log(f"[halving] rung {rung}: {len(pool)} configs x{repeats} -> "
+                     f"best {alive[0] if alive else None} "
+                     f"{self.score(alive[0]) if alive else -1:.2f} tok/s")
+            if len(alive) <= 1:
+                return alive[0] if alive else None
+            keep = max(1, -(-len(alive) // self.eta))
+            pool = alive[:keep]
+            rung += 1
+            repeats = min(self.max_repeats, repeats * self.eta)
+        return None
+
+    def refine_ngl(self, best: Config, ngl_list: List[int], tested: List[int]) -> Config:
+        """Bisect the winner's ngl between its neighbouring coarse levels."""
+        allowed = sorted(set(ngl_list))
+        lo_levels = [n for n in tested if n < best[0]]
+        hi_levels = [n for n in tested if n > best[0]]
+        lo = max(lo_levels) if lo_levels else best[0]
+        hi = min(hi_levels) if hi_levels else best[0]
+        while True:
+            cands = []
+            for a, b in ((lo, best[0]), (best[0], hi)):
+                inner = [n for n in allowed if a < n < b]
+                if inner:
+                    cands.append(inner[len(inner) // 2])
+            if not cands:
+                return best
+            trial = [(n,) + tuple(best[1:]) for n in cands]
+            for cfg in trial:
+                self._top_up(cfg, 1)
+            challengers = [c for c in self._rank(trial) if self.score(c) > 0]
+            for c in challengers[:1]:
+                self._top_up(c, self.max_repeats)
+            self._top_up(best, self.max_repeats)
+            winner = self._rank([best] + challengers[:1])[0]
+            self.log(f"[halving] refine ngl in ({lo},{hi}): tried {cands} -> ngl {winner[0]}")
+            # narrow the bracket around whichever side won
+            if winner[0] > best[0]:
+                lo = best[0]
+            elif winner[0] < best[0]:
+                hi = best[0]
+            else:
+                lo = max([n for n in cands if n < best[0]], default=lo)
+                hi = min([n for n in cands if n > best[0]], default=hi)
+            best = winner
+
+def halving_configs(args, ngl_list: List[int], threads_list: List[int]) -> List[Config]:
+    ngls = coarse_levels(ngl_list, args.halving_ngl_levels)
+    batches: List[Optional[int]] = parse_range(args.batch) if args.batch else [None]
+    ctxs: List[Optional[int]] = parse_range(args.ctx) if args.ctx else [None]
+    configs = [(n, t, b, c) for n in ngls for t in threads_list for b in batches for c in ctxs]
+    if len(configs) > args.halving_max_configs:
+        # deterministic subsample, but always keep the all-offload corner
+        rnd = random.Random(args.seed)
+        top = [c for c in configs if c[0] == ngls[-1]][:1]
+        rest = [c for c in configs if c not in top]
+        configs = top + rnd.sample(rest, args.halving_max_configs - len(top))
+    return configs
+
+def best_by_ngl_rows(results: List[RunResult]) -> Dict[int, Dict[str, object]]:
+    groups: Dict[Tuple[int, int, Optional[int], Optional[int]], List[RunResult]] = {}
+    for r in results:
+        groups.setdefault((r.ngl, r.threads, r.batch, r.ctx), []).append(r)
+    out: Dict[int, Dict[str, object]] = {}
+    for (ngl, t, _b, _c), runs in groups.items():
+        med = median_tokps(runs)
+        if med is None:
+            continue
+        if ngl in out and out[ngl]["median_tokps"] >= round(med, 4):
+            continue
+        best_run = best_of(runs)
+        out[ngl] = {
+            "ngl": ngl, "best_threads": t,
+            "median_tokps": round(med, 4),
+            "best_tokps_main": (round(best_run.main_tokps(), 4) if best_run and best_run.main_tokps() else None),
+            "wall_s": (round(best_run.wall_s, 3) if best_run else None),
+            "gpu_peak_mib": best_run.gpu_peak_mib if best_run else None,
+            "cpu_peak_mib": int(best_run.cpu_peak_kib/1024) if best_run and best_run.cpu_peak_kib else None,
+            "offloaded_layers": best_run.offloaded_layers if best_run else None,
+            "total_layers": best_run.total_layers if best_run else None,
+        }
+    return out
+
+# --------------------------- tuning result cache ------------------------------
+#
+# Results are keyed by a fingerprint of everything that moves the optimum:
+# model bytes, GPU name/VRAM/driver, CPU model, core counts and the runner's
+# version string. A node whose fingerprint is already in the cache gets the
+# best-known config back without a single model load; point --cache at a
+# shared/copied file and a fleet of identical nodes tunes once.
+
+def model_fingerprint(path: Path, sample_bytes: int = 4 * 1024 * 1024) -> str:
+    """size + sha256 of the first and last `sample_bytes`; full hashes of multi-GB models cost too much."""
+    size = path.stat().st_size
+    h = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        h.update(f.read(sample_bytes))
+        if size > sample_bytes:
+            f.seek(max(sample_bytes, size - sample_bytes))
+            h.update(f.read(sample_bytes))
+    return h.hexdigest()[:32]
+
+def gpu_fingerprint(gpu_index: Optional[int]) -> str:
+    if not cmd_exists("nvidia-smi"):
+        return "no-nvidia-smi"
+    q = ["nvidia-smi", "--query-gpu=name,memory.total,driver_version", "--format=csv,noheader"]
+    if gpu_index is not None:
+        q += ["-i", str(gpu_index)]
+    try:
+        res = subprocess.run(q, capture_output=True, text=True, timeout=5)
+        if res.returncode == 0 and res.stdout.strip():
+            return ";".join(line.strip() for line in res.stdout.strip().splitlines())
+    except Exception:
+        pass
+    return "unknown-gpu"
+
+def cpu_model_name(cpuinfo: str = "/proc/cpuinfo") -> str:
+    try:
+        with open(cpuinfo) as f:
+            for line in f:
+                if line.lower().startswith(("model name", "hardware", "cpu model")):
+                    return line.split(":", 1)[1].strip()
+    except Exception:
+        pass
+    return platform.processor() or platform.machine()
+
+def runner_version(args) -> str:
+    """First non-empty line of `<binary> --version` (llamafile and llama.cpp both support it)."""
+    for via in ([args.exec_via, "sh"] if args.exec_via in ("auto", "direct") else [args.exec_via]):
+        try:
+            res = subprocess.run(compose_command(via, str(args.binary), ["--version"]),
+                                 capture_output=True, text=True, timeout=10)
+        except OSError:
+            continue
+        except subprocess.TimeoutExpired:
+            break
+        for line in strip_ansi(res.stdout + "\n" + res.stderr).splitlines():
+            if line.strip():
+                return line.strip()[:200]
+    return "unknown"
+
+def hardware_fingerprint(args, physical: int, logical: int) -> Dict[str, object]:
+    model_path = Path(args.model) if args.model else Path(args.binary)  # llamafiles embed the weights
+    return {
+        "model_hash": model_fingerprint(model_path),
+        "binary_hash": model_fingerprint(Path(args.binary)) if args.model else None,
+        "runner_version": runner_version(args),
+        "gpu": gpu_fingerprint(args.gpu),
+        "cpu_model": cpu_model_name(),
+        "physical_cores": physical,
+        "logical_cpus": logical,
+    }
+
+def fingerprint_key(d: Dict[str, object]) -> str:
+    return hashlib.sha256(json.dumps(d, sort_keys=True).encode()).hexdigest()[:32]
+
+def workload_settings(args) -> str:
+    """Everything besides hardware that decides which config is 'best' (workload + search bounds)."""
+    return fingerprint_key({
+        "prompt": args.prompt, "n_predict": args.n_predict, "ctx_size": args.ctx_size,
+        "temp": args.temp, "top_p": args.top_p, "top_k": args.top_k, "extra_args": args.extra_args,
+        "ngl": args.ngl, "threads": args.threads, "threads_min": args.threads_min, "threads_max": args.threads_max,
+        "batch": args.batch, "ctx": args.ctx, "vram_cap": args.vram_cap,
+    })
+
+def probe_settings(args) -> str:
+    """Probes only depend on what changes VRAM use."""
+    return fingerprint_key({"ctx_size": args.ctx_size, "extra_args": args.extra_args, "gpu": args.gpu})
+
+class TuneCache:
+    """
+    SQLite store for one fingerprint:
+      probes  - probe_ngl_bounds() output per probe_settings()
+      best    - winning config per workload_settings()
+      ngl_best- latest best threads per ngl, used to warm-start hill_climb whatever the workload
+    """
+    def __init__(self, path: Path, fingerprint: Dict[str, object], refresh: bool = False):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.fingerprint = fingerprint
+        self.fp = fingerprint_key(fingerprint)
+        self.refresh = refresh
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS probes ("
+            " fp TEXT NOT NULL, settings TEXT NOT NULL, result TEXT NOT NULL, created TEXT NOT NULL,"
+            " PRIMARY KEY (fp, settings));"
+            "CREATE TABLE IF NOT EXISTS best ("
+            " fp TEXT NOT NULL, settings TEXT NOT NULL, config TEXT NOT NULL, median_tokps REAL,"
+            " fingerprint TEXT NOT NULL, created TEXT NOT NULL,"
+            " PRIMARY KEY (fp, settings));"
+            "CREATE TABLE IF NOT EXISTS ngl_best ("
+            " fp TEXT NOT NULL, ngl INTEGER NOT NULL, threads INTEGER NOT NULL, median_tokps REAL,"
+            " created TEXT NOT NULL, PRIMARY KEY (fp, ngl));")
+        self.conn.commit()
+
+    def get_probe(self, settings: str) -> Optional[Dict[str, object]]:
+        if self.refresh:
+            return None
+        row = self.conn.execute("SELECT result FROM probes WHERE fp=? AND settings=?", (self.fp, settings)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_probe(self, settings: str, result: Dict[str, object]) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?)",
+                          (self.fp, settings, json.dumps(result), now_iso()))
+        self.conn.commit()
+
+    def get_best(self, settings: str) -> Optional[Dict[str, object]]:
+        if self.refresh:
+            return None
+        row = self.conn.execute("SELECT config, median_tokps, created FROM best WHERE fp=? AND settings=?",
+                                (self.fp, settings)).fetchone()
+        if not row:
+            return None
+        return dict(json.loads(row[0]), median_tokps=row[1], cached_at=row[2])
+
+    def put_best(self, settings: str, config: Dict[str, object]) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO best VALUES (?, ?, ?, ?, ?, ?)",
+                          (self.fp, settings, json.dumps(config), config.get("median_tokps"),
+                           json.dumps(self.fingerprint, sort_keys=True), now_iso()))
+        self.conn.commit()
+
+    def threads_by_ngl(self) -> Dict[int, int]:
+        """Warm-start data; read even with --refresh since a prior optimum is still the best first guess."""
+        return {ngl: t for ngl, t in self.conn.execute("SELECT ngl, threads FROM ngl_best WHERE fp=?", (self.fp,))}
+
+    def put_ngl_rows(self, rows: Dict[int, Dict[str, object]]) -> None:
+        now = now_iso()
+        self.conn.executemany("INSERT OR REPLACE INTO ngl_best VALUES (?, ?, ?, ?, ?)",
+                              [(self.fp, ngl, row["best_threads"], row.get("median_tokps"), now)
+                               for ngl, row in rows.items() if row.get("best_threads") is not None])
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+def nearest_prior(prior: Dict[int, int], ngl: int) -> Optional[int]:
+    if not prior:
+        return None
+    return prior[min(prior, key=lambda n: (abs(n - ngl), -n))]
+
 # ------------------------------- preflight ------------------------------------
 
 def preflight(args) -> None:
@@ -653,7 +885,7 @@ def read_merged_paths(stdout_path: str, stderr_path: str) -> str:
         b = ""
     return strip_ansi(a + "\n" + b)
 
-def probe_ngl_bounds(args, outdir: Path, physical_cores: int) -> Dict[str, object]:
+def probe_ngl_bounds(args, outdir: Path, physical_cores: int, cache: Optional[TuneCache] = None) -> Dict[str, object]:
     """
     Run two tiny probes (ngl=1 and ngl=2 if possible) to detect:
      - total_layers
@@ -661,7 +893,13 @@ def probe_ngl_bounds(args, outdir: Path, physical_cores: int) -> Dict[str, objec
      - VRAM peak at ngl=1 (MiB)
      - per-layer VRAM (MiB) estimated from (peak2 - peak1) and/or weights buffer differences
      - constant overhead (MiB) estimated as peak1 - per_layer
+    With a cache, a previous probe for the same fingerprint/settings is returned as-is.
     """
+    if cache is not None:
+        hit = cache.get_probe(probe_settings(args))
+        if hit is not None:
+            print("[cache] reusing probe results from", hit.get("cached_at", "earlier run"))
+            return hit
     # choose a modest thread count for probe
     t_probe = max(args.threads_min, min(round_to_even(max(2, physical_cores // 2)), args.threads_max))
     # probe prompt is trivial; 1 token
@@ -704,7 +942,7 @@ def probe_ngl_bounds(args, outdir: Path, physical_cores: int) -> Dict[str, objec
     if per_layer_mib is not None and peak1:
         overhead_mib = max(0.0, float(peak1 - per_layer_mib))
 
-    return {
+    probe = {
         "total_layers": total_layers,
         "model_size_gib": model_size_gib,
         "peak1_mib": peak1,
@@ -715,13 +953,17 @@ def probe_ngl_bounds(args, outdir: Path, physical_cores: int) -> Dict[str, objec
         "weights1_mib": weights1,
         "weights2_mib": weights2,
     }
+    if cache is not None and total_layers:
+        cache.put_probe(probe_settings(args), dict(probe, cached_at=now_iso()))
+    return probe
 
-def plan_ngl_list_auto(args, physical_cores: int, outdir: Path) -> Tuple[List[int], Dict[str, object]]:
+def plan_ngl_list_auto(args, physical_cores: int, outdir: Path,
+                       cache: Optional[TuneCache] = None) -> Tuple[List[int], Dict[str, object]]:
     """
     Decide an ngl list when args.ngl == 'auto', optionally respecting --vram-cap.
     Returns (ngl_list, probe_info).
     """
-    probe = probe_ngl_bounds(args, outdir, physical_cores)
+    probe = dict(probe_ngl_bounds(args, outdir, physical_cores, cache))
     total_layers = probe.get("total_layers") or 0
     per_layer_mib = probe.get("per_layer_mib")
     overhead_mib = probe.get("overhead_mib") or 0.0
@@ -794,6 +1036,24 @@ def main():
     ap.add_argument("--step", type=int, default=1, help="Hill-climb step around previous best (default 1).")
     ap.add_argument("--repeats", type=int, default=2, help="Repeats per (ngl,threads) to median.")
 
+    # Search driver
+    ap.add_argument("--search", choices=["halving", "ladder"], default="halving",
+                    help="halving (default): successive halving over (ngl,threads,batch,ctx); "
+                         "ladder: full first-ngl sweep + hill-climb for every ngl (pre-v4.1 behaviour).")
+    ap.add_argument("--eta", type=int, default=3, help="Halving: keep the top 1/eta configs each rung (default 3).")
+    ap.add_argument("--halving-ngl-levels", type=int, default=4,
+                    help="Halving: coarse ngl levels sampled before refinement (default 4).")
+    ap.add_argument("--halving-max-configs", type=int, default=32,
+                    help="Halving: cap on first-rung configs; larger grids are subsampled (default 32).")
+    ap.add_argument("--batch", default=None, help="Halving: -b values to search, e.g. '256,512,1024'. Default: binary default.")
+    ap.add_argument("--ctx", default=None, help="Halving: -c values to search, e.g. '2048,4096'. Default: --ctx-size.")
+
+    # Result cache
+    ap.add_argument("--cache", default=str(Path(__file__).resolve().parent / "results" / "tune_cache.sqlite3"),
+                    help="SQLite tuning cache keyed by model/GPU/CPU/runner fingerprint ('' disables).")
+    ap.add_argument("--refresh", action="store_true",
+                    help="Re-measure even if a best config is cached (prior results still warm-start the search).")
+
     # Generation knobs
     ap.add_argument("--prompt", default="Benchmark hybrid CPU/GPU offload. Write one concise sentence.")
     ap.add_argument("-n", "--n-predict", type=int, default=160)
@@ -808,6 +1068,8 @@ def main():
     ap.add_argument("--outdir", default="tune_runs")
     ap.add_argument("--gpu", type=int, default=0)
     ap.add_argument("--no-gpu-mon", action="store_true")
+    ap.add_argument("--smi-interval", type=float, default=DEFAULT_SMI_INTERVAL_S,
+                    help="Report interval (s) of the looping nvidia-smi used when pynvml is unavailable (default 0.1).")
     ap.add_argument("--timeout", type=int, default=900)
     ap.add_argument("--no-preflight", action="store_true")
     ap.add_argument("--exec-via", choices=["auto","direct","sh","bash"], default="auto",
@@ -817,6 +1079,8 @@ def main():
     ap.add_argument("--vram-cap", default=None, help="Limit ngl by VRAM cap (e.g., '10GiB', '10240MiB', 'auto' = 90% of total).")
 
     args = ap.parse_args()
+    if args.halving_max_configs < 1:
+        ap.error("--halving-max-configs must be at least 1")
 
     # Detect cores and set sane defaults
     physical = detect_physical_cores()
@@ -830,11 +1094,32 @@ def main():
     outdir = Path(args.outdir)
     outdir.mkdir(parents=True, exist_ok=True)
 
+    cache: Optional[TuneCache] = None
+    prior_threads: Dict[int, int] = {}
+    if args.cache:
+        fingerprint = hardware_fingerprint(args, physical, logical)
+        cache = TuneCache(Path(args.cache), fingerprint, refresh=args.refresh)
+        print(f"[cache] {args.cache}  fingerprint={cache.fp}")
+        print(f"[cache]   runner={fingerprint['runner_version']!r} gpu={fingerprint['gpu']!r} cpu={fingerprint['cpu_model']!r}")
+        known = cache.get_best(workload_settings(args))
+        if known is not None:
+            print(f"[cache] best-known config (tuned {known['cached_at']}): "
+                  f"ngl={known['ngl']} threads={known['threads']} batch={known.get('batch')} ctx={known.get('ctx')}  "
+                  f"median tok/s={known['median_tokps']}")
+            print("[cache] use --refresh to re-measure.")
+            (outdir / "search_summary.json").write_text(json.dumps(
+                {"best": known, "cached": True, "fingerprint": fingerprint}, indent=2))
+            cache.close()
+            return
+        prior_threads = cache.threads_by_ngl()
+        if prior_threads:
+            print(f"[cache] warm-starting from prior best threads for ngl {sorted(prior_threads)}")
+
     # Decide ngl list
     ngl_list: List[int]
     probe_info: Dict[str, object] = {}
     if args.ngl.strip().lower() == "auto":
-        ngl_list, probe_info = plan_ngl_list_auto(args, physical, outdir)
+        ngl_list, probe_info = plan_ngl_list_auto(args, physical, outdir, cache)
         print("[auto-ngl] probe results:")
         print("  total_layers:          ", probe_info.get("total_layers"))
         print("  model_size_gib:        ", probe_info.get("model_size_gib"))
@@ -852,7 +1137,7 @@ def main():
         ngl_list = parse_range(args.ngl)
         # If VRAM cap specified, just trim anything above calculated cap using a quick probe (1 layer only)
         if args.vram_cap:
-            probe = probe_ngl_bounds(args, outdir, physical)
+            probe = probe_ngl_bounds(args, outdir, physical, cache)
             per_layer_mib = probe.get("per_layer_mib")
             overhead_mib = probe.get("overhead_mib") or 0.0
             cap_mib = parse_size_to_mib(args.vram_cap) if args.vram_cap.lower() != "auto" else None
@@ -916,8 +1201,48 @@ def main():
     first = True
     prev_best_threads = None
 
-    for ngl in ngl_list:
+    if args.search == "halving":
+        warm = sorted({nearest_prior(prior_threads, n) for n in ngl_list} - {None}) if prior_threads else []
+        warm = [t for t in warm if args.threads_min <= t <= args.threads_max]
+        configs = halving_configs(args, ngl_list, sorted(set(first_threads_list) | set(warm)))
+        print(f"[tune] Search: successive halving, eta={args.eta}, {len(configs)} first-rung configs")
+        search = HalvingSearch(
+            lambda cfg, run_id: run_once(args, cfg[0], cfg[1], run_id, outdir, batch=cfg[2], ctx=cfg[3]),
+            max_repeats=args.repeats, eta=args.eta,
+        )
+        winner = search.run(configs)
+        if winner is not None:
+            winner = search.refine_ngl(winner, ngl_list, sorted({c[0] for c in configs}))
+        all_results = search.results
+        best_per_ngl = best_by_ngl_rows(all_results)
+        summary = {
+            "best": None if winner is None else {
+                "ngl": winner[0], "threads": winner[1], "batch": winner[2],
+                "ctx": winner[3] if winner[3] is not None else args.ctx_size,
+                "median_tokps": round(search.score(winner), 4),
+            },
+            "rungs": search.rungs,
+            "runs": len(all_results),
+        }
+        (outdir / "search_summary.json").write_text(json.dumps(summary, indent=2))
+        if winner is None:
+            print("[halving] no successful runs.")
+        else:
+            print(f"[halving] best ngl={winner[0]} threads={winner[1]} batch={winner[2]} ctx={winner[3]}  "
+                  f"median tok/s={search.score(winner):.2f}  ({len(all_results)} runs)")
+        ngl_list_iter: List[int] = []
+    else:
+        ngl_list_iter = ngl_list
+
+    for ngl in ngl_list_iter:
         print(f"\n=== NGL {ngl} ===")
+        if first and nearest_prior(prior_threads, ngl) is not None:
+            # a prior optimum replaces the full first sweep with a hill-climb around it
+            prev_best_threads = nearest_prior(prior_threads, ngl)
+            print(f"[ngl {ngl}] warm start: hill-climb from cached threads={prev_best_threads}")
+            first = False
+        elif not first and ngl in prior_threads:
+            prev_best_threads = prior_threads[ngl]
         if first:
             tried_runs: List[RunResult] = []
             for t in first_threads_list:
@@ -1003,15 +1328,32 @@ def main():
             "gpu_peak_mib","cpu_peak_mib","offloaded_layers","total_layers"
         ])
         w.writeheader()
-        for ngl in ngl_list:
+        for ngl in sorted(set(ngl_list) | set(best_per_ngl)):
             row = best_per_ngl.get(ngl, {})
             if row:
                 w.writerow(row)
 
+    if cache is not None:
+        cache.put_ngl_rows(best_per_ngl)
+        if args.search == "halving":
+            best_cfg = summary["best"]
+        else:
+            top = max(best_per_ngl.values(), key=lambda r: r.get("median_tokps") or -1.0, default=None)
+            best_cfg = None if top is None or not top.get("median_tokps") else {
+                "ngl": top["ngl"], "threads": top["best_threads"], "batch": None,
+                "ctx": args.ctx_size, "median_tokps": top["median_tokps"],
+            }
+        if best_cfg is not None:
+            cache.put_best(workload_settings(args), best_cfg)
+            print(f"[cache] stored best config for fingerprint {cache.fp}")
+        cache.close()
+
     print("\n[tune] done.")
     print(f"[tune] all runs:      {outdir / 'results.csv'}")
     print(f"[tune] all runs JSON: {outdir / 'results.json'}")
     print(f"[tune] best per ngl:  {outdir / 'best_by_ngl.csv'}")
+    if args.search == "halving":
+        print(f"[tune] search summary: {outdir / 'search_summary.json'}")
 
 if __name__ == "__main__":
     main()
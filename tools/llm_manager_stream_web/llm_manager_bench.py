@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+LLM Manager – Scheduling Benchmark
+==================================
+
+Replays a request trace through the real LLMManager (FairScheduler,
+VRAMTracker, eviction policy, workers, prefetch) with every model server
+swapped for a local stub OpenAI-compatible server. No GPU is needed, so it
+runs on CPU-only CI and lets you tune `fairness_timeslice_s`, eviction and
+slot settings offline.
+
+Each stub simulates:
+  • load time       (sleep before the port opens)
+  • VRAM cost       (the model's logical `vram_gb` against `--vram-total-gb`)
+  • decode speed    (tokens/sec, plus a fixed time-to-first-token)
+
+Usage
+-----
+  # synthetic: 4 models, Zipf popularity, 200 requests at 5 req/s
+  python llm_manager_bench.py run --models 4 --requests 200 --rate 5
+
+  # replay a recorded requests.txt (model names taken from the trace)
+  python llm_manager_bench.py run --trace requests.txt --rate 2 --vram-total-gb 24 \
+      --models-spec bench_models.json --timeslice 2 --eviction-policy lru
+
+  # just the stub (what launch_cmd runs)
+  python llm_manager_bench.py stub --port 8900 --load-time 2 --tps 40
+
+`--models-spec` is JSON: {"<model>": {"vram_gb": 6, "load_time_s": 3, "tps": 40,
+"ttft_s": 0.1, "tokens": 128, "slots": 1}, ...}; missing keys use the CLI defaults.
+
+Report: throughput (req/s, tok/s), end-to-end latency p50/p99, queue wait,
+model switches (cold loads), evictions and evictions per request.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import logging
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import llm_manager_stream_web as lmw
+
+
+# ------------------------------- stub server ----------------------------
+
+def run_stub_server(host: str, port: int, load_time_s: float, tps: float, ttft_s: float, tokens: int):
+    """OpenAI-compatible streaming stub; blocks forever."""
+    time.sleep(max(0.0, load_time_s))  # simulated weight load before the port opens
+    delay = 1.0 / max(0.1, tps)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def do_GET(self):
+            body = json.dumps({"object": "list", "data": [{"id": "stub"}]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            n = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(n) or b"{}")
+            except Exception:
+                payload = {}
+            count = max(1, min(int(payload.get("max_tokens") or tokens), tokens))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            time.sleep(max(0.0, ttft_s))
+            for i in range(count):
+                evt = {"choices": [{"delta": {"content": f"tok{i} "}}]}
+                self._chunk(b"data: " + json.dumps(evt).encode("utf-8") + b"\n\n")
+                time.sleep(delay)
+            usage = {"choices": [], "usage": {"completion_tokens": count}}
+            self._chunk(b"data: " + json.dumps(usage).encode("utf-8") + b"\n\n")
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+
+    ThreadingHTTPServer((host, port), Handler).serve_forever()
+
+
+# ------------------------------- bench setup ----------------------------
+
+@dataclass
+class StubModel:
+    name: str
+    vram_gb: float = 6.0
+    load_time_s: float = 2.0
+    tps: float = 40.0
+    ttft_s: float = 0.1
+    tokens: int = 64
+    slots: int = 1
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def build_config(models: List[StubModel], workdir: Path, args: argparse.Namespace) -> lmw.Config:
+    script = Path(__file__).resolve()
+    specs = []
+    for sm in models:
+        port = free_port()
+        cmd = (f"{sys.executable} {script} stub --host {{host}} --port {{port}} "
+               f"--load-time {sm.load_time_s} --tps {sm.tps} --ttft {sm.ttft_s} --tokens {sm.tokens}")
+        specs.append(lmw.ModelSpec(
+            name=sm.name, port=port, launch_cmd=cmd, vram_gb=sm.vram_gb,
+            startup_timeout_s=sm.load_time_s + 30.0, shutdown_grace_s=1.0,
+            max_tokens=sm.tokens, max_parallel_slots=sm.slots,
+            preload_binary_to_ram=False, preload_to_ram=False,
+        ))
+    return lmw.Config(
+        models=specs,
+        requests_file=str(workdir / "requests.txt"),
+        output_dir=str(workdir / "outputs"),
+        logs_dir=str(workdir / "logs"),
+        system_specs_path=str(workdir / "system_specs.json"),
+        vram_reserve_gb=0.0,
+        safety_vram_margin_gb=0.0,
+        exclusive_mode=args.exclusive,
+        post_stop_wait_s=0.05,
+        post_stop_check_retries=1,
+        fairness_timeslice_s=args.timeslice,
+        eviction_policy=args.eviction_policy,
+        prefetch_enabled=not args.no_prefetch,
+        web_port=free_port(),
+        process_existing_requests_on_start=True,
+        gpu_override={"name": "bench-stub", "vram_total_gb": args.vram_total_gb},
+    )
+
+def load_models(names: List[str], spec_path: Optional[str], args: argparse.Namespace) -> List[StubModel]:
+    spec: Dict[str, dict] = {}
+    if spec_path:
+        with open(spec_path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    out = []
+    for name in names:
+        s = spec.get(name, {})
+        out.append(StubModel(
+            name=name,
+            vram_gb=float(s.get("vram_gb", args.vram_gb)),
+            load_time_s=float(s.get("load_time_s", args.load_time)),
+            tps=float(s.get("tps", args.tps)),
+            ttft_s=float(s.get("ttft_s", args.ttft)),
+            tokens=int(s.get("tokens", args.tokens)),
+            slots=int(s.get("slots", args.slots)),
+        ))
+    return out
+
+def synthetic_trace(n_models: int, n_requests: int, zipf_s: float, rng: random.Random) -> List[str]:
+    names = [f"stub-{i}" for i in range(n_models)]
+    weights = [1.0 / ((i + 1) ** zipf_s) for i in range(n_models)]
+    return [f"{rng.choices(names, weights)[0]}|bench request {i}" for i in range(n_requests)]
+
+def read_trace(path: str) -> List[str]:
+    lines = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parsed = lmw.parse_request_line(line)
+            if parsed:
+                lines.append(f"{parsed[0]}|{parsed[1]}")
+    return lines
+
+def trace_model(line: str) -> str:
+    """Model name of a trace line; the target may carry an '@lane[:deadline]' suffix."""
+    target = line.split("|", 1)[0]
+    try:
+        return lmw.split_request_target(target)[0]
+    except ValueError:
+        return target.rpartition("@")[0].strip()  # same fallback as the manager's tailer
+
+
+# --------------------------------- replay -------------------------------
+
+@dataclass
+class BenchReport:
+    requests: int = 0
+    completed: int = 0
+    failed: int = 0
+    wall_s: float = 0.0
+    req_per_s: float = 0.0
+    tokens_per_s: float = 0.0
+    latency_p50_s: Optional[float] = None
+    latency_p99_s: Optional[float] = None
+    queue_wait_p50_s: Optional[float] = None
+    queue_wait_p99_s: Optional[float] = None
+    model_switches: int = 0
+    evictions: int = 0
+    evictions_per_request: float = 0.0
+    per_model: Dict[str, dict] = field(default_factory=dict)
+
+def replay(lines: List[str], cfg: lmw.Config, rate: float, timeout_s: float, rng: random.Random,
+           verbose: bool = False) -> BenchReport:
+    Path(cfg.requests_file).write_text("", encoding="utf-8")
+    # A kept --workdir must not resume the previous run's journal
+    for suffix in ("", "-wal", "-shm"):
+        Path(cfg.logs_dir, "requests_journal.sqlite3" + suffix).unlink(missing_ok=True)
+    sys_specs = lmw.SystemSpecs(os="bench", os_version="", machine="", cpu="", cpu_cores_logical=0,
+                                cpu_cores_physical=0, ram_total_gb=0.0, ram_available_gb=0.0,
+                                gpus=[lmw.GPUInfo(vendor="Stub", name="bench-stub", vram_total_gb=cfg.gpu_override["vram_total_gb"])])
+    # Stubs use no real VRAM: rely on the logical tracker only
+    lmw.get_actual_vram_free_gb = lambda logger=None: None
+
+    bus = lmw.EventBus()
+    sub = bus.subscribe()
+    mgr = lmw.LLMManager(cfg, sys_specs, bus, lmw.ControlState())
+    if not verbose:
+        mgr.logger.handlers = [h for h in mgr.logger.handlers if type(h) is not logging.StreamHandler]
+    runner = threading.Thread(target=mgr.start, name="BenchManager", daemon=True)
+
+    done = 0
+    t0 = time.perf_counter()
+    runner.start()
+    try:
+        # Arrivals: Poisson at `rate` req/s (rate <= 0 => all at once), appended like a live writer
+        with open(cfg.requests_file, "a", encoding="utf-8") as f:
+            next_at = t0
+            for line in lines:
+                if rate > 0:
+                    next_at += rng.expovariate(rate)
+                    while True:
+                        now = time.perf_counter()
+                        if now >= next_at:
+                            break
+                        for evt in sub.get_batch(timeout=min(0.05, next_at - now)):
+                            done += evt.get("type") == "request_end"
+                f.write(line + "\n")
+                f.flush()
+        deadline = time.perf_counter() + timeout_s
+        while done < len(lines) and time.perf_counter() < deadline:
+            for evt in sub.get_batch(timeout=0.5):
+                done += evt.get("type") == "request_end"
+        wall = time.perf_counter() - t0
+    finally:
+        mgr.stop()
+        runner.join(timeout=10.0)
+
+    return summarize(mgr, len(lines), wall)
+
+def summarize(mgr: lmw.LLMManager, n_requests: int, wall: float) -> BenchReport:
+    rows = []
+    with mgr.csv_path.open("r", newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    rep = BenchReport(requests=n_requests, wall_s=round(wall, 3))
+    lat, wait, tokens = [], [], 0
+    per_model: Dict[str, dict] = {}
+    for r in rows:
+        pm = per_model.setdefault(r["model"], {"completed": 0, "cold_loads": 0, "latency": []})
+        if r["endpoint_status"] != "200":
+            rep.failed += 1
+            continue
+        rep.completed += 1
+        pm["completed"] += 1
+        pm["cold_loads"] += r["server_was_running"] == "0"
+        e2e = float(r["end_ts"]) - float(r["received_ts"])
+        lat.append(e2e)
+        pm["latency"].append(e2e)
+        wait.append(float(r["start_ts"]) - float(r["received_ts"]))
+        tokens += int(r.get("completion_tokens") or 0)
+    rep.req_per_s = round(rep.completed / wall, 3) if wall > 0 else 0.0
+    rep.tokens_per_s = round(tokens / wall, 1) if wall > 0 else 0.0
+    r3 = lambda v: round(v, 3) if v is not None else None
+    rep.latency_p50_s, rep.latency_p99_s = r3(lmw.percentile(lat, 50)), r3(lmw.percentile(lat, 99))
+    rep.queue_wait_p50_s, rep.queue_wait_p99_s = r3(lmw.percentile(wait, 50)), r3(lmw.percentile(wait, 99))
+
+    text = mgr.metrics.render()
+    for line in text.splitlines():
+        if line.startswith("llm_manager_model_loads_total"):
+            rep.model_switches += int(float(line.rsplit(" ", 1)[1]))
+        elif line.startswith("llm_manager_model_evictions_total"):
+            rep.evictions += int(float(line.rsplit(" ", 1)[1]))
+    rep.evictions_per_request = round(rep.evictions / max(1, rep.completed), 3)
+    rep.per_model = {
+        name: {"completed": pm["completed"], "cold_loads": pm["cold_loads"],
+               "latency_p50_s": r3(lmw.percentile(pm["latency"], 50)),
+               "latency_p99_s": r3(lmw.percentile(pm["latency"], 99))}
+        for name, pm in sorted(per_model.items())
+    }
+    return rep
+
+def print_report(rep: BenchReport, cfg: lmw.Config):
+    print("\n=== llm_manager bench ===")
+    print(f"exclusive={cfg.exclusive_mode} timeslice={cfg.fairness_timeslice_s}s eviction={cfg.eviction_policy} "
+          f"prefetch={cfg.prefetch_enabled} vram_total={cfg.gpu_override['vram_total_gb']}GB")
+    print(f"requests      : {rep.completed}/{rep.requests} ok, {rep.failed} failed in {rep.wall_s:.1f}s")
+    print(f"throughput    : {rep.req_per_s:.2f} req/s, {rep.tokens_per_s:.1f} tok/s")
+    print(f"latency e2e   : p50 {rep.latency_p50_s}s  p99 {rep.latency_p99_s}s")
+    print(f"queue wait    : p50 {rep.queue_wait_p50_s}s  p99 {rep.queue_wait_p99_s}s")
+    print(f"model switches: {rep.model_switches} cold loads, {rep.evictions} evictions "
+          f"({rep.evictions_per_request:.2f}/req)")
+    print(f"{'model':<28} {'done':>5} {'cold':>5} {'p50 s':>8} {'p99 s':>8}")
+    for name, pm in rep.per_model.items():
+        print(f"{name:<28} {pm['completed']:>5} {pm['cold_loads']:>5} {pm['latency_p50_s']!s:>8} {pm['latency_p99_s']!s:>8}")
+
+
+# ----------------------------------- CLI --------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark llm_manager scheduling against stub model servers")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    st = sub.add_parser("stub", help="Run one stub OpenAI-compatible server")
+    st.add_argument("--host", default="127.0.0.1")
+    st.add_argument("--port", type=int, required=True)
+    st.add_argument("--load-time", type=float, default=2.0)
+    st.add_argument("--tps", type=float, default=40.0)
+    st.add_argument("--ttft", type=float, default=0.1)
+    st.add_argument("--tokens", type=int, default=64)
+
+    rn = sub.add_parser("run", help="Replay a trace through LLMManager")
+    rn.add_argument("--trace", help="requests.txt to replay (default: synthetic)")
+    rn.add_argument("--models", type=int, default=3, help="Synthetic: number of models")
+    rn.add_argument("--requests", type=int, default=60, help="Synthetic: number of requests")
+    rn.add_argument("--zipf", type=float, default=1.0, help="Synthetic: model popularity skew")
+    rn.add_argument("--models-spec", help="JSON per-model stub parameters")
+    rn.add_argument("--rate", type=float, default=2.0, help="Arrival rate req/s (<=0: all at once)")
+    rn.add_argument("--vram-total-gb", type=float, default=16.0)
+    rn.add_argument("--vram-gb", type=float, default=6.0, help="Default per-model VRAM cost")
+    rn.add_argument("--load-time", type=float, default=2.0, help="Default per-model load time (s)")
+    rn.add_argument("--tps", type=float, default=40.0, help="Default decode tokens/sec")
+    rn.add_argument("--ttft", type=float, default=0.1, help="Default time to first token (s)")
+    rn.add_argument("--tokens", type=int, default=64, help="Default tokens per answer")
+    rn.add_argument("--slots", type=int, default=1, help="Default max_parallel_slots")
+    rn.add_argument("--timeslice", type=float, default=5.0, help="fairness_timeslice_s")
+    rn.add_argument("--eviction-policy", default="gds", choices=sorted(lmw.EVICTION_POLICIES))
+    rn.add_argument("--exclusive", action="store_true")
+    rn.add_argument("--no-prefetch", action="store_true")
+    rn.add_argument("--seed", type=int, default=1)
+    rn.add_argument("--timeout", type=float, default=600.0, help="Max seconds to wait after the last arrival")
+    rn.add_argument("--workdir", help="Keep logs/outputs here (default: temp dir)")
+    rn.add_argument("--json", help="Also write the report as JSON")
+    rn.add_argument("--verbose", action="store_true", help="Show manager logs")
+    args = ap.parse_args()
+
+    if args.cmd == "stub":
+        run_stub_server(args.host, args.port, args.load_time, args.tps, args.ttft, args.tokens)
+        return
+
+    rng = random.Random(args.seed)
+    lines = read_trace(args.trace) if args.trace else synthetic_trace(args.models, args.requests, args.zipf, rng)
+    if not lines:
+        print("Empty trace.", file=sys.stderr)
+        sys.exit(2)
+    names = list(dict.fromkeys(trace_model(l) for l in lines))
+    models = load_models(names, args.models_spec, args)
+
+    tmp = None
+    if args.workdir:
+        workdir = Path(args.workdir)
+        workdir.mkdir(parents=True, exist_ok=True)
+    else:
+        tmp = tempfile.TemporaryDirectory(prefix="llm_bench_")
+        workdir = Path(tmp.name)
+    try:
+        cfg = build_config(models, workdir, args)
+        rep = replay(lines, cfg, args.rate, args.timeout, rng, verbose=args.verbose)
+        print_report(rep, cfg)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(rep.__dict__, f, indent=2)
+    finally:
+        if tmp:
+            tmp.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -12,10 +12,22 @@ New in this build
   • Pause/Resume toggle
 - Pause stops starting new requests (tailing continues; queued items accumulate)
 - Process-group eviction: reliably frees VRAM (watch with `nvtop`)
-- Binary-to-RAM preload (for .llamafile or other binaries)
-- SSE streaming tokens to the browser
-- Fairness scheduler to batch per-model briefly, but avoid starvation
-- Per-request outputs & CSV logs
+- Binary-to-RAM preload (for .llamafile or other binaries): kernel-side copies
+  into a bounded tmpfs staging cache (LRU eviction, copies pinned while their
+  server runs, unchanged files are not re-copied across restarts)
+- SSE streaming tokens to the browser (bounded per-client buffers; tokens
+  coalesced into frames every `sse_token_frame_ms`)
+- Fairness scheduler to batch per-model briefly, but avoid starvation; priority
+  lanes (interactive/normal/batch) with per-request deadlines (EDF per model)
+- Concurrent dispatch: one worker per model, so resident models stream in parallel
+- Per-model parallel slots (`max_parallel_slots`): queued requests for the same
+  model are streamed concurrently, each with its own SSE events and output file
+- Queue lookahead prefetch: the next model's server is started (or its files
+  page-cache warmed) while the current one is still generating
+- Per-request outputs & CSV logs (buffered background writer)
+- Request journal (SQLite, WAL): queued/running requests are resumed after a
+  crash or restart, and requests.txt is re-followed from the last journaled line
+- Prometheus metrics at /metrics
 
 Endpoints
 ---------
@@ -23,11 +35,18 @@ GET /                  -> UI
 GET /stream            -> SSE channel
 GET /toggle_pause      -> toggle paused; returns {"paused": true/false}
 GET /set_pause?value=  -> set paused; value in [true,false,1,0,on,off,yes,no]
-GET /state             -> {"paused": bool, "active_model": str|None, "queue": [{model,count},...]}
+GET /metrics           -> Prometheus text exposition (queue depth, TTFT, tokens/s, loads, evictions, VRAM)
+GET /state             -> {"paused": bool, "active_model": str|None (comma-joined busy models), "queue": [{model,count},...]}
+POST /api/submit       -> body {"model": str, "question": str, "priority"?: lane, "deadline_s"?: float}
+                          (or "model[@lane[:deadline_s]]|question"); returns {"req_id": int}
 
 Requests file format
 --------------------
-requests.txt lines: "<model_name>|<question>"
+requests.txt lines: "<model_name>|<question>" or "<model_name>@<lane>[:<deadline_s>]|<question>"
+Lanes: interactive > normal (default) > batch. Each model's queue is served
+earliest-deadline-first; interactive work preempts another model's timeslice.
+The file is followed with inotify on Linux (polling elsewhere); only complete
+(newline-terminated) lines are picked up.
 
 Configuration
 -------------
@@ -41,16 +60,19 @@ import argparse
 import csv
 import dataclasses
 from dataclasses import dataclass, field
+import hashlib
+import heapq
 import json
 import logging
 import os
 import platform
 import queue
 import re
+import selectors
 import shutil
 import shlex
 import signal
-import socket
+import sqlite3
 import subprocess
 import sys
 import threading
@@ -58,7 +80,7 @@ import time
 from collections import defaultdict, deque
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, FrozenSet, List, Optional, Set, Tuple
 
 try:
     import psutil  # optional
@@ -68,61 +90,160 @@ except ImportError:
 # ----------------------------- HTTP helpers -----------------------------
 
 import urllib.request
-import urllib.error
 from urllib.parse import urlparse, parse_qs
 
-def http_get(url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 5.0) -> Tuple[Optional[int], Optional[str], Optional[dict]]:
-    req = urllib.request.Request(url, headers=headers or {}, method="GET")
-    try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            status = resp.getcode()
-            body = resp.read().decode("utf-8", errors="replace")
-            try:
-                return status, body, json.loads(body)
-            except Exception:
-                return status, body, None
-    except urllib.error.HTTPError as e:
-        try:
-            body = e.read().decode("utf-8", errors="replace")
-        except Exception:
-            body = None
-        return e.code, body, None
-    except Exception:
-        return None, None, None
+import http.client
+
+def iter_sse_lines(read_chunk: Callable[[], bytes]):
+    """
+    Yield (kind, data) tuples from an OpenAI-compatible SSE byte stream, reading
+    whole network chunks and splitting them into lines (no per-line syscalls):
+      - ("data", json_str) for each chunk
+      - ("done", "") at [DONE]
+    """
+    buf = b""
+    while True:
+        chunk = read_chunk()
+        if not chunk:
+            break
+        lines = (buf + chunk).split(b"\n")
+        buf = lines.pop()
+        for raw in lines:
+            line = raw.rstrip(b"\r")
+            if not line or line[:1] == b":":  # keepalive or blank
+                continue
+            if line[:5].lower() == b"data:":
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    yield ("done", "")
+                    return
+                yield ("data", data.decode("utf-8", errors="replace"))
 
 def http_post_json_stream(url: str, payload: dict, headers: Optional[Dict[str, str]] = None, timeout: float = 900.0):
     """
     Yield (kind, data) tuples from an OpenAI-compatible SSE stream.
+      - ("status", "<code>") first
       - ("data", json_str) for each chunk
       - ("done", "") at end
-      - ("status", "<code>") once closed
     """
     data = json.dumps(payload).encode("utf-8")
     hdrs = {"Content-Type": "application/json", "Accept": "text/event-stream"}
     if headers: hdrs.update(headers)
     req = urllib.request.Request(url, data=data, headers=hdrs, method="POST")
     resp = urllib.request.urlopen(req, timeout=timeout)
-    status = resp.getcode()
     try:
-        while True:
-            raw = resp.readline()
-            if not raw:
-                break
-            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
-            if not line or line.startswith(":"):  # keepalive or blank
-                continue
-            if line.lower().startswith("data:"):
-                data_str = line[5:].strip()
-                if data_str == "[DONE]":
-                    yield ("done", "")
-                    break
-                yield ("data", data_str)
+        yield ("status", str(resp.getcode()))
+        yield from iter_sse_lines(lambda: resp.read1(65536))
     finally:
         try:
             resp.close()
         except Exception:
             pass
-    yield ("status", str(status))
+
+class KeepAliveClient:
+    """
+    Pool of persistent HTTP/1.1 connections to one model server. Readiness
+    probes and completions reuse idle connections; every concurrent stream
+    checks out its own. A reused connection that turns out to be stale is
+    retried once on a fresh one.
+    """
+    _STALE = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+              http.client.BadStatusLine, BrokenPipeError, ConnectionResetError)
+
+    def __init__(self, base_url: str, max_idle: int = 4):
+        u = urlparse(base_url)
+        self.https = u.scheme == "https"
+        self.host = u.hostname or "127.0.0.1"
+        self.port = u.port or (443 if self.https else 80)
+        self.max_idle = max(1, int(max_idle))
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def _checkout(self, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        reused = conn is not None
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = cls(self.host, self.port, timeout=timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, reused
+
+    def _checkin(self, conn: http.client.HTTPConnection, resp: Optional[http.client.HTTPResponse]):
+        if resp is not None and (resp.will_close or not resp.isclosed()):
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _request(self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str], timeout: float):
+        for attempt in (0, 1):
+            conn, reused = self._checkout(timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                return conn, conn.getresponse()
+            except self._STALE:
+                conn.close()
+                if not reused or attempt:
+                    raise
+            except Exception:
+                conn.close()
+                raise
+        raise ConnectionError("unreachable")
+
+    def get(self, path: str, headers: Optional[Dict[str, str]] = None, timeout: float = 5.0) -> Tuple[Optional[int], Optional[str], Optional[dict]]:
+        """(status, body, parsed JSON or None); (None, None, None) if unreachable."""
+        try:
+            conn, resp = self._request("GET", path, None, dict(headers or {}), timeout)
+        except Exception:
+            return None, None, None
+        try:
+            body = resp.read().decode("utf-8", errors="replace")
+        except Exception:
+            conn.close()
+            return resp.status, None, None
+        self._checkin(conn, resp)
+        try:
+            return resp.status, body, json.loads(body)
+        except Exception:
+            return resp.status, body, None
+
+    def post_json_stream(self, path: str, payload: dict, headers: Optional[Dict[str, str]] = None, timeout: float = 900.0):
+        """Same contract as http_post_json_stream(); the connection is reused if fully drained."""
+        hdrs = {"Content-Type": "application/json", "Accept": "text/event-stream"}
+        if headers: hdrs.update(headers)
+        conn, resp = self._request("POST", path, json.dumps(payload).encode("utf-8"), hdrs, timeout)
+        released = False
+        try:
+            yield ("status", str(resp.status))
+            for item in iter_sse_lines(lambda: resp.read1(65536)):
+                if item[0] == "done":
+                    # Drain the chunked trailer and release before the caller stops iterating
+                    while resp.read1(65536):
+                        pass
+                    self._checkin(conn, resp)
+                    released = True
+                yield item
+            if not released:
+                self._checkin(conn, resp)
+                released = True
+        finally:
+            if not released:
+                conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
 
 
 # ------------------------------- utilities ------------------------------
@@ -142,6 +263,16 @@ def sanitize_filename(s: str, max_len: int = 64) -> str:
     cleaned = "".join(c if c in valid else "_" for c in s)
     return cleaned[:max_len] if len(cleaned) > max_len else cleaned
 
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile (q in 0..100); None for empty input."""
+    if not values:
+        return None
+    xs = sorted(values)
+    k = (len(xs) - 1) * max(0.0, min(100.0, q)) / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (k - lo)
+
 def file_exists_and_nonempty(p: Path) -> bool:
     return p.exists() and p.is_file() and p.stat().st_size > 0
 
@@ -306,7 +437,7 @@ class ModelSpec:
     completion_path: str = "/v1/chat/completions"
     api_key: Optional[str] = None
 
-    # Launch (supports {host} {port} {binary} {weights})
+    # Launch (supports {host} {port} {binary} {weights} {parallel})
     launch_cmd: Optional[str] = None
     env: Dict[str, str] = field(default_factory=dict)
     startup_timeout_s: float = 120.0
@@ -316,6 +447,9 @@ class ModelSpec:
     temperature: float = 0.7
     max_tokens: int = 512
 
+    # Concurrent streams per server; match the server's slot count (`-np {parallel}`)
+    max_parallel_slots: int = 1
+
     # VRAM budget (weights + compute + KV headroom)
     vram_gb: float = 8.0
 
@@ -344,6 +478,7 @@ class Config:
     safety_vram_margin_gb: float = 0.5
     allow_oversubscription: bool = False
     evict_and_retry_on_start_failure: bool = True
+    eviction_policy: str = "gds"  # lru | gds (GreedyDual-Size) | lfu (LFU with aging)
 
     # Exclusive mode
     exclusive_mode: bool = False
@@ -353,19 +488,34 @@ class Config:
     # Queue
     fairness_timeslice_s: float = 5.0
     starvation_avoidance_min_other: int = 1
+    # Default deadline per priority lane (seconds after arrival); "model@lane[:secs]|question" overrides
+    lane_deadlines_s: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_LANE_DEADLINES_S))
+
+    # Prefetch: while a model generates, start (or page-cache warm) the next queued ones
+    prefetch_enabled: bool = True
+    prefetch_lookahead: int = 1
 
     # Web
     web_host: str = "127.0.0.1"
     web_port: int = 8765
     web_title: str = "LLM Manager – Live Stream"
+    csv_flush_interval_s: float = 1.0       # requests_log.csv is written by a buffered background sink
+    sse_max_events_per_client: int = 1000  # bounded buffer per browser tab
+    sse_token_frame_ms: int = 50           # coalesce token events into frames
 
     # Behavior
-    process_existing_requests_on_start: bool = True
+    process_existing_requests_on_start: bool = True  # first run only once a journal exists
     start_with_clean_outputs: bool = False
 
+    # Request journal (SQLite/WAL): queued requests survive a crash or restart
+    journal_enabled: bool = True
+    journal_path: Optional[str] = None  # default: <logs_dir>/requests_journal.sqlite3
+
     # RAM preload globals
     ram_cache_tmpfs_dir: str = "/dev/shm/llm_cache"
     bin_cache_tmpfs_dir: str = "/dev/shm/llm_bin_cache"
+    ram_cache_capacity_gb: Optional[float] = None  # None = size of the tmpfs; LRU-evicts beyond this
+    bin_cache_capacity_gb: Optional[float] = None
     pagecache_warm_block_mb: int = 8
 
     # Optional GPU override
@@ -424,35 +574,174 @@ def ensure_sample_requests(path: Path, model_names: List[str]) -> None:
     print(f"[init] Wrote sample requests to {path}")
 
 
+# ---------------------------- eviction policies -------------------------
+
+# Reload-cost guess for models without load history (seconds per GB of VRAM)
+DEFAULT_LOAD_S_PER_GB = 1.0
+
+class EvictionPolicy:
+    """
+    Scores resident models for eviction; the lowest score is evicted first.
+    `demand(model)` returns how many requests are queued for that model.
+    """
+    name = "base"
+
+    def on_access(self, model: str, tracker: "VRAMTracker"):
+        pass
+
+    def on_evict(self, model: str, score: float):
+        pass
+
+    def forget(self, model: str):
+        pass
+
+    def score(self, model: str, tracker: "VRAMTracker", demand: Callable[[str], int]) -> float:
+        raise NotImplementedError
+
+class LRUEviction(EvictionPolicy):
+    """Oldest last-use first (the original behaviour)."""
+    name = "lru"
+
+    def score(self, model, tracker, demand):
+        return tracker.last_used_ts.get(model, 0.0)
+
+class GreedyDualSizeEviction(EvictionPolicy):
+    """
+    GreedyDual-Size: H = L + cost / size, where cost is the measured reload
+    time (scaled by queued demand) and size the VRAM it frees. L inflates to
+    the evicted model's H, so idle models age out. Equal scores (e.g. no
+    load history yet, so every cost is the same per-GB guess) fall back to
+    last use via VRAMTracker.eviction_order, i.e. plain LRU.
+    """
+    name = "gds"
+
+    def __init__(self):
+        self.inflation = 0.0
+        self.base: Dict[str, float] = {}  # model -> L at last access
+
+    def on_access(self, model, tracker):
+        self.base[model] = self.inflation
+
+    def on_evict(self, model, score):
+        self.inflation = max(self.inflation, score)
+
+    def forget(self, model):
+        self.base.pop(model, None)
+
+    def score(self, model, tracker, demand):
+        size = max(0.1, tracker.loaded.get(model, 0.0))
+        cost = tracker.reload_cost_s(model) * (1 + max(0, demand(model)))
+        return self.base.get(model, self.inflation) + cost / size
+
+class LFUAgingEviction(EvictionPolicy):
+    """
+    Frequency with exponential aging (half-life in seconds), weighted by
+    reload cost per GB freed and queued demand.
+    """
+    name = "lfu"
+
+    def __init__(self, half_life_s: float = 300.0):
+        self.half_life_s = max(1.0, float(half_life_s))
+        self.freq: Dict[str, float] = {}
+        self.freq_ts: Dict[str, float] = {}
+
+    def _aged(self, model: str, now: float) -> float:
+        f = self.freq.get(model, 0.0)
+        dt = now - self.freq_ts.get(model, now)
+        return f * (0.5 ** (dt / self.half_life_s))
+
+    def on_access(self, model, tracker):
+        now = time.perf_counter()
+        self.freq[model] = self._aged(model, now) + 1.0
+        self.freq_ts[model] = now
+
+    def forget(self, model):
+        self.freq.pop(model, None)
+        self.freq_ts.pop(model, None)
+
+    def score(self, model, tracker, demand):
+        size = max(0.1, tracker.loaded.get(model, 0.0))
+        freq = self._aged(model, time.perf_counter()) + max(0, demand(model))
+        return freq * tracker.reload_cost_s(model) / size
+
+EVICTION_POLICIES = {
+    "lru": LRUEviction,
+    "gds": GreedyDualSizeEviction,
+    "lfu": LFUAgingEviction,
+}
+
+def make_eviction_policy(name: str) -> EvictionPolicy:
+    cls = EVICTION_POLICIES.get((name or "lru").strip().lower())
+    if cls is None:
+        raise ValueError(f"Unknown eviction_policy '{name}' (choose from {', '.join(EVICTION_POLICIES)})")
+    return cls()
+
+
 # -------------------------- VRAM tracker (logical) ----------------------
 
 class VRAMTracker:
-    def __init__(self, total_vram_gb: float, reserve_gb: float):
+    """Logical VRAM accounting; thread-safe (model workers touch it concurrently)."""
+    def __init__(self, total_vram_gb: float, reserve_gb: float, policy: Optional[EvictionPolicy] = None):
         self.total_vram_gb = float(total_vram_gb)
         self.reserve_gb = float(reserve_gb)
         self.loaded: Dict[str, float] = {}       # model_name -> vram_gb
         self.last_used_ts: Dict[str, float] = {} # model_name -> ts
+        self.load_time_s: Dict[str, float] = {}  # model_name -> EMA of measured cold-load time
+        self.policy: EvictionPolicy = policy or LRUEviction()
+        self._lock = threading.Lock()
 
     def free_gb(self) -> float:
-        used = sum(self.loaded.values())
+        with self._lock:
+            used = sum(self.loaded.values())
         return clamp_nonneg(self.total_vram_gb - self.reserve_gb - used)
 
     def is_loaded(self, model_name: str) -> bool:
-        return model_name in self.loaded
+        with self._lock:
+            return model_name in self.loaded
 
     def touch(self, model_name: str):
-        self.last_used_ts[model_name] = time.perf_counter()
+        with self._lock:
+            self.last_used_ts[model_name] = time.perf_counter()
+            self.policy.on_access(model_name, self)
+
+    def record_load_time(self, model_name: str, seconds: float, alpha: float = 0.3):
+        if seconds <= 0:
+            return
+        with self._lock:
+            prev = self.load_time_s.get(model_name)
+            self.load_time_s[model_name] = seconds if prev is None else (1 - alpha) * prev + alpha * seconds
+
+    def reload_cost_s(self, model_name: str) -> float:
+        """Measured cold-load time, or a size-based guess. Caller may hold the lock."""
+        cost = self.load_time_s.get(model_name)
+        if cost is None:
+            cost = DEFAULT_LOAD_S_PER_GB * max(0.1, self.loaded.get(model_name, 0.0))
+        return cost
+
+    def eviction_order(self, demand: Optional[Callable[[str], int]] = None) -> List[str]:
+        """Loaded models, cheapest to evict first according to the policy; ties go least recently used."""
+        dem = demand or (lambda _m: 0)
+        with self._lock:
+            return sorted(self.loaded.keys(),
+                          key=lambda m: (self.policy.score(m, self, dem), self.last_used_ts.get(m, 0.0)))
 
-    def list_lru(self) -> List[str]:
-        return sorted(self.loaded.keys(), key=lambda m: self.last_used_ts.get(m, 0.0))
+    def note_eviction(self, model_name: str, demand: Optional[Callable[[str], int]] = None):
+        dem = demand or (lambda _m: 0)
+        with self._lock:
+            if model_name in self.loaded:
+                self.policy.on_evict(model_name, self.policy.score(model_name, self, dem))
 
     def account_start(self, model_name: str, vram_gb: float):
-        self.loaded[model_name] = vram_gb
-        self.touch(model_name)
+        with self._lock:
+            self.loaded[model_name] = vram_gb
+            self.last_used_ts[model_name] = time.perf_counter()
+            self.policy.on_access(model_name, self)
 
     def account_stop(self, model_name: str):
-        self.loaded.pop(model_name, None)
-        self.last_used_ts.pop(model_name, None)
+        with self._lock:
+            self.loaded.pop(model_name, None)
+            self.last_used_ts.pop(model_name, None)
+            self.policy.forget(model_name)
 
 
 # ----------------------- requests & fair scheduler ----------------------
@@ -463,6 +752,35 @@ class InferenceRequest:
     model_name: str
     question: str
     arrival_ts: float
+    lane: str = "normal"
+    deadline_ts: Optional[float] = None  # perf_counter; None = arrival + lane default
+
+# Priority lanes, highest first, with their default deadlines (seconds after arrival)
+PRIORITY_LANES = ("interactive", "normal", "batch")
+DEFAULT_LANE_DEADLINES_S = {"interactive": 30.0, "normal": 600.0, "batch": 86400.0}
+
+def lane_rank(lane: str) -> int:
+    try:
+        return PRIORITY_LANES.index(lane)
+    except ValueError:
+        return PRIORITY_LANES.index("normal")
+
+def split_request_target(target: str) -> Tuple[str, str, Optional[float]]:
+    """
+    'model[@lane[:deadline_s]]' -> (model, lane, deadline_s), e.g.
+    'llava@interactive:20'. Raises ValueError for an unknown lane or a bad deadline.
+    """
+    model, sep, spec = target.strip().rpartition("@")
+    if not sep:
+        return target.strip(), "normal", None
+    lane, _, deadline = spec.partition(":")
+    lane = lane.strip().lower()
+    if lane not in PRIORITY_LANES:
+        raise ValueError(f"unknown priority lane '{lane}' (expected one of {', '.join(PRIORITY_LANES)})")
+    deadline_s = float(deadline) if deadline.strip() else None
+    if deadline_s is not None and deadline_s <= 0:
+        raise ValueError("deadline must be positive")
+    return model.strip(), lane, deadline_s
 
 def parse_request_line(line: str) -> Optional[Tuple[str, str]]:
     s = line.strip()
@@ -480,16 +798,219 @@ def parse_request_line(line: str) -> Optional[Tuple[str, str]]:
         return parts[0].strip(), parts[1].strip()
     return None
 
+class InotifyWatcher:
+    """
+    Minimal inotify(7) wrapper (Linux, via ctypes) that wakes when files in a
+    directory are modified, created or moved in. `wait()` returns True on an
+    event and False on timeout; callers treat both as "go read the file".
+    """
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    def __init__(self, directory: Path):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(fd, os.fsencode(str(directory)), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, f"inotify_add_watch failed for {directory}")
+        self.fd = fd
+        self.sel = selectors.DefaultSelector()
+        self.sel.register(fd, selectors.EVENT_READ)
+
+    def wait(self, timeout: float) -> bool:
+        if not self.sel.select(timeout):
+            return False
+        try:
+            while os.read(self.fd, 65536):  # drain; we only need the wakeup
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        try:
+            self.sel.close()
+        finally:
+            os.close(self.fd)
+
+def make_file_watcher(path: Path) -> Optional[InotifyWatcher]:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return InotifyWatcher(path.parent)
+    except Exception as e:
+        print(f"[tailer] inotify unavailable ({e}); falling back to polling", file=sys.stderr)
+        return None
+
+class RequestJournal(threading.Thread):
+    """
+    Durable record of every request (SQLite in WAL mode) so a restart resumes
+    the queue instead of losing it:
+    - enqueue / start / complete are handed to a writer thread and committed
+      in groups (one transaction per burst), so submitters never wait on disk
+    - the tailer's byte offset in requests.txt is committed in the same
+      transaction as the requests read up to it
+    - pending requests are read back through a partial index, O(pending)
+    Requests that were running at a crash are served again (at-least-once).
+    """
+    daemon = True
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS requests ("
+        " req_id INTEGER PRIMARY KEY, model TEXT NOT NULL, question TEXT NOT NULL,"
+        " arrival_wall REAL NOT NULL, state TEXT NOT NULL DEFAULT 'queued',"
+        " status TEXT, started_wall REAL, completed_wall REAL)",
+        "CREATE INDEX IF NOT EXISTS requests_pending ON requests(req_id) WHERE state != 'done'",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    )
+    # Columns added after the first release of the journal
+    MIGRATIONS = (
+        ("lane", "ALTER TABLE requests ADD COLUMN lane TEXT NOT NULL DEFAULT 'normal'"),
+        ("deadline_wall", "ALTER TABLE requests ADD COLUMN deadline_wall REAL"),
+    )
+
+    def __init__(self, path: Path, batch_max: int = 1024, keep_done: int = 100_000):
+        super().__init__(name="RequestJournal")
+        self.path = path
+        self.batch_max = int(batch_max)
+        # each item is one op: statements that must land in the same transaction
+        self._q: "queue.Queue[Optional[Tuple[Tuple[str, tuple], ...]]]" = queue.Queue()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            for stmt in self.SCHEMA:
+                conn.execute(stmt)
+            cols = {row[1] for row in conn.execute("PRAGMA table_info(requests)")}
+            for col, stmt in self.MIGRATIONS:
+                if col not in cols:
+                    conn.execute(stmt)
+            if keep_done > 0:
+                conn.execute("DELETE FROM requests WHERE state = 'done' AND req_id <= "
+                             "(SELECT MAX(req_id) FROM requests) - ?", (int(keep_done),))
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), timeout=30.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # WAL + NORMAL survives process crashes
+        return conn
+
+    # ---- read side (startup, before the writer runs) ----
+
+    def last_req_id(self) -> int:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT MAX(req_id) FROM requests").fetchone()
+            return int(row[0] or 0)
+        finally:
+            conn.close()
+
+    def pending(self) -> List[Tuple[int, str, str, float, str, Optional[float]]]:
+        """(req_id, model, question, arrival_wall, lane, deadline_wall) for unfinished requests, oldest first."""
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT req_id, model, question, arrival_wall, lane, deadline_wall FROM requests "
+                                "WHERE state != 'done' ORDER BY req_id").fetchall()
+        finally:
+            conn.close()
+
+    def tailer_position(self) -> Optional[Tuple[int, int]]:
+        """(inode, byte offset) of the last requests.txt line journaled, if any."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'tailer_position'").fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        try:
+            ino, off = row[0].split(":", 1)
+            return int(ino), int(off)
+        except ValueError:
+            return None
+
+    # ---- write side (non-blocking) ----
+
+    def enqueue(self, req: InferenceRequest, source_pos: Optional[Tuple[int, int]] = None):
+        offset = time.time() - time.perf_counter()
+        deadline_wall = req.deadline_ts + offset if req.deadline_ts is not None else None
+        op = [("INSERT OR REPLACE INTO requests (req_id, model, question, arrival_wall, lane, deadline_wall) "
+               "VALUES (?, ?, ?, ?, ?, ?)",
+               (req.req_id, req.model_name, req.question, req.arrival_ts + offset, req.lane, deadline_wall))]
+        if source_pos is not None:
+            op.append(("INSERT OR REPLACE INTO meta (key, value) VALUES ('tailer_position', ?)",
+                       (f"{source_pos[0]}:{source_pos[1]}",)))
+        self._q.put(tuple(op))
+
+    def started(self, req_id: int):
+        self._q.put((("UPDATE requests SET state = 'running', started_wall = ? WHERE req_id = ?",
+                      (time.time(), req_id)),))
+
+    def completed(self, req_id: int, status: str):
+        self._q.put((("UPDATE requests SET state = 'done', status = ?, completed_wall = ? WHERE req_id = ?",
+                      (str(status), time.time(), req_id)),))
+
+    def stop(self, timeout: float = 5.0):
+        self._q.put(None)
+        self.join(timeout)
+
+    def run(self):
+        conn = self._connect()
+        conn.isolation_level = None  # explicit BEGIN/COMMIT per group
+        try:
+            done = False
+            while not done:
+                batch = [self._q.get()]
+                while len(batch) < self.batch_max:
+                    try:
+                        batch.append(self._q.get_nowait())
+                    except queue.Empty:
+                        break
+                done = any(op is None for op in batch)
+                try:
+                    conn.execute("BEGIN")
+                    for op in batch:
+                        for stmt in op or ():
+                            conn.execute(*stmt)
+                    conn.execute("COMMIT")
+                except sqlite3.Error as e:
+                    print(f"[journal] write failed ({len(batch)} ops): {e}", file=sys.stderr)
+                    try:
+                        conn.execute("ROLLBACK")
+                    except sqlite3.Error:
+                        pass
+        finally:
+            conn.close()
+
 class RequestsTailer(threading.Thread):
+    """
+    Follows `requests.txt` (inotify-driven on Linux, polling elsewhere) and
+    also accepts direct submissions via `submit()` (used by POST /api/submit).
+    Both paths share one id counter and one output queue. With a journal,
+    every request is journaled before it is queued and the tailer resumes
+    from the last journaled byte offset.
+    """
     daemon = True
-    def __init__(self, path: Path, process_existing: bool = True, poll_s: float = 0.5):
+    def __init__(self, path: Path, process_existing: bool = True, poll_s: float = 0.5,
+                 journal: Optional[RequestJournal] = None):
         super().__init__(name="RequestsTailer")
         self.path = path
         self.process_existing = process_existing
         self.poll_s = poll_s
+        self.journal = journal
         self.out_q: "queue.Queue[InferenceRequest]" = queue.Queue()
         self._stop = threading.Event()
-        self._next_id = 1
+        self._next_id = (journal.last_req_id() + 1) if journal else 1
+        self._id_lock = threading.Lock()
 
     def stop(self):
         self._stop.set()
@@ -497,122 +1018,477 @@ class RequestsTailer(threading.Thread):
     def get_queue(self) -> "queue.Queue[InferenceRequest]":
         return self.out_q
 
+    def submit(self, model: str, question: str, source_pos: Optional[Tuple[int, int]] = None,
+               lane: str = "normal", deadline_s: Optional[float] = None) -> InferenceRequest:
+        with self._id_lock:
+            now = time.perf_counter()
+            req = InferenceRequest(self._next_id, model, question, now, lane,
+                                   now + deadline_s if deadline_s is not None else None)
+            self._next_id += 1
+            if self.journal:
+                self.journal.enqueue(req, source_pos)
+        self.out_q.put(req)
+        return req
+
+    def _drain(self, f, inode: int) -> None:
+        while True:
+            pos = f.tell()
+            line = f.readline()
+            if not line:
+                return
+            if not line.endswith(b"\n"):
+                # Writer is mid-line; re-read once the rest arrives
+                f.seek(pos)
+                return
+            parsed = parse_request_line(line.decode("utf-8", errors="replace"))
+            if parsed:
+                try:
+                    model, lane, deadline_s = split_request_target(parsed[0])
+                except ValueError as e:
+                    print(f"[tailer] {e}; queuing '{parsed[0]}' as normal", file=sys.stderr)
+                    model, lane, deadline_s = parsed[0].rpartition("@")[0].strip(), "normal", None
+                self.submit(model, parsed[1], source_pos=(inode, f.tell()), lane=lane, deadline_s=deadline_s)
+
+    def _start_offset(self, f, inode: int) -> int:
+        resume = self.journal.tailer_position() if self.journal else None
+        size = os.fstat(f.fileno()).st_size
+        if resume and resume[0] == inode and resume[1] <= size:
+            return resume[1]
+        if resume:
+            return 0  # replaced or truncated since the last run: all of it is new
+        return 0 if self.process_existing else size
+
     def run(self):
+        watcher = None
         try:
             self.path.parent.mkdir(parents=True, exist_ok=True)
             self.path.touch(exist_ok=True)
-            with self.path.open("r", encoding="utf-8") as f:
-                if not self.process_existing:
-                    f.seek(0, os.SEEK_END)
+            watcher = make_file_watcher(self.path)
+            # With inotify the timeout is only a safety net for missed events
+            wait_s = max(self.poll_s, 2.0) if watcher else self.poll_s
+            with self.path.open("rb") as f:
+                inode = os.fstat(f.fileno()).st_ino
+                f.seek(self._start_offset(f, inode))
                 while not self._stop.is_set():
-                    pos = f.tell()
-                    line = f.readline()
-                    if not line:
-                        time.sleep(self.poll_s)
-                        f.seek(pos)
-                        continue
-                    parsed = parse_request_line(line)
-                    if parsed:
-                        model, question = parsed
-                        req = InferenceRequest(self._next_id, model, question, time.perf_counter())
-                        self._next_id += 1
-                        self.out_q.put(req)
+                    self._drain(f, inode)
+                    if watcher:
+                        watcher.wait(wait_s)
+                    else:
+                        time.sleep(wait_s)
         except Exception as e:
             print(f"[tailer] Error: {e}", file=sys.stderr)
+        finally:
+            if watcher:
+                watcher.close()
 
 class FairScheduler:
     """
-    Group-by-model batching up to timeslice_s, then give other models a turn.
+    Priority lanes with earliest-deadline-first ordering, batched per model.
+    - Each model has one heap per lane keyed by (deadline, arrival): interactive
+      before normal before batch, EDF within a lane
+    - A head past its deadline is promoted one lane, and again each time it
+      also misses that lane's deadline, so a steady stream of higher-lane work
+      delays lower lanes but can't starve them
+    - The highest (effective) lane waiting on any eligible model wins, so
+      interactive requests never wait out another model's batch timeslice
+    - Within that lane the current model keeps its slice (timeslice_s) for
+      batching unless another model's head can still make its deadline only
+      by going now: 0 <= deadline - now - switch_cost(model) < remaining slice.
+      Heads already past their deadline don't preempt (switching can't save
+      them and would thrash the model under a backlog); they wait for the slice
+    - When the slice ends other models go next, picked by deadline plus
+      switch cost (round-robin order breaks ties). If the current model still
+      has work, the next `starvation_avoidance_min_other` requests go to other
+      models whatever their lane, so every waiting model gets a turn
+    Push/pop are O(log n); choosing a model only looks at models with work.
     """
-    def __init__(self, timeslice_s: float, starvation_avoidance_min_other: int = 1):
+    def __init__(self, timeslice_s: float, starvation_avoidance_min_other: int = 1,
+                 lane_deadlines_s: Optional[Dict[str, float]] = None,
+                 switch_cost: Optional[Callable[[str], float]] = None):
         self.timeslice_s = float(timeslice_s)
         self.starvation_avoidance_min_other = int(starvation_avoidance_min_other)
-        self.queues: Dict[str, deque[InferenceRequest]] = defaultdict(deque)
-        self.global_order: deque[str] = deque()
+        self.lane_deadlines_s = dict(DEFAULT_LANE_DEADLINES_S)
+        self.lane_deadlines_s.update(lane_deadlines_s or {})
+        self.switch_cost = switch_cost or (lambda _m: 0.0)
+        # per model: one (deadline, seq, request) heap per lane, in PRIORITY_LANES order
+        self.queues: Dict[str, List[List[Tuple[float, int, InferenceRequest]]]] = defaultdict(
+            lambda: [[] for _ in PRIORITY_LANES])
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.global_order: Dict[str, None] = {}  # models with queued work, round-robin order
         self.current_model: Optional[str] = None
         self.slice_start_ts: float = 0.0
+        self._owed_model: Optional[str] = None  # model whose slice ended while others waited
+        self._owed_turns = 0
+        self._seq = 0
+        self._size = 0
 
     def add(self, req: InferenceRequest):
-        was_empty = len(self.queues[req.model_name]) == 0
-        self.queues[req.model_name].append(req)
-        if was_empty:
-            self.global_order.append(req.model_name)
+        if req.deadline_ts is None:
+            req.deadline_ts = req.arrival_ts + float(self.lane_deadlines_s.get(req.lane, self.lane_deadlines_s["normal"]))
+        self._seq += 1
+        heapq.heappush(self.queues[req.model_name][lane_rank(req.lane)], (req.deadline_ts, self._seq, req))
+        self.counts[req.model_name] += 1
+        self._size += 1
+        if req.model_name not in self.global_order:
+            self.global_order[req.model_name] = None
 
     def has_any(self) -> bool:
-        return any(len(q) > 0 for q in self.queues.values())
+        return self._size > 0
 
-    def _pop_from_model(self, model: str) -> Optional[InferenceRequest]:
-        q = self.queues[model]
+    def queued(self, model: str) -> int:
+        return self.counts.get(model, 0)
+
+    def _effective_rank(self, rank: int, deadline: float, now: float) -> int:
+        """Lane rank after promotion: one lane up per deadline missed (the original one, then each lane's own)."""
+        while rank > 0 and now > deadline:
+            rank -= 1
+            deadline += float(self.lane_deadlines_s.get(PRIORITY_LANES[rank], 0.0))
+        return rank
+
+    def _head(self, model: str, now: float) -> Tuple[int, float, int, int]:
+        """(effective lane, deadline, seq, lane heap index) of the model's most pressing request."""
+        return min((self._effective_rank(rank, q[0][0], now), q[0][0], q[0][1], rank)
+                   for rank, q in enumerate(self.queues[model]) if q)
+
+    def peek_order(self) -> List[str]:
+        """Models with queued work, most pressing head request first (for prefetch)."""
+        now = time.perf_counter()
+        return sorted(self.global_order, key=lambda m: self._head(m, now)[:2])
+
+    def _pop_from_model(self, model: str, lane: int) -> Optional[InferenceRequest]:
+        q = self.queues[model][lane]
         if not q:
             return None
-        req = q.popleft()
-        if not q:
-            try:
-                self.global_order.remove(model)
-            except ValueError:
-                pass
+        req = heapq.heappop(q)[-1]
+        self._size -= 1
+        self.counts[model] -= 1
+        if not self.counts[model]:
+            self.global_order.pop(model, None)
+            del self.counts[model]
         return req
 
-    def next_request(self) -> Optional[InferenceRequest]:
-        if not self.has_any():
+    def next_request(self, eligible: Optional[Callable[[str], bool]] = None) -> Optional[InferenceRequest]:
+        """
+        Pop the next request. `eligible(model)` lets the dispatcher skip models
+        that cannot be served right now (worker busy, not enough VRAM).
+        """
+        if not self._size:
+            return None
+        ok = eligible or (lambda _m: True)
+        cands = [m for m in self.global_order if ok(m)]
+        if not cands:
             return None
         now = time.perf_counter()
-        if self.current_model and self.queues[self.current_model]:
-            if (now - self.slice_start_ts) < self.timeslice_s:
-                return self._pop_from_model(self.current_model)
-            else:
-                for model in list(self.global_order):
-                    if model != self.current_model and self.queues[model]:
-                        self.current_model = model
-                        self.slice_start_ts = now
-                        return self._pop_from_model(model)
-                # Still only current model
-                self.slice_start_ts = now
-                return self._pop_from_model(self.current_model)
-        # Pick next available model
-        if self.global_order:
-            model = self.global_order[0]
-            self.current_model = model
+        heads = {m: self._head(m, now) for m in cands}
+        cur = self.current_model
+        elapsed = now - self.slice_start_ts
+
+        # slice over while other models wait: they get the next few turns regardless of lane
+        if (cur in heads and elapsed >= self.timeslice_s and self._owed_turns <= 0
+                and len(heads) > 1 and self.starvation_avoidance_min_other > 0):
+            self._owed_model, self._owed_turns = cur, self.starvation_avoidance_min_other
+        if self._owed_turns > 0:
+            others = [m for m in cands if m != self._owed_model]
+            if others:
+                self._owed_turns -= 1
+                pick = min(others, key=lambda m: (heads[m][0], heads[m][1] + self.switch_cost(m)))
+                return self._switch_and_pop(pick, heads[pick][3], now)
+            self._owed_turns = 0
+
+        top = min(h[0] for h in heads.values())
+        cands = [m for m in cands if heads[m][0] == top]
+        if cur in cands and elapsed < self.timeslice_s:
+            remaining = self.timeslice_s - elapsed
+            urgent = [m for m in cands
+                      if m != cur and 0.0 <= heads[m][1] - now - self.switch_cost(m) < remaining]
+            if not urgent:
+                return self._pop_from_model(cur, heads[cur][3])
+            pick = min(urgent, key=lambda m: heads[m][1])
+        else:
+            others = [m for m in cands if m != cur] or cands
+            pick = min(others, key=lambda m: heads[m][1] + (0.0 if m == cur else self.switch_cost(m)))
+        return self._switch_and_pop(pick, heads[pick][3], now)
+
+    def _switch_and_pop(self, pick: str, lane: int, now: float) -> Optional[InferenceRequest]:
+        if pick != self.current_model or now - self.slice_start_ts >= self.timeslice_s:
+            self.current_model = pick
             self.slice_start_ts = now
-            return self._pop_from_model(model)
-        return None
+        return self._pop_from_model(pick, lane)
+
+
+# ------------------------------ metrics ---------------------------------
+
+class MetricsRegistry:
+    """
+    Minimal in-process Prometheus registry: labelled counters, gauges and
+    histograms rendered in the text exposition format for GET /metrics.
+    Gauges can also be computed at scrape time via `gauge_fn`.
+    """
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+    def __init__(self, prefix: str = "llm_manager_"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {}  # name -> (kind, help, buckets)
+        self._values: Dict[str, Dict[Tuple[Tuple[str, str], ...], object]] = defaultdict(dict)
+        self._gauge_fns: Dict[str, Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: Optional[Tuple[float, ...]] = None):
+        self._meta[name] = (kind, help_text, tuple(buckets or self.DEFAULT_BUCKETS))
+
+    @staticmethod
+    def _key(labels: Dict[str, object]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values[name]
+            series[key] = float(series.get(key, 0.0)) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._values[name][self._key(labels)] = float(value)
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = self._meta.get(name, ("histogram", "", self.DEFAULT_BUCKETS))[2]
+        key = self._key(labels)
+        with self._lock:
+            h = self._values[name].get(key)
+            if h is None:
+                h = self._values[name][key] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, le in enumerate(buckets):
+                if value <= le:
+                    h["buckets"][i] += 1
+            h["sum"] += float(value)
+            h["count"] += 1
+
+    def gauge_fn(self, name: str, fn: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]):
+        """`fn()` returns {label_key: value}; use `labels()` to build keys."""
+        self._gauge_fns[name] = fn
+
+    @classmethod
+    def labels(cls, **labels) -> Tuple[Tuple[str, str], ...]:
+        return cls._key(labels)
+
+    @staticmethod
+    def _fmt_labels(key: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        items = key + extra
+        if not items:
+            return ""
+        esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+    def render(self) -> str:
+        computed = {}
+        for name, fn in list(self._gauge_fns.items()):
+            try:
+                computed[name] = fn()
+            except Exception:
+                computed[name] = {}
+        out: List[str] = []
+        with self._lock:
+            names = sorted(set(self._meta) | set(self._values) | set(computed))
+            for name in names:
+                kind, help_text, buckets = self._meta.get(name, ("gauge", "", self.DEFAULT_BUCKETS))
+                full = self.prefix + name
+                out.append(f"# HELP {full} {help_text}")
+                out.append(f"# TYPE {full} {kind}")
+                series = dict(self._values.get(name, {}))
+                series.update(computed.get(name, {}))
+                for key, val in sorted(series.items()):
+                    if kind == "histogram":
+                        for le, n in zip(buckets, val["buckets"]):
+                            out.append(f"{full}_bucket{self._fmt_labels(key, (('le', repr(float(le))),))} {n}")
+                        out.append(f"{full}_bucket{self._fmt_labels(key, (('le', '+Inf'),))} {val['count']}")
+                        out.append(f"{full}_sum{self._fmt_labels(key)} {val['sum']}")
+                        out.append(f"{full}_count{self._fmt_labels(key)} {val['count']}")
+                    else:
+                        out.append(f"{full}{self._fmt_labels(key)} {val}")
+        return "\n".join(out) + "\n"
+
+class CsvSink(threading.Thread):
+    """
+    Buffered background CSV writer: rows are queued by workers and written in
+    batches by a single thread that keeps the file open and flushes every
+    `flush_interval_s` (and on stop).
+    """
+    daemon = True
+    def __init__(self, path: Path, header: List[str], flush_interval_s: float = 1.0):
+        super().__init__(name="CsvSink")
+        self.path = path
+        self.header = header
+        self.flush_interval_s = max(0.05, float(flush_interval_s))
+        self._q: "queue.Queue[Optional[List]]" = queue.Queue()
+
+    def write(self, row: List):
+        self._q.put(row)
+
+    def stop(self, timeout: float = 5.0):
+        self._q.put(None)
+        if self.is_alive():
+            self.join(timeout)
+
+    def _rotate_if_header_changed(self):
+        """Move an existing file with a different column layout aside instead of mixing schemas."""
+        if not self.path.exists():
+            return
+        try:
+            with self.path.open("r", newline="", encoding="utf-8") as f:
+                existing = next(csv.reader(f), None)
+        except Exception:
+            return
+        if existing and existing != self.header:
+            old = self.path.with_name(f"{self.path.stem}.{now_iso()}{self.path.suffix}")
+            self.path.rename(old)
+            print(f"[csv] Column layout changed; moved old log to {old}", file=sys.stderr)
+
+    def run(self):
+        self._rotate_if_header_changed()
+        new_file = not self.path.exists()
+        with self.path.open("a", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            if new_file:
+                w.writerow(self.header)
+                f.flush()
+            while True:
+                try:
+                    row = self._q.get(timeout=self.flush_interval_s)
+                except queue.Empty:
+                    continue
+                stop = row is None
+                rows = [] if stop else [row]
+                # Grab everything already queued, then write + flush once
+                while True:
+                    try:
+                        nxt = self._q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is None:
+                        stop = True
+                    else:
+                        rows.append(nxt)
+                if rows:
+                    w.writerows(rows)
+                    f.flush()
+                if stop:
+                    break
 
 
 # ------------------------------ SSE & web UI ----------------------------
 
+class SSESubscriber:
+    """
+    Bounded per-client event buffer. While a token event for a request is
+    still pending, further tokens for that request are merged into it, and a
+    pending state event (queue/pause/active model) is replaced by its newer
+    version, so a slow client receives fewer, larger frames instead of an
+    ever-growing backlog. When the buffer is full the oldest event is dropped.
+    """
+    STATE_TYPES = ("queue_update", "active_model", "paused")
+
+    def __init__(self, max_events: int = 1000):
+        self.max_events = max(16, int(max_events))
+        self.events: deque = deque()
+        self.cond = threading.Condition()
+        self.dropped = 0
+        self._pending: Dict[int, Tuple[dict, List[str]]] = {}  # req_id -> (pending token event, chunks)
+        self._pending_state: Dict[str, dict] = {}               # type -> pending state event
+
+    def put(self, event: dict):
+        with self.cond:
+            rid = event.get("req_id")
+            et = event.get("type")
+            if et in self.STATE_TYPES:
+                pending_state = self._pending_state.get(et)
+                if pending_state is not None:
+                    pending_state.clear()
+                    pending_state.update(event)
+                    return
+                event = dict(event)
+                self._pending_state[et] = event
+            elif et == "token":
+                pending = self._pending.get(rid)
+                if pending is not None:
+                    pending[1].append(event.get("token", ""))
+                    return
+                event = dict(event)
+                self._pending[rid] = (event, [event.get("token", "")])
+            elif rid is not None:
+                # Keep per-request order: later tokens start a new frame
+                self._seal(rid)
+            self.events.append(event)
+            while len(self.events) > self.max_events:
+                old = self.events.popleft()
+                if self._pending_state.get(old.get("type")) is old:
+                    del self._pending_state[old.get("type")]
+                elif old.get("type") == "token":
+                    pending = self._pending.get(old.get("req_id"))
+                    if pending is not None and pending[0] is old:
+                        del self._pending[old.get("req_id")]
+                self.dropped += 1
+            self.cond.notify()
+
+    def _seal(self, rid) -> None:
+        pending = self._pending.pop(rid, None)
+        if pending is not None:
+            pending[0]["token"] = "".join(pending[1])
+
+    def get_batch(self, timeout: float, frame_s: float = 0.0) -> List[dict]:
+        """Wait up to `timeout` for events; if tokens are pending, linger `frame_s` to coalesce more."""
+        with self.cond:
+            if not self.events:
+                self.cond.wait(timeout)
+            if not self.events:
+                return []
+            lingering = frame_s > 0 and bool(self._pending)
+        if lingering:
+            time.sleep(frame_s)
+        with self.cond:
+            for rid in list(self._pending):
+                self._seal(rid)
+            self._pending_state.clear()
+            batch = list(self.events)
+            self.events.clear()
+        return batch
+
 class EventBus:
-    def __init__(self):
-        self.subscribers: List[queue.Queue] = []
+    def __init__(self, max_events_per_subscriber: int = 1000, token_frame_ms: int = 50):
+        self.subscribers: List[SSESubscriber] = []
         self.lock = threading.Lock()
+        self.max_events_per_subscriber = int(max_events_per_subscriber)
+        self.token_frame_s = max(0, int(token_frame_ms)) / 1000.0
         self.snap_active_model: Optional[str] = None
-        self.snap_current_req: Optional[dict] = None
-        self.snap_current_text: str = ""
+        self.snap_current_reqs: Dict[int, dict] = {}        # req_id -> {"req_id", "model", "question"}
+        self.snap_current_text: Dict[int, List[str]] = {}   # req_id -> streamed chunks so far
+        self.snap_current_len: Dict[int, int] = {}          # req_id -> total chars in chunks
         self.snap_paused: bool = False
         self.snap_queue_counts: List[dict] = []  # [{"model": str, "count": int}, ...]
 
-    def subscribe(self) -> queue.Queue:
-        q = queue.Queue()
+    def subscribe(self) -> SSESubscriber:
+        q = SSESubscriber(self.max_events_per_subscriber)
         with self.lock:
             self.subscribers.append(q)
             # On connect, send latest snapshots so UI is consistent
             if self.snap_paused is not None:
-                q.put_nowait({"type": "paused", "paused": self.snap_paused})
+                q.put({"type": "paused", "paused": self.snap_paused})
             if self.snap_active_model is not None:
-                q.put_nowait({"type": "active_model", "model": self.snap_active_model})
+                q.put({"type": "active_model", "model": self.snap_active_model})
             if self.snap_queue_counts:
-                q.put_nowait({"type": "queue_update", "counts": self.snap_queue_counts})
-            if self.snap_current_req is not None:
-                q.put_nowait({"type": "request_start", **self.snap_current_req})
-                if self.snap_current_text:
-                    q.put_nowait({
+                q.put({"type": "queue_update", "counts": self.snap_queue_counts})
+            for rid, cur in self.snap_current_reqs.items():
+                q.put({"type": "request_start", **cur})
+                chunks = self.snap_current_text.get(rid)
+                if chunks:
+                    q.put({
                         "type": "token",
-                        "req_id": self.snap_current_req["req_id"],
-                        "model": self.snap_current_req["model"],
-                        "token": self.snap_current_text
+                        "req_id": rid,
+                        "model": cur["model"],
+                        "token": "".join(chunks)
                     })
         return q
 
-    def unsubscribe(self, q: queue.Queue):
+    def unsubscribe(self, q: SSESubscriber):
         with self.lock:
             try:
                 self.subscribers.remove(q)
@@ -621,41 +1497,39 @@ class EventBus:
 
     def publish(self, event: dict):
         et = event.get("type")
-        if et == "active_model":
-            self.snap_active_model = event.get("model")
-        elif et == "request_start":
-            self.snap_current_req = {
-                "req_id": event.get("req_id"),
-                "model": event.get("model"),
-                "question": event.get("question", "")
-            }
-            self.snap_current_text = ""
-        elif et == "token":
-            tok = event.get("token", "")
-            if tok and len(self.snap_current_text) < 200000:
-                self.snap_current_text += tok
-        elif et == "request_end":
-            self.snap_current_req = None
-            self.snap_current_text = ""
-        elif et == "paused":
-            self.snap_paused = bool(event.get("paused", False))
-        elif et == "queue_update":
-            counts = event.get("counts") or []
-            if isinstance(counts, list):
-                self.snap_queue_counts = counts
-
         with self.lock:
-            dead = []
+            if et == "active_model":
+                self.snap_active_model = event.get("model")
+            elif et == "request_start":
+                rid = event.get("req_id")
+                self.snap_current_reqs[rid] = {
+                    "req_id": rid,
+                    "model": event.get("model"),
+                    "question": event.get("question", "")
+                }
+                self.snap_current_text[rid] = []
+                self.snap_current_len[rid] = 0
+            elif et == "token":
+                rid = event.get("req_id")
+                tok = event.get("token", "")
+                chunks = self.snap_current_text.get(rid)
+                if tok and chunks is not None and self.snap_current_len[rid] < 200000:
+                    chunks.append(tok)
+                    self.snap_current_len[rid] += len(tok)
+            elif et == "request_end":
+                rid = event.get("req_id")
+                self.snap_current_reqs.pop(rid, None)
+                self.snap_current_text.pop(rid, None)
+                self.snap_current_len.pop(rid, None)
+            elif et == "paused":
+                self.snap_paused = bool(event.get("paused", False))
+            elif et == "queue_update":
+                counts = event.get("counts") or []
+                if isinstance(counts, list):
+                    self.snap_queue_counts = counts
+
             for q in self.subscribers:
-                try:
-                    q.put_nowait(event)
-                except Exception:
-                    dead.append(q)
-            for q in dead:
-                try:
-                    self.subscribers.remove(q)
-                except ValueError:
-                    pass
+                q.put(event)
 
 class ControlState:
     """Shared state for pause/resume, thread-safe."""
@@ -679,7 +1553,8 @@ class ControlState:
 
 class WebServer(threading.Thread):
     daemon = True
-    def __init__(self, host: str, port: int, title: str, bus: EventBus, control: ControlState, logger: logging.Logger):
+    def __init__(self, host: str, port: int, title: str, bus: EventBus, control: ControlState, logger: logging.Logger,
+                 submit: Optional[Callable[[str, str], int]] = None, metrics: Optional[MetricsRegistry] = None):
         super().__init__(name="WebServer")
         self.host = host
         self.port = port
@@ -688,6 +1563,8 @@ class WebServer(threading.Thread):
         self.control = control
         self.httpd: Optional[ThreadingHTTPServer] = None
         self.logger = logger
+        self.submit = submit  # (model, question) -> req_id; raises ValueError on bad input
+        self.metrics = metrics
 
     def _html(self) -> bytes:
         title = self.title
@@ -804,6 +1681,9 @@ main{{padding:16px 14px 36px;max-width:980px;margin:0 auto}}
             if(evt.status) s+=' • status '+evt.status;
             if(evt.load_time_s!==undefined) s+=' • loaded '+Number(evt.load_time_s).toFixed(2)+'s';
             if(evt.infer_time_s!==undefined) s+=' • infer '+Number(evt.infer_time_s).toFixed(2)+'s';
+            if(evt.ttft_s!=null) s+=' • ttft '+Number(evt.ttft_s).toFixed(2)+'s';
+            if(evt.tokens_per_s!=null) s+=' • '+Number(evt.tokens_per_s).toFixed(1)+' tok/s ('+evt.completion_tokens+' tok)';
+            if(evt.itl_p50_ms!=null) s+=' • itl p50/p99 '+Number(evt.itl_p50_ms).toFixed(0)+'/'+Number(evt.itl_p99_ms).toFixed(0)+'ms';
             m.textContent+=' • '+s;
           }}
           break;
@@ -818,7 +1698,8 @@ main{{padding:16px 14px 36px;max-width:980px;margin:0 auto}}
 """.encode("utf-8")
 
     def _make_handler(self):
-        bus, html_bytes, logger, control = self.bus, self._html(), self.logger, self.control
+        bus, html_bytes, logger, control, submit, metrics = (
+            self.bus, self._html(), self.logger, self.control, self.submit, self.metrics)
         class Handler(BaseHTTPRequestHandler):
             def log_message(self, fmt, *args):
                 logger.info("web: " + fmt, *args)
@@ -851,17 +1732,15 @@ main{{padding:16px 14px 36px;max-width:980px;margin:0 auto}}
                         self.wfile.write(b": hello\n\n")
                         self.wfile.flush()
                         while True:
-                            try:
-                                evt = q.get(timeout=15.0)
-                                payload = json.dumps(evt).encode("utf-8")
-                                self.wfile.write(b"data: " + payload + b"\n\n")
+                            batch = q.get_batch(timeout=15.0, frame_s=bus.token_frame_s)
+                            if not batch:
+                                self.wfile.write(b": keepalive\n\n")
                                 self.wfile.flush()
-                            except queue.Empty:
-                                try:
-                                    self.wfile.write(b": keepalive\n\n")
-                                    self.wfile.flush()
-                                except (BrokenPipeError, ConnectionResetError):
-                                    break
+                                continue
+                            # One write per frame; coalesced tokens arrive as a single event
+                            self.wfile.write(b"".join(
+                                b"data: " + json.dumps(evt).encode("utf-8") + b"\n\n" for evt in batch))
+                            self.wfile.flush()
                     except (BrokenPipeError, ConnectionResetError):
                         pass
                     finally:
@@ -881,6 +1760,14 @@ main{{padding:16px 14px 36px;max-width:980px;margin:0 auto}}
                         return self._json({"paused": paused})
                     except Exception as e:
                         return self._json({"error": str(e)}, status=400)
+                if self.path.startswith("/metrics") and metrics is not None:
+                    body = metrics.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Cache-Control", "no-cache")
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
                 if self.path.startswith("/state"):
                     try:
                         return self._json({
@@ -895,6 +1782,41 @@ main{{padding:16px 14px 36px;max-width:980px;margin:0 auto}}
                 self.send_header("Content-Type", "text/plain; charset=utf-8")
                 self.end_headers()
                 self.wfile.write(b"Not found")
+
+            def do_POST(self):
+                if self.path.rstrip("/") == "/api/submit":
+                    if submit is None:
+                        return self._json({"error": "submission disabled"}, status=503)
+                    try:
+                        length = int(self.headers.get("Content-Length") or 0)
+                        raw = self.rfile.read(length).decode("utf-8", errors="replace") if length > 0 else ""
+                        ctype = (self.headers.get("Content-Type") or "").lower()
+                        if "json" in ctype or raw.lstrip().startswith("{"):
+                            body = json.loads(raw or "{}")
+                            model = str(body.get("model") or "").strip()
+                            question = str(body.get("question") or "").strip()
+                            lane = str(body.get("priority") or "normal").strip().lower()
+                            deadline_s = body.get("deadline_s")
+                            deadline_s = float(deadline_s) if deadline_s not in (None, "") else None
+                        else:
+                            parsed = parse_request_line(raw)
+                            model, question = parsed if parsed else ("", "")
+                            model, lane, deadline_s = split_request_target(model)
+                        if not model or not question:
+                            raise ValueError("expected {\"model\": ..., \"question\": ...} or 'model|question'")
+                        if deadline_s is not None and deadline_s <= 0:
+                            raise ValueError("deadline_s must be positive")
+                        req_id = submit(model, question, lane, deadline_s)
+                        return self._json({"req_id": req_id, "model": model, "priority": lane})
+                    except ValueError as e:
+                        return self._json({"error": str(e)}, status=400)
+                    except Exception as e:
+                        return self._json({"error": str(e)}, status=500)
+
+                self.send_response(404)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.end_headers()
+                self.wfile.write(b"Not found")
         return Handler
 
     def run(self):
@@ -917,7 +1839,22 @@ main{{padding:16px 14px 36px;max-width:980px;margin:0 auto}}
 # --------------------------- RAM preload helpers ------------------------
 
 def warm_page_cache(path: Path, block_mb: int, logger: logging.Logger):
+    """
+    Ask the kernel to read `path` ahead into the page cache. posix_fadvise
+    (WILLNEED) queues the readahead without copying the file through Python;
+    pages already cached are not read again. Falls back to a read loop where
+    fadvise is unavailable.
+    """
     try:
+        fadvise = getattr(os, "posix_fadvise", None)
+        if fadvise is not None:
+            fd = os.open(str(path), os.O_RDONLY)
+            try:
+                fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+            logger.info("Page-cache readahead queued: %s", path)
+            return
         bs = max(1, int(block_mb)) * 1024 * 1024
         with path.open("rb") as f:
             while True:
@@ -928,36 +1865,196 @@ def warm_page_cache(path: Path, block_mb: int, logger: logging.Logger):
     except Exception as e:
         logger.warning("Page-cache warm failed for %s: %s", path, e)
 
-def copy_to_tmpfs(src: Path, dst_dir: Path, logger: logging.Logger) -> Optional[Path]:
-    try:
-        dst_dir.mkdir(parents=True, exist_ok=True)
-        dst = dst_dir / src.name
-        if dst.exists() and dst.stat().st_size == src.stat().st_size:
-            logger.info("RAM copy exists: %s", dst)
-            # Ensure executable bit for binaries
+def zero_copy_file(src_fd: int, dst_fd: int, size: int) -> None:
+    """
+    Copy `size` bytes between file descriptors inside the kernel:
+    copy_file_range, then sendfile, then a plain read/write loop. Each stage
+    resumes at the offset where the previous one stopped (cross-filesystem
+    copy_file_range fails with EXDEV on some kernels).
+    """
+    offset = 0
+    copy_range = getattr(os, "copy_file_range", None)
+    if copy_range is not None:
+        try:
+            while offset < size:
+                n = copy_range(src_fd, dst_fd, size - offset, offset, offset)
+                if n <= 0:
+                    break
+                offset += n
+        except OSError:
+            pass
+    if offset < size and hasattr(os, "sendfile"):
+        try:
+            os.lseek(dst_fd, offset, os.SEEK_SET)
+            while offset < size:
+                n = os.sendfile(dst_fd, src_fd, offset, min(size - offset, 1 << 30))
+                if n <= 0:
+                    break
+                offset += n
+        except OSError:
+            pass
+    if offset < size:
+        os.lseek(src_fd, offset, os.SEEK_SET)
+        os.lseek(dst_fd, offset, os.SEEK_SET)
+        while offset < size:
+            chunk = os.read(src_fd, min(size - offset, 16 * 1024 * 1024))
+            if not chunk:
+                break
+            os.write(dst_fd, chunk)
+            offset += len(chunk)
+    if offset != size:
+        raise OSError(f"short copy: {offset} of {size} bytes")
+
+@dataclass
+class StagedFile:
+    path: Path
+    size: int
+    mtime_ns: int               # source mtime, mirrored onto the staged copy
+    src: Optional[str] = None   # unknown for copies found from a previous run
+    refs: int = 0               # running servers using this copy
+    last_used: float = 0.0
+
+class TmpfsStagingCache:
+    """
+    Bounded staging area for model binaries/weights in a tmpfs directory.
+    - Copies are kernel-side (zero_copy_file) and carry the source mtime, so
+      a restart skips the copy when size and mtime still match
+    - Staged bytes stay under `capacity_gb` (default: the filesystem size) and
+      the copy must fit in the tmpfs free space; least-recently-used copies
+      are evicted first
+    - `acquire`/`release` pin a copy while a server runs from it; pinned
+      copies are never evicted
+    """
+
+    def __init__(self, directory: Path, capacity_gb: Optional[float], logger: logging.Logger):
+        self.dir = directory
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._entries: Dict[Path, StagedFile] = {}
+        self.dir.mkdir(parents=True, exist_ok=True)
+        if capacity_gb is not None:
+            self.capacity_bytes = int(float(capacity_gb) * (1024 ** 3))
+        else:
+            self.capacity_bytes = shutil.disk_usage(str(self.dir)).total
+        self._scan()
+
+    def _scan(self):
+        """Adopt copies left by a previous run; drop half-written temp files."""
+        for p in self.dir.iterdir():
             try:
-                dst.chmod(dst.stat().st_mode | 0o111)
-            except Exception:
-                pass
+                if p.name.endswith(".staging"):
+                    p.unlink()
+                    continue
+                if not p.is_file():
+                    continue
+                st = p.stat()
+                self._entries[p] = StagedFile(path=p, size=st.st_size, mtime_ns=st.st_mtime_ns)
+            except OSError:
+                continue
+
+    def used_bytes(self) -> int:
+        with self._lock:
+            return sum(e.size for e in self._entries.values())
+
+    def _dst_for(self, src: Path) -> Path:
+        dst = self.dir / src.name
+        e = self._entries.get(dst)
+        if e is None or e.src in (None, str(src)):
             return dst
+        # Same file name from a different directory: keep both copies
+        tag = hashlib.sha1(str(src).encode("utf-8")).hexdigest()[:8]
+        return self.dir / f"{tag}-{src.name}"
+
+    def _remove(self, e: StagedFile, reason: str):
+        self._entries.pop(e.path, None)
         try:
-            usage = shutil.disk_usage(str(dst_dir))
-            if usage.free < src.stat().st_size:
-                logger.warning("Not enough free tmpfs space to copy %s -> %s", src, dst_dir)
-                return None
-        except Exception:
+            e.path.unlink()
+        except FileNotFoundError:
             pass
-        logger.info("Copying to tmpfs: %s -> %s", src, dst)
-        with src.open("rb") as fsrc, dst.open("wb") as fdst:
-            shutil.copyfileobj(fsrc, fdst, length=16 * 1024 * 1024)
+        self.logger.info("Evicted staged file %s (%.2f GB, %s)", e.path, e.size / (1024 ** 3), reason)
+
+    def _make_room(self, needed: int, keep: Path, evict: bool) -> bool:
+        while True:
+            used = sum(e.size for e in self._entries.values())
+            try:
+                free = shutil.disk_usage(str(self.dir)).free
+            except OSError:
+                free = needed
+            if used + needed <= self.capacity_bytes and needed <= free:
+                return True
+            if not evict:
+                return False
+            victims = [e for e in self._entries.values() if e.refs == 0 and e.path != keep]
+            if not victims:
+                return False
+            self._remove(min(victims, key=lambda e: e.last_used), "lru")
+
+    def stage(self, src: Path, evict: bool = True) -> Optional[Path]:
+        """
+        Return a tmpfs copy of `src`, copying only if it is missing or stale.
+        With evict=False nothing is evicted to make room (used at startup, so
+        a large roster doesn't copy files only to evict them again).
+        """
         try:
-            dst.chmod(dst.stat().st_mode | 0o111)
-        except Exception:
-            pass
-        return dst
-    except Exception as e:
-        logger.warning("RAM copy failed for %s: %s", src, e)
-        return None
+            st = src.stat()
+        except OSError as e:
+            self.logger.warning("Cannot stage %s: %s", src, e)
+            return None
+        with self._lock:
+            dst = self._dst_for(src)
+            e = self._entries.get(dst)
+            if e and e.size == st.st_size and e.mtime_ns == st.st_mtime_ns and dst.exists():
+                e.src = str(src)
+                e.last_used = time.monotonic()
+                self.logger.info("RAM copy up to date: %s", dst)
+                return dst
+            refs = 0
+            if e:
+                refs = e.refs  # a running server keeps the old inode until it exits
+                if refs == 0:
+                    self._remove(e, "stale")
+                else:
+                    self._entries.pop(dst, None)
+            if not self._make_room(st.st_size, dst, evict):
+                self.logger.warning("Not enough tmpfs space to stage %s (%.2f GB) in %s",
+                                    src, st.st_size / (1024 ** 3), self.dir)
+                return None
+            tmp = dst.with_name(dst.name + ".staging")
+            t0 = time.perf_counter()
+            try:
+                with src.open("rb") as fsrc, tmp.open("wb") as fdst:
+                    zero_copy_file(fsrc.fileno(), fdst.fileno(), st.st_size)
+                os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+                tmp.chmod(st.st_mode | 0o111)  # binaries must stay executable
+                os.replace(tmp, dst)
+            except Exception as ex:
+                self.logger.warning("RAM copy failed for %s: %s", src, ex)
+                try:
+                    tmp.unlink()
+                except OSError:
+                    pass
+                return None
+            self._entries[dst] = StagedFile(path=dst, size=st.st_size, mtime_ns=st.st_mtime_ns,
+                                            src=str(src), refs=refs, last_used=time.monotonic())
+            self.logger.info("Staged %s -> %s (%.2f GB in %.2fs)", src, dst,
+                             st.st_size / (1024 ** 3), time.perf_counter() - t0)
+            return dst
+
+    def acquire(self, path: Path) -> bool:
+        with self._lock:
+            e = self._entries.get(path)
+            if not e:
+                return False
+            e.refs += 1
+            e.last_used = time.monotonic()
+            return True
+
+    def release(self, path: Path):
+        with self._lock:
+            e = self._entries.get(path)
+            if e:
+                e.refs = max(0, e.refs - 1)
+                e.last_used = time.monotonic()
 
 def detect_binary_from_cmd(launch_cmd: str) -> Optional[Path]:
     try:
@@ -996,18 +2093,119 @@ class ServerProcess:
     log_path: Path
     start_ts: float
     last_used_ts: float
+    client: Optional[KeepAliveClient] = None
+
+@dataclass
+class StreamStats:
+    """Per-request streaming timings; token counts prefer the server's `usage` block."""
+    ttft_s: Optional[float] = None          # send -> first content token
+    decode_s: Optional[float] = None        # first token -> end of stream
+    completion_tokens: int = 0
+    tokens_source: str = "chunks"           # "usage" | "chunks"
+    itl_ms: List[float] = field(default_factory=list)  # gaps between content chunks
+
+    @property
+    def decode_tokens_per_s(self) -> Optional[float]:
+        if not self.decode_s or self.completion_tokens < 2:
+            return None
+        return (self.completion_tokens - 1) / self.decode_s
+
+    def itl_pct_ms(self, q: float) -> Optional[float]:
+        return percentile(self.itl_ms, q)
+
+    def as_event(self) -> dict:
+        r = lambda v, n=3: round(v, n) if v is not None else None
+        return {
+            "ttft_s": r(self.ttft_s),
+            "completion_tokens": self.completion_tokens,
+            "tokens_per_s": r(self.decode_tokens_per_s, 2),
+            "itl_p50_ms": r(self.itl_pct_ms(50), 1),
+            "itl_p95_ms": r(self.itl_pct_ms(95), 1),
+            "itl_p99_ms": r(self.itl_pct_ms(99), 1),
+        }
 
 def build_base_url(host: str, port: int) -> str:
     if host.startswith("http://") or host.startswith("https://"):
         return f"{host}:{port}"
     return f"http://{host}:{port}"
 
-def is_port_open(host: str, port: int, timeout: float = 0.5) -> bool:
-    try:
-        with socket.create_connection((host, port), timeout=timeout):
-            return True
-    except Exception:
-        return False
+class PrefetchBackoff:
+    """
+    Remembers prefetch starts that were skipped or failed so the dispatcher
+    loop doesn't retry them every iteration. A model stays blocked until the
+    residency state it failed under (running servers, logical free VRAM)
+    changes and the per-model backoff (doubling up to max_s) has passed.
+    """
+    def __init__(self, base_s: float = 5.0, max_s: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.base_s = float(base_s)
+        self.max_s = float(max_s)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failed: Dict[str, Tuple[Tuple[FrozenSet[str], float], float, int]] = {}  # name -> (state, retry_at, n)
+
+    @staticmethod
+    def state(servers, free_gb: float) -> Tuple[FrozenSet[str], float]:
+        return frozenset(servers), round(float(free_gb), 2)
+
+    def record(self, name: str, state: Tuple[FrozenSet[str], float]):
+        with self._lock:
+            n = self._failed.get(name, (None, 0.0, 0))[2] + 1
+            delay = min(self.max_s, self.base_s * (2 ** (n - 1)))
+            self._failed[name] = (state, self.clock() + delay, n)
+
+    def clear(self, name: str):
+        with self._lock:
+            self._failed.pop(name, None)
+
+    def blocked(self, name: str, state: Tuple[FrozenSet[str], float]) -> bool:
+        with self._lock:
+            rec = self._failed.get(name)
+        if rec is None:
+            return False
+        failed_state, retry_at, _n = rec
+        return failed_state == state or self.clock() < retry_at
+
+class ModelWorker:
+    """
+    Serves one model: pulls requests handed over by the dispatcher and runs
+    them (load + stream) so different resident models generate concurrently.
+    With `slots` > 1 the same model streams several requests at once, one
+    thread per server slot (llama.cpp/llamafile `-np`).
+    """
+    def __init__(self, manager: "LLMManager", model_name: str, slots: int = 1):
+        self.manager = manager
+        self.model_name = model_name
+        self.inbox: "queue.Queue[Optional[InferenceRequest]]" = queue.Queue()
+        self.threads = [
+            threading.Thread(target=self._run, name=f"ModelWorker[{model_name}#{i}]", daemon=True)
+            for i in range(max(1, int(slots)))
+        ]
+
+    def start(self):
+        for t in self.threads:
+            t.start()
+
+    def is_alive(self) -> bool:
+        return any(t.is_alive() for t in self.threads)
+
+    def submit(self, req: InferenceRequest):
+        self.inbox.put(req)
+
+    def stop(self):
+        for _ in self.threads:
+            self.inbox.put(None)
+
+    def _run(self):
+        while True:
+            req = self.inbox.get()
+            if req is None:
+                break
+            try:
+                self.manager._handle_request(req)
+            except Exception as e:
+                self.manager.logger.exception("Worker '%s' failed on req %s: %s", self.model_name, req.req_id, e)
+            finally:
+                self.manager._release_model(self.model_name)
 
 
 # -------------------------------- Manager -------------------------------
@@ -1032,7 +2230,7 @@ class LLMManager:
 
         self._init_logging()
         self.csv_path = self.logs_dir / "requests_log.csv"
-        self._ensure_csv_header()
+        self.metrics = MetricsRegistry()
 
         # VRAM totals
         if cfg.gpu_override:
@@ -1042,12 +2240,16 @@ class LLMManager:
             total_vram = float(self.sys_specs.gpus[0].vram_total_gb) if self.sys_specs.gpus else 0.0
             gpu_name = self.sys_specs.gpus[0].name if self.sys_specs.gpus else "Unknown GPU"
 
-        self.vram = VRAMTracker(total_vram_gb=total_vram, reserve_gb=cfg.vram_reserve_gb)
+        self.vram = VRAMTracker(total_vram_gb=total_vram, reserve_gb=cfg.vram_reserve_gb,
+                                policy=make_eviction_policy(cfg.eviction_policy))
         self.logger.info(
-            "GPU: %s | VRAM total: %.2f GB (reserve %.2f GB) | safety margin: %.2f GB | exclusive_mode=%s | allow_oversubscription=%s",
+            "GPU: %s | VRAM total: %.2f GB (reserve %.2f GB) | safety margin: %.2f GB | exclusive_mode=%s | allow_oversubscription=%s | eviction=%s",
             gpu_name, self.vram.total_vram_gb, self.vram.reserve_gb, self.cfg.safety_vram_margin_gb,
-            self.cfg.exclusive_mode, self.cfg.allow_oversubscription
+            self.cfg.exclusive_mode, self.cfg.allow_oversubscription, self.vram.policy.name
         )
+        self._seed_load_times_from_csv()
+        self.csv_sink = CsvSink(self.csv_path, self.CSV_HEADER, cfg.csv_flush_interval_s)
+        self.csv_sink.start()
 
         # Models
         self.models: Dict[str, ModelSpec] = {m.name: m for m in cfg.models}
@@ -1055,19 +2257,44 @@ class LLMManager:
             raise RuntimeError("No models configured.")
 
         # RAM preload for binaries & weights before any server starts
+        self._staging: Dict[str, Optional[TmpfsStagingCache]] = {}
+        self._stage_plan: Dict[str, List[Tuple[str, Path, Optional[TmpfsStagingCache]]]] = defaultdict(list)
+        self._pinned: Dict[str, List[Tuple[TmpfsStagingCache, Path]]] = {}
         self._prepare_ram_cache_for_binaries_and_weights()
 
-        # Scheduler & tailer
-        self.scheduler = FairScheduler(cfg.fairness_timeslice_s, cfg.starvation_avoidance_min_other)
-        self.tailer = RequestsTailer(Path(cfg.requests_file), cfg.process_existing_requests_on_start, 0.5)
+        # Journal, scheduler & tailer
+        self.journal: Optional[RequestJournal] = None
+        if cfg.journal_enabled:
+            self.journal = RequestJournal(Path(cfg.journal_path) if cfg.journal_path
+                                          else self.logs_dir / "requests_journal.sqlite3")
+        self.scheduler = FairScheduler(cfg.fairness_timeslice_s, cfg.starvation_avoidance_min_other,
+                                       lane_deadlines_s=cfg.lane_deadlines_s, switch_cost=self._switch_cost)
+        self._resume_from_journal()
+        self.tailer = RequestsTailer(Path(cfg.requests_file), cfg.process_existing_requests_on_start, 0.5,
+                                     journal=self.journal)
         self.tailer_q = self.tailer.get_queue()
 
         # Running servers
         self.servers: Dict[str, ServerProcess] = {}
         self._stop = threading.Event()
 
+        # Concurrent dispatch: one worker per model, serialized server start/stop
+        self.workers: Dict[str, ModelWorker] = {}
+        self._inflight: Dict[str, int] = defaultdict(int)  # model -> requests handed to its worker
+        self._busy_lock = threading.Lock()
+        self._lifecycle_lock = threading.RLock()
+
+        # Prefetch state (models being started/warmed ahead of their turn)
+        self._prefetching: Set[str] = set()
+        self._warmed: Set[str] = set()
+        self._starting: Dict[str, threading.Event] = {}  # prefetch loads running outside the lifecycle lock
+        self._prefetch_lock = threading.Lock()
+        self._prefetch_backoff = PrefetchBackoff()
+
         # Web
-        self.web = WebServer(cfg.web_host, cfg.web_port, cfg.web_title, self.bus, self.control, self.logger)
+        self._init_metrics()
+        self.web = WebServer(cfg.web_host, cfg.web_port, cfg.web_title, self.bus, self.control, self.logger,
+                             submit=self._submit_api, metrics=self.metrics)
         self.web.start()
 
         # Publish initial paused state
@@ -1087,35 +2314,134 @@ class LLMManager:
         self.logger.addHandler(fh)
         self.logger.addHandler(ch)
 
-    def _ensure_csv_header(self):
-        header = [
-            "request_id",
-            "received_ts",
-            "start_ts",
-            "end_ts",
-            "model",
-            "question",
-            "load_time_s",
-            "inference_time_s",
-            "server_was_running",
-            "evicted_models",
-            "answer_path",
-            "endpoint_status",
-        ]
-        if not self.csv_path.exists():
-            with self.csv_path.open("w", newline="", encoding="utf-8") as f:
-                csv.writer(f).writerow(header)
+    CSV_HEADER = [
+        "request_id",
+        "received_ts",
+        "start_ts",
+        "end_ts",
+        "model",
+        "question",
+        "load_time_s",
+        "inference_time_s",
+        "server_was_running",
+        "evicted_models",
+        "answer_path",
+        "endpoint_status",
+        "ttft_s",
+        "completion_tokens",
+        "tokens_per_s",
+        "itl_p50_ms",
+        "itl_p95_ms",
+        "itl_p99_ms",
+        "lane",
+        "deadline_slack_s",
+    ]
 
     def _append_csv(self, row: List):
-        with self.csv_path.open("a", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow(row)
+        self.csv_sink.write(row)
+
+    # ----- metrics -----
+
+    def _init_metrics(self):
+        mx = self.metrics
+        mx.describe("requests_received_total", "counter", "Requests accepted into the queue.")
+        mx.describe("requests_completed_total", "counter", "Requests finished, by endpoint status.")
+        mx.describe("queue_wait_seconds", "histogram", "Time from arrival to dispatch, by priority lane.")
+        mx.describe("deadline_misses_total", "counter", "Requests completed after their deadline.")
+        mx.describe("time_to_first_token_seconds", "histogram", "Time from sending the completion to the first token.")
+        mx.describe("inference_seconds", "histogram", "Streaming time per request.")
+        mx.describe("completion_tokens_total", "counter", "Streamed completion tokens.")
+        mx.describe("decode_tokens_per_second", "histogram", "Per-request decode rate after the first token.",
+                    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 400))
+        mx.describe("model_load_seconds", "histogram", "Cold server start time.")
+        mx.describe("model_loads_total", "counter", "Cold server starts (including prefetch).")
+        mx.describe("model_start_failures_total", "counter", "Server starts that failed.")
+        mx.describe("model_evictions_total", "counter", "Servers stopped to make room, by reason.")
+        mx.describe("queue_depth", "gauge", "Queued requests per model.")
+        mx.describe("requests_inflight", "gauge", "Requests handed to a model worker and not finished.")
+        mx.describe("model_loaded", "gauge", "1 if the model's server is running.")
+        mx.describe("vram_free_gb", "gauge", "Logical free VRAM (total - reserve - loaded budgets).")
+        mx.describe("tmpfs_staged_bytes", "gauge", "Bytes of model files staged in each tmpfs cache dir.")
+        lbl = MetricsRegistry.labels
+        mx.gauge_fn("queue_depth", lambda: {
+            lbl(model=name): float(next((c["count"] for c in self.bus.snap_queue_counts if c["model"] == name), 0))
+            for name in self.models})
+        mx.gauge_fn("requests_inflight", lambda: {lbl(model=name): float(self._inflight.get(name, 0)) for name in self.models})
+        mx.gauge_fn("model_loaded", lambda: {lbl(model=name): float(name in self.servers) for name in self.models})
+        mx.gauge_fn("vram_free_gb", lambda: {lbl(): self.vram.free_gb()})
+        mx.gauge_fn("tmpfs_staged_bytes", lambda: {
+            lbl(dir=d): float(c.used_bytes()) for d, c in self._staging.items() if c is not None})
+
+    def _seed_load_times_from_csv(self):
+        """Prime per-model reload cost from previous runs' cold loads."""
+        if not self.csv_path.exists():
+            return
+        n = 0
+        try:
+            with self.csv_path.open("r", newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    if row.get("server_was_running") != "0" or row.get("endpoint_status") == "start_failed":
+                        continue
+                    try:
+                        load_s = float(row.get("load_time_s") or 0.0)
+                    except ValueError:
+                        continue
+                    if load_s > 0 and row.get("model"):
+                        self.vram.record_load_time(row["model"], load_s)
+                        n += 1
+        except Exception as e:
+            self.logger.warning("Could not read load history from %s: %s", self.csv_path, e)
+            return
+        if n:
+            self.logger.info("Seeded reload costs from %d cold loads: %s", n,
+                             {k: round(v, 2) for k, v in self.vram.load_time_s.items()})
+
+    def _resume_from_journal(self):
+        """Re-queue requests that were queued or running when the last run ended."""
+        if not self.journal:
+            return
+        rows = self.journal.pending()
+        offset = time.perf_counter() - time.time()
+        for req_id, model, question, arrival_wall, lane, deadline_wall in rows:
+            req = InferenceRequest(req_id, model, question, min(arrival_wall + offset, time.perf_counter()), lane,
+                                   deadline_wall + offset if deadline_wall is not None else None)
+            if model not in self.models:
+                self.logger.warning("Journaled req %d is for unknown model '%s'; dropping.", req_id, model)
+                self.journal.completed(req_id, "unknown_model")
+                continue
+            self.scheduler.add(req)
+            self.metrics.inc("requests_received_total", model=model)
+        if rows:
+            self.logger.info("Resumed %d pending request(s) from %s", len(rows), self.journal.path)
+
+    def _switch_cost(self, model_name: str) -> float:
+        """Seconds to make a model servable: 0 if resident, else its (estimated) load time."""
+        if model_name in self.servers:
+            return 0.0
+        measured = self.vram.load_time_s.get(model_name)
+        if measured is not None:
+            return measured
+        return DEFAULT_LOAD_S_PER_GB * float(self.models[model_name].vram_gb)
+
+    # ----- direct submission (POST /api/submit) -----
+
+    def _submit_api(self, model: str, question: str, lane: str = "normal", deadline_s: Optional[float] = None) -> int:
+        if model not in self.models:
+            raise ValueError(f"unknown model '{model}'")
+        if lane not in PRIORITY_LANES:
+            raise ValueError(f"unknown priority lane '{lane}' (expected one of {', '.join(PRIORITY_LANES)})")
+        req = self.tailer.submit(model, question, lane=lane, deadline_s=deadline_s)
+        self.logger.info("API submit -> req %d for '%s' (%s)", req.req_id, model, lane)
+        return req.req_id
 
     # ----- queue snapshot publishing -----
 
+    def _queued_for(self, model_name: str) -> int:
+        return self.scheduler.queued(model_name)
+
     def _queue_counts(self) -> List[dict]:
         items = []
-        for model, dq in self.scheduler.queues.items():
-            n = len(dq)
+        for model, n in self.scheduler.counts.items():
             if n > 0:
                 items.append((model, n))
         items.sort(key=lambda kv: (-kv[1], kv[0]))
@@ -1123,10 +2449,23 @@ class LLMManager:
 
     def _publish_queue_snapshot(self):
         counts = self._queue_counts()
+        if counts == self.bus.snap_queue_counts:
+            return  # unchanged; don't flood subscribers from the dispatch loop
         self.bus.publish({"type": "queue_update", "counts": counts})
 
     # ----- RAM preload -----
 
+    def _staging_cache(self, directory: str, capacity_gb: Optional[float]) -> Optional[TmpfsStagingCache]:
+        """One staging cache per tmpfs dir (binaries and weights may share one)."""
+        key = str(Path(directory).resolve())
+        if key not in self._staging:
+            try:
+                self._staging[key] = TmpfsStagingCache(Path(key), capacity_gb, self.logger)
+            except Exception as e:
+                self.logger.warning("tmpfs staging disabled for %s: %s", directory, e)
+                self._staging[key] = None
+        return self._staging[key]
+
     def _prepare_ram_cache_for_binaries_and_weights(self):
         # Binaries
         for m in self.models.values():
@@ -1140,17 +2479,10 @@ class LLMManager:
                 if inferred and inferred.exists():
                     bin_src = inferred
             if bin_src and m.preload_binary_to_ram:
+                cache = None
                 if m.prefer_bin_copy_to_tmpfs and os.path.isdir("/dev/shm"):
-                    dst = copy_to_tmpfs(bin_src, Path(self.cfg.bin_cache_tmpfs_dir), self.logger)
-                    if dst and dst.exists():
-                        m.prepared_binary_path = str(dst.resolve())
-                        self.logger.info("Prepared BIN RAM copy for '%s': %s", m.name, m.prepared_binary_path)
-                    else:
-                        warm_page_cache(bin_src, self.cfg.pagecache_warm_block_mb, self.logger)
-                        m.prepared_binary_path = str(bin_src)
-                else:
-                    warm_page_cache(bin_src, self.cfg.pagecache_warm_block_mb, self.logger)
-                    m.prepared_binary_path = str(bin_src)
+                    cache = self._staging_cache(self.cfg.bin_cache_tmpfs_dir, self.cfg.bin_cache_capacity_gb)
+                self._stage_plan[m.name].append(("binary", bin_src, cache))
             else:
                 if m.preload_binary_to_ram and not bin_src:
                     self.logger.warning("Binary path not set/inferable for '%s'; skipping binary preload.", m.name)
@@ -1165,21 +2497,46 @@ class LLMManager:
             if not src.exists():
                 self.logger.warning("weights_path for '%s' not found: %s", m.name, src)
                 continue
+            cache = None
             if m.prefer_ram_copy_to_tmpfs and os.path.isdir("/dev/shm"):
-                dst = copy_to_tmpfs(src, Path(self.cfg.ram_cache_tmpfs_dir), self.logger)
-                if dst and dst.exists():
-                    m.prepared_weights_path = str(dst.resolve())
-                    self.logger.info("Prepared WEIGHTS RAM copy for '%s': %s", m.name, m.prepared_weights_path)
-                else:
-                    warm_page_cache(src, self.cfg.pagecache_warm_block_mb, self.logger)
-                    m.prepared_weights_path = str(src.resolve())
-            else:
-                warm_page_cache(src, self.cfg.pagecache_warm_block_mb, self.logger)
-                m.prepared_weights_path = str(src.resolve())
+                cache = self._staging_cache(self.cfg.ram_cache_tmpfs_dir, self.cfg.ram_cache_capacity_gb)
+            self._stage_plan[m.name].append(("weights", src.resolve(), cache))
+
+        # Stage what fits without evicting; the rest is staged on first start
+        for m in self.models.values():
+            for kind, src, cache in self._stage_plan[m.name]:
+                self._stage_model_file(m, kind, src, cache, evict=False)
+
+    def _stage_model_file(self, m: ModelSpec, kind: str, src: Path,
+                          cache: Optional[TmpfsStagingCache], evict: bool) -> Path:
+        """Point the model at its tmpfs copy, or at the page-cache warmed source."""
+        path = cache.stage(src, evict=evict) if cache else None
+        if path is None:
+            warm_page_cache(src, self.cfg.pagecache_warm_block_mb, self.logger)
+            path = src
+        setattr(m, f"prepared_{kind}_path", str(path))
+        return path
+
+    def _pin_staged_files(self, m: ModelSpec):
+        """Re-stage evicted/stale copies and pin them while the server runs."""
+        pinned: List[Tuple[TmpfsStagingCache, Path]] = []
+        for kind, src, cache in self._stage_plan.get(m.name, []):
+            if cache is None:
+                continue
+            path = self._stage_model_file(m, kind, src, cache, evict=True)
+            if cache.acquire(path):
+                pinned.append((cache, path))
+        self._pinned[m.name] = pinned
+
+    def _unpin_staged_files(self, model_name: str):
+        for cache, path in self._pinned.pop(model_name, []):
+            cache.release(path)
 
     # ----- lifecycle -----
 
     def start(self):
+        if self.journal:
+            self.journal.start()
         self.logger.info("Starting RequestsTailer on %s", self.cfg.requests_file)
         self.tailer.start()
         try:
@@ -1191,14 +2548,16 @@ class LLMManager:
                         req = self.tailer_q.get_nowait()
                         if req.model_name not in self.models:
                             self.logger.warning("Unknown model '%s' (req %s). Skipping.", req.model_name, req.req_id)
+                            if self.journal:
+                                self.journal.completed(req.req_id, "unknown_model")
                             continue
                         self.scheduler.add(req)
+                        self.metrics.inc("requests_received_total", model=req.model_name)
                         changed = True
                     # fallthrough if empty
                 except queue.Empty:
                     pass
-                # Publish queue if changed
-                # (lightweight; OK to publish on each loop too)
+                # Publish queue if changed (no-op otherwise)
                 self._publish_queue_snapshot()
 
                 # Respect pause
@@ -1210,15 +2569,14 @@ class LLMManager:
                     time.sleep(0.05)
                     continue
 
-                next_req = self.scheduler.next_request()
-                if not next_req:
+                dispatched = self._dispatch_ready()
+                self._maybe_prefetch()
+                if not dispatched:
                     time.sleep(0.02)
                     continue
 
-                # Popped one => queue length changed
+                # Popped at least one => queue length changed
                 self._publish_queue_snapshot()
-
-                self._handle_request(next_req)
         except KeyboardInterrupt:
             self.logger.info("Interrupted; shutting down.")
         except Exception as e:
@@ -1234,23 +2592,198 @@ class LLMManager:
             self.tailer.stop()
         except Exception:
             pass
+        for w in list(self.workers.values()):
+            w.stop()
         for name in list(self.servers.keys()):
             self._stop_server(name)
         try:
             self.web.stop()
         except Exception:
             pass
+        self.csv_sink.stop()
+        if self.journal and self.journal.is_alive():
+            self.journal.stop()
+
+    # ----- dispatch -----
+
+    def _busy_models(self) -> Set[str]:
+        with self._busy_lock:
+            return {name for name, n in self._inflight.items() if n > 0}
+
+    def _release_model(self, model_name: str):
+        with self._busy_lock:
+            self._inflight[model_name] = max(0, self._inflight[model_name] - 1)
+        self._publish_active_models()
+
+    def _publish_active_models(self):
+        busy = sorted(self._busy_models())
+        self.bus.publish({"type": "active_model", "model": ", ".join(busy) if busy else None, "models": busy})
+
+    def _can_dispatch(self, model_name: str) -> bool:
+        """
+        A model can be dispatched when its worker has a free slot and loading
+        it would not require evicting a model that is currently generating.
+        """
+        with self._busy_lock:
+            inflight = self._inflight[model_name]
+        if inflight > 0:
+            # Already loaded/loading for this model; only the slot count limits us
+            return inflight < max(1, int(self.models[model_name].max_parallel_slots))
+        busy = self._busy_models()
+        if not busy:
+            return True
+        if self.cfg.exclusive_mode:
+            return False
+        if model_name in self.servers or self.cfg.allow_oversubscription:
+            return True
+        m = self.models[model_name]
+        required_gb = float(m.vram_gb) + float(self.cfg.safety_vram_margin_gb)
+        pinned_gb = sum(float(self.models[b].vram_gb) for b in busy)
+        budget = self.vram.total_vram_gb - self.vram.reserve_gb - pinned_gb
+        return budget >= required_gb
+
+    def _dispatch_ready(self) -> bool:
+        """Hand every dispatchable request to its model worker; True if any were dispatched."""
+        dispatched = False
+        while True:
+            req = self.scheduler.next_request(eligible=self._can_dispatch)
+            if not req:
+                break
+            with self._busy_lock:
+                self._inflight[req.model_name] += 1
+            w = self.workers.get(req.model_name)
+            if w is None or not w.is_alive():
+                w = ModelWorker(self, req.model_name, self.models[req.model_name].max_parallel_slots)
+                self.workers[req.model_name] = w
+                w.start()
+            w.submit(req)
+            dispatched = True
+        if dispatched:
+            self._publish_active_models()
+        return dispatched
+
+    # ----- prefetch -----
+
+    def _maybe_prefetch(self):
+        """
+        While some model is generating, look ahead in the scheduler's order and
+        start the next model's server if it fits in free VRAM (without evicting
+        anything); otherwise warm its files into the page cache.
+        """
+        if not self.cfg.prefetch_enabled:
+            return
+        busy = self._busy_models()
+        if not busy:
+            return  # idle GPU: the dispatcher loads the next model directly
+        lookahead = max(0, int(self.cfg.prefetch_lookahead))
+        upcoming = [name for name in self.scheduler.peek_order()
+                    if name not in busy and name not in self.servers][:lookahead]
+        state = self._prefetch_state()
+        for name in upcoming:
+            with self._prefetch_lock:
+                if name in self._prefetching:
+                    continue
+                m = self.models[name]
+                required_gb = float(m.vram_gb) + float(self.cfg.safety_vram_margin_gb)
+                pending_gb = sum(float(self.models[p].vram_gb) for p in self._prefetching)
+                fits = (self.vram.free_gb() - pending_gb) >= required_gb
+                if fits and not self.cfg.exclusive_mode and m.launch_cmd \
+                        and not self._prefetch_backoff.blocked(name, state):
+                    target = self._prefetch_server
+                elif name not in self._warmed:
+                    target = self._prefetch_warm
+                else:
+                    continue
+                self._prefetching.add(name)
+            threading.Thread(target=target, args=(m,), name=f"Prefetch[{name}]", daemon=True).start()
+
+    def _prefetch_state(self):
+        return PrefetchBackoff.state(self.servers, self.vram.free_gb())
+
+    def _prefetch_server(self, m: ModelSpec):
+        """
+        Only the VRAM check and reservation run under the lifecycle lock; the
+        load itself (up to startup_timeout_s) runs outside it so on-demand
+        starts and evictions of other models aren't held up by a speculative
+        one. The lock is re-taken to commit the start or roll it back.
+        """
+        reserved = None
+        try:
+            with self._lifecycle_lock:
+                if m.name in self.servers or m.name in self._starting or self._stop.is_set():
+                    return
+                required_gb = float(m.vram_gb) + float(self.cfg.safety_vram_margin_gb)
+                free_actual = get_actual_vram_free_gb(self.logger)
+                free_cons = min(free_actual if free_actual is not None else float("inf"), self.vram.free_gb())
+                if free_cons >= required_gb:
+                    # reserve: the logical tracker counts it, eviction and other starts skip it
+                    reserved = self._starting[m.name] = threading.Event()
+                    self.vram.account_start(m.name, m.vram_gb)
+            if reserved is None:
+                self.logger.info("Prefetch '%s' skipped: %.2f GB free < %.2f GB required", m.name, free_cons, required_gb)
+                self._warm_model_files(m)
+                return
+            t0 = time.perf_counter()
+            ok = self._start_server(m)
+            load_s = time.perf_counter() - t0
+            with self._lifecycle_lock:
+                if ok and self._stop.is_set():
+                    self._stop_server(m.name)
+                elif ok:
+                    self.vram.record_load_time(m.name, load_s)
+                    self.metrics.inc("model_loads_total", model=m.name)
+                    self.metrics.observe("model_load_seconds", load_s, model=m.name)
+                    self.logger.info("Prefetched server '%s' in %.2fs", m.name, load_s)
+                    self._prefetch_backoff.clear(m.name)
+                else:
+                    self.vram.account_stop(m.name)
+                    self.logger.warning("Prefetch start failed for '%s'; will load on demand.", m.name)
+        except Exception as e:
+            self.logger.warning("Prefetch error for '%s': %s", m.name, e)
+            if reserved is not None and m.name not in self.servers:
+                self.vram.account_stop(m.name)
+        finally:
+            if reserved is not None:
+                with self._lifecycle_lock:
+                    self._starting.pop(m.name, None)
+                reserved.set()
+            if m.name not in self.servers and not self._stop.is_set():
+                # skipped (nvidia-smi disagreed) or failed: back off until residency changes
+                self._prefetch_backoff.record(m.name, self._prefetch_state())
+            with self._prefetch_lock:
+                self._prefetching.discard(m.name)
+
+    def _prefetch_warm(self, m: ModelSpec):
+        try:
+            self._warm_model_files(m)
+        finally:
+            with self._prefetch_lock:
+                self._prefetching.discard(m.name)
+
+    def _warm_model_files(self, m: ModelSpec):
+        """Page-cache warm a model's binary/weights unless they already live in tmpfs."""
+        tmpfs_dirs = [Path(self.cfg.bin_cache_tmpfs_dir).resolve(), Path(self.cfg.ram_cache_tmpfs_dir).resolve()]
+        for raw in (m.prepared_binary_path or m.binary_path, m.prepared_weights_path or m.weights_path):
+            if not raw:
+                continue
+            p = Path(raw).resolve()
+            if any(d in p.parents for d in tmpfs_dirs) or not p.exists():
+                continue
+            warm_page_cache(p, self.cfg.pagecache_warm_block_mb, self.logger)
+        with self._prefetch_lock:
+            self._warmed.add(m.name)
 
     # ----- exclusivity & VRAM waits -----
 
     def _enforce_exclusive(self, target_name: str):
         if not self.cfg.exclusive_mode:
             return
-        victims = [name for name in list(self.servers.keys()) if name != target_name]
+        busy = self._busy_models()
+        victims = [name for name in list(self.servers.keys()) if name != target_name and name not in busy]
         if victims:
             self.logger.info("exclusive_mode=True -> stopping other servers: %s", victims)
         for v in victims:
-            self._stop_server(v)
+            self._evict(v, "exclusive")
 
     def _wait_for_vram_free(self, required_gb: float) -> bool:
         retries = int(max(1, self.cfg.post_stop_check_retries))
@@ -1273,6 +2806,7 @@ class LLMManager:
         filled = cmd_tmpl.format(
             host=m.host,
             port=m.port,
+            parallel=max(1, int(m.max_parallel_slots)),
             binary=(m.prepared_binary_path or m.binary_path or ""),
             weights=(m.prepared_weights_path or m.weights_path or "")
         )
@@ -1286,6 +2820,24 @@ class LLMManager:
     # ----- server controls -----
 
     def _ensure_server_running(self, m: ModelSpec) -> Tuple[bool, float, List[str]]:
+        # Fast path: already resident (e.g. prefetched); don't queue behind a load
+        if not self.cfg.exclusive_mode and m.name in self.servers:
+            self.vram.touch(m.name)
+            return True, 0.0, []
+        # Starts/stops are serialized; streams on other models keep running.
+        # A prefetch of this model loads outside the lock: wait for it to finish
+        # rather than starting a second server on the same port.
+        while True:
+            pending = self._starting.get(m.name)
+            if pending is not None:
+                pending.wait()
+                continue
+            with self._lifecycle_lock:
+                if m.name in self._starting:
+                    continue
+                return self._ensure_server_running_locked(m)
+
+    def _ensure_server_running_locked(self, m: ModelSpec) -> Tuple[bool, float, List[str]]:
         # Hard gate: exclusive mode stops others first
         self._enforce_exclusive(m.name)
 
@@ -1296,7 +2848,7 @@ class LLMManager:
         required_gb = float(m.vram_gb) + float(self.cfg.safety_vram_margin_gb)
         evicted: List[str] = []
 
-        # If not exclusive, proactively evict LRU until free meets requirement
+        # If not exclusive, proactively evict (policy order) until free meets requirement
         if not self.cfg.exclusive_mode:
             for _ in range(10):
                 free_actual = get_actual_vram_free_gb(self.logger)
@@ -1307,11 +2859,15 @@ class LLMManager:
                 )
                 if free_cons >= required_gb or self.cfg.allow_oversubscription:
                     break
-                lru = [x for x in self.vram.list_lru() if x != m.name]
-                if not lru:
+                busy = self._busy_models()
+                order = [x for x in self.vram.eviction_order(self._queued_for)
+                         if x != m.name and x not in busy and x not in self._starting]
+                if not order:
                     break
-                victim = lru[0]
-                self._stop_server(victim)
+                victim = order[0]
+                self.logger.info("Evicting '%s' for '%s' (policy=%s)", victim, m.name, self.vram.policy.name)
+                self.vram.note_eviction(victim, self._queued_for)
+                self._evict(victim, "vram")
                 evicted.append(victim)
 
         # After any stops (or exclusive mode), wait for VRAM to be truly free
@@ -1325,9 +2881,10 @@ class LLMManager:
         # If start fails, evict & retry once
         if not ok and self.cfg.evict_and_retry_on_start_failure:
             self.logger.warning("Start failed for '%s'. Evicting others and retrying once...", m.name)
+            busy = self._busy_models()
             for victim in list(self.servers.keys()):
-                if victim != m.name:
-                    self._stop_server(victim)
+                if victim != m.name and victim not in busy:
+                    self._evict(victim, "start_retry")
             self._wait_for_vram_free(required_gb)
             t1 = time.perf_counter()
             ok = self._start_server(m)
@@ -1335,9 +2892,13 @@ class LLMManager:
 
         if not ok:
             self.vram.account_stop(m.name)
+            self.metrics.inc("model_start_failures_total", model=m.name)
             raise RuntimeError(f"Failed to start server for model '{m.name}' on {m.host}:{m.port}")
 
         self.vram.account_start(m.name, m.vram_gb)
+        self.vram.record_load_time(m.name, load_time)
+        self.metrics.inc("model_loads_total", model=m.name)
+        self.metrics.observe("model_load_seconds", load_time, model=m.name)
         return False, load_time, evicted
 
     def _start_server(self, m: ModelSpec) -> bool:
@@ -1353,6 +2914,7 @@ class LLMManager:
         port = int(m.port)
         base_url = build_base_url(host, port)
         log_path = self.logs_dir / f"server_{sanitize_filename(m.name)}.log"
+        self._pin_staged_files(m)
         cmd = self._resolve_launch_cmd(m)
         self.logger.info("Starting server for '%s' -> %s | cmd: %s", m.name, base_url, cmd)
 
@@ -1379,47 +2941,41 @@ class LLMManager:
             pop = subprocess.Popen(cmd, **popen_kwargs)
         except Exception as e:
             self.logger.error("Popen failed for '%s': %s", m.name, e)
+            self._unpin_staged_files(m.name)
             try:
                 log_fh.close()
             except Exception:
                 pass
             return False
 
-        # Wait for TCP port or early exit
-        deadline = time.time() + float(m.startup_timeout_s)
-        while time.time() < deadline:
-            if pop.poll() is not None:
-                self.logger.error("Server '%s' exited early (code %s).", m.name, pop.returncode)
-                try:
-                    log_fh.close()
-                except Exception:
-                    pass
-                return False
-            if is_port_open(host, port, timeout=0.3):
-                break
-            time.sleep(0.2)
-
-        # HTTP readiness probe
+        # HTTP readiness probe over the server's keep-alive client; a refused
+        # connection fails fast, so no separate TCP port poll is needed
+        client = KeepAliveClient(base_url, max_idle=max(2, int(m.max_parallel_slots)))
         headers = {}
         if m.api_key:
             headers["Authorization"] = f"Bearer {m.api_key}"
         http_ready = False
-        for _ in range(int(max(1, m.startup_timeout_s / 0.4))):
+        deadline = time.time() + float(m.startup_timeout_s)
+        while time.time() < deadline:
             if pop.poll() is not None:
-                self.logger.error("Server '%s' exited during readiness (code %s).", m.name, pop.returncode)
+                self.logger.error("Server '%s' exited early (code %s).", m.name, pop.returncode)
                 break
             for path in [m.ready_path, "/health", "/"]:
-                status, _, _ = http_get(f"{base_url}{path}", headers=headers, timeout=2.0)
-                if status and 200 <= status < 500:
+                status, _, _ = client.get(path, headers=headers, timeout=2.0)
+                if status is None:
+                    break  # not listening yet; don't try the other paths
+                if 200 <= status < 500:
                     http_ready = True
                     break
             if http_ready:
                 break
-            time.sleep(0.4)
+            time.sleep(0.2)
 
         if not http_ready:
             self.logger.error("Server '%s' did not become HTTP-ready.", m.name)
+            client.close()
             self._terminate_popen(pop, m.shutdown_grace_s)
+            self._unpin_staged_files(m.name)
             try:
                 log_fh.close()
             except Exception:
@@ -1435,6 +2991,7 @@ class LLMManager:
             log_path=log_path,
             start_ts=time.perf_counter(),
             last_used_ts=time.perf_counter(),
+            client=client,
         )
         self.servers[m.name] = sp
         self.logger.info("Server '%s' is ready at %s", m.name, base_url)
@@ -1536,17 +3093,28 @@ class LLMManager:
         except Exception as e:
             self.logger.warning("Error while terminating process: %s", e)
 
+    def _evict(self, model_name: str, reason: str):
+        if model_name in self.servers:
+            self.metrics.inc("model_evictions_total", model=model_name, reason=reason)
+        self._stop_server(model_name)
+
     def _stop_server(self, model_name: str):
-        sp = self.servers.get(model_name)
-        if not sp:
-            self.vram.account_stop(model_name)
-            return
-        self.logger.info("Stopping server for '%s' (port %s)", model_name, sp.port)
-        try:
-            self._terminate_popen(sp.popen, grace_s=self.models[model_name].shutdown_grace_s)
-        finally:
-            self.servers.pop(model_name, None)
-            self.vram.account_stop(model_name)
+        with self._lifecycle_lock:
+            sp = self.servers.get(model_name)
+            if not sp:
+                self.vram.account_stop(model_name)
+                return
+            self.logger.info("Stopping server for '%s' (port %s)", model_name, sp.port)
+            try:
+                if sp.client:
+                    sp.client.close()
+                self._terminate_popen(sp.popen, grace_s=self.models[model_name].shutdown_grace_s)
+            finally:
+                self.servers.pop(model_name, None)
+                self.vram.account_stop(model_name)
+                self._unpin_staged_files(model_name)
+                with self._prefetch_lock:
+                    self._warmed.discard(model_name)
 
     # ----- inference streaming -----
 
@@ -1567,7 +3135,7 @@ class LLMManager:
                 return str(txt)
         return str(obj.get("content") or "")
 
-    def _send_inference_stream(self, m: ModelSpec, question: str, req_id: int) -> Tuple[str, int]:
+    def _send_inference_stream(self, m: ModelSpec, question: str, req_id: int) -> Tuple[str, int, StreamStats]:
         sp = self.servers.get(m.name)
         if not sp:
             raise RuntimeError(f"Server for '{m.name}' not running.")
@@ -1576,22 +3144,40 @@ class LLMManager:
             headers["Authorization"] = f"Bearer {m.api_key}"
         if m.api_type != "openai_compat":
             raise NotImplementedError(f"api_type '{m.api_type}' not implemented.")
-        url = f"{sp.base_url}{m.completion_path}"
         payload = {
             "model": m.name,
             "messages": [{"role": "user", "content": question}],
             "temperature": float(m.temperature),
             "max_tokens": int(m.max_tokens),
-            "stream": True
+            "stream": True,
+            "stream_options": {"include_usage": True},
         }
         full = []
         status = 0
-        for kind, data_str in http_post_json_stream(url, payload, headers=headers, timeout=900.0):
+        stats = StreamStats()
+        usage_tokens: Optional[int] = None
+        t_send = time.perf_counter()
+        t_first: Optional[float] = None
+        t_last: Optional[float] = None
+        if sp.client:
+            stream = sp.client.post_json_stream(m.completion_path, payload, headers=headers, timeout=900.0)
+        else:
+            stream = http_post_json_stream(f"{sp.base_url}{m.completion_path}", payload, headers=headers, timeout=900.0)
+        for kind, data_str in stream:
             if kind == "data":
                 try:
                     obj = json.loads(data_str)
+                    usage = obj.get("usage") if isinstance(obj, dict) else None
+                    if isinstance(usage, dict) and usage.get("completion_tokens") is not None:
+                        usage_tokens = int(usage["completion_tokens"])
                     tok = self._extract_token(obj)
                     if tok:
+                        now = time.perf_counter()
+                        if t_first is None:
+                            t_first = now
+                        else:
+                            stats.itl_ms.append((now - t_last) * 1000.0)
+                        t_last = now
                         full.append(tok)
                         self.bus.publish({"type": "token", "req_id": req_id, "model": m.name, "token": tok})
                 except Exception:
@@ -1603,7 +3189,19 @@ class LLMManager:
                     status = int(data_str)
                 except Exception:
                     status = 0
-        return ("".join(full), status)
+        t_end = time.perf_counter()
+        if usage_tokens is not None:
+            stats.completion_tokens, stats.tokens_source = usage_tokens, "usage"
+        else:
+            stats.completion_tokens = len(full)  # one delta per token on llama.cpp-style servers
+        if t_first is not None:
+            stats.ttft_s = t_first - t_send
+            stats.decode_s = t_end - t_first
+            self.metrics.observe("time_to_first_token_seconds", stats.ttft_s, model=m.name)
+            self.metrics.inc("completion_tokens_total", stats.completion_tokens, model=m.name)
+            if stats.decode_tokens_per_s is not None:
+                self.metrics.observe("decode_tokens_per_second", stats.decode_tokens_per_s, model=m.name)
+        return ("".join(full), status, stats)
 
     # ----- outputs -----
 
@@ -1619,11 +3217,23 @@ class LLMManager:
 
     # ----- per-request handling -----
 
+    def _deadline_slack(self, req: InferenceRequest, end_ts: float) -> str:
+        """Seconds to spare at completion (negative = missed); counts misses for /metrics."""
+        if req.deadline_ts is None:
+            return ""
+        slack = req.deadline_ts - end_ts
+        if slack < 0:
+            self.metrics.inc("deadline_misses_total", model=req.model_name, lane=req.lane)
+        return f"{slack:.3f}"
+
     def _handle_request(self, req: InferenceRequest):
         m = self.models[req.model_name]
-        self.bus.publish({"type": "active_model", "model": m.name})
-        self.bus.publish({"type": "request_start", "req_id": req.req_id, "model": m.name, "question": req.question})
+        self.bus.publish({"type": "request_start", "req_id": req.req_id, "model": m.name, "question": req.question,
+                          "lane": req.lane})
+        if self.journal:
+            self.journal.started(req.req_id)
         start_ts = time.perf_counter()
+        self.metrics.observe("queue_wait_seconds", start_ts - req.arrival_ts, model=m.name, lane=req.lane)
 
         # Ensure server running (exclusive enforcement & evictions inside)
         try:
@@ -1632,24 +3242,29 @@ class LLMManager:
             self.logger.error("Request %d: failed to start model '%s': %s", req.req_id, m.name, e)
             end_ts = time.perf_counter()
             self._append_csv([req.req_id, f"{req.arrival_ts:.6f}", f"{start_ts:.6f}", f"{end_ts:.6f}",
-                              m.name, req.question, f"{0.0:.3f}", f"{0.0:.3f}", 0, "", "", "start_failed"])
+                              m.name, req.question, f"{0.0:.3f}", f"{0.0:.3f}", 0, "", "", "start_failed",
+                              "", 0, "", "", "", "", req.lane, self._deadline_slack(req, end_ts)])
             self.bus.publish({"type": "request_end", "req_id": req.req_id, "model": m.name,
                               "status": "start_failed", "load_time_s": 0.0, "infer_time_s": 0.0})
-            # Queue snapshot may be unchanged here, but publish anyway
-            self._publish_queue_snapshot()
+            self.metrics.inc("requests_completed_total", model=m.name, status="start_failed")
+            if self.journal:
+                self.journal.completed(req.req_id, "start_failed")
             return
 
         # Stream inference
         infer_t0 = time.perf_counter()
         answer = ""
         status_label = ""
+        stats = StreamStats()
         try:
-            answer, http_status = self._send_inference_stream(m, req.question, req.req_id)
+            answer, http_status, stats = self._send_inference_stream(m, req.question, req.req_id)
             status_label = str(http_status)
         except Exception as e:
             self.logger.error("Inference error for req %d on '%s': %s", req.req_id, m.name, e)
             status_label = "inference_error"
         infer_time_s = time.perf_counter() - infer_t0
+        self.metrics.observe("inference_seconds", infer_time_s, model=m.name)
+        self.metrics.inc("requests_completed_total", model=m.name, status=status_label)
 
         # Write output
         out_path = Path("")
@@ -1663,18 +3278,23 @@ class LLMManager:
         if m.name in self.servers:
             self.servers[m.name].last_used_ts = time.perf_counter()
 
+        ev = stats.as_event()
+        fmt = lambda v: "" if v is None else str(v)
         self._append_csv([req.req_id, f"{req.arrival_ts:.6f}", f"{start_ts:.6f}", f"{end_ts:.6f}",
                           m.name, req.question, f"{load_time_s:.3f}", f"{infer_time_s:.3f}",
-                          int(was_running), ";".join(evicted) if evicted else "", str(out_path) if out_path else "", status_label])
+                          int(was_running), ";".join(evicted) if evicted else "", str(out_path) if out_path else "", status_label,
+                          fmt(ev["ttft_s"]), ev["completion_tokens"], fmt(ev["tokens_per_s"]),
+                          fmt(ev["itl_p50_ms"]), fmt(ev["itl_p95_ms"]), fmt(ev["itl_p99_ms"]),
+                          req.lane, self._deadline_slack(req, end_ts)])
+        if self.journal:
+            self.journal.completed(req.req_id, status_label)
 
-        self.logger.info("Completed req %d on '%s' -> %s (load=%.2fs, infer=%.2fs, status=%s)",
-                         req.req_id, m.name, out_path.name if out_path else "(no file)", load_time_s, infer_time_s, status_label)
+        self.logger.info("Completed req %d on '%s' -> %s (load=%.2fs, infer=%.2fs, ttft=%s, tok/s=%s, status=%s)",
+                         req.req_id, m.name, out_path.name if out_path else "(no file)", load_time_s, infer_time_s,
+                         fmt(ev["ttft_s"]), fmt(ev["tokens_per_s"]), status_label)
 
         self.bus.publish({"type": "request_end", "req_id": req.req_id, "model": m.name,
-                          "status": status_label, "load_time_s": load_time_s, "infer_time_s": infer_time_s})
-
-        # Queue snapshot after completion (in case UI missed the pop event)
-        self._publish_queue_snapshot()
+                          "status": status_label, "load_time_s": load_time_s, "infer_time_s": infer_time_s, **ev})
 
 
 # ------------------------------- top-level ------------------------------
@@ -1716,7 +3336,7 @@ def main():
     Path(cfg.output_dir).mkdir(parents=True, exist_ok=True)
     Path(cfg.logs_dir).mkdir(parents=True, exist_ok=True)
 
-    bus = EventBus()
+    bus = EventBus(cfg.sse_max_events_per_client, cfg.sse_token_frame_ms)
     control = ControlState()
     mgr = LLMManager(cfg, sys_specs, bus, control)
     mgr.start()
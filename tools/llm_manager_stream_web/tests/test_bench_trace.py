@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+from llm_manager_bench import read_trace, trace_model  # noqa: E402
+
+
+def test_lane_tagged_trace_registers_plain_model_names():
+    fd, path = tempfile.mkstemp(prefix="trace-", suffix=".txt")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write("m1@interactive:500|hello\n")
+        f.write("# comment\n")
+        f.write("m2|plain\n")
+        f.write("m1@batch|later\n")
+        f.write("m3@hi:5|unknown lane falls back like the tailer\n")
+    lines = read_trace(path)
+    assert len(lines) == 4
+    assert list(dict.fromkeys(trace_model(l) for l in lines)) == ["m1", "m2", "m3"]
@@ -0,0 +1,32 @@
+import os
+import sys
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+from llm_manager_stream_web import VRAMTracker, make_eviction_policy  # noqa: E402
+
+
+def _tracker(policy):
+    t = VRAMTracker(total_vram_gb=48.0, reserve_gb=0.0, policy=make_eviction_policy(policy))
+    for m in ("A", "B", "C"):
+        t.account_start(m, 8.0)
+    return t
+
+
+def test_gds_without_load_history_is_lru():
+    t = _tracker("gds")
+    t.touch("A")  # A is now the most recently used; insertion order would evict it first
+    assert t.eviction_order() == ["B", "C", "A"]
+    t.touch("B")
+    assert t.eviction_order() == ["C", "A", "B"]
+
+
+def test_gds_prefers_evicting_cheap_reloads():
+    t = _tracker("gds")
+    t.record_load_time("A", 1.0)
+    t.record_load_time("B", 60.0)
+    t.record_load_time("C", 30.0)
+    assert t.eviction_order() == ["A", "C", "B"]
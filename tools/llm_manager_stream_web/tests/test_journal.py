@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+from llm_manager_stream_web import InferenceRequest, RequestJournal  # noqa: E402
+
+
+def test_request_and_tailer_position_are_one_op():
+    tmpdir = tempfile.mkdtemp(prefix="journal-test-")
+    j = RequestJournal(Path(tmpdir) / "journal.sqlite3")
+    req = InferenceRequest(1, "m1", "hello", time.perf_counter())
+    j.enqueue(req, source_pos=(42, 128))
+    # a single queue item, so the writer can never split it across transactions
+    assert j._q.qsize() == 1
+
+    j.start()
+    j.stop()
+    assert [row[:3] for row in j.pending()] == [(1, "m1", "hello")]
+    assert j.tailer_position() == (42, 128)
+
+
+def test_started_and_completed_are_journaled():
+    tmpdir = tempfile.mkdtemp(prefix="journal-test-")
+    path = Path(tmpdir) / "journal.sqlite3"
+    j = RequestJournal(path)
+    j.start()
+    for i in (1, 2):
+        j.enqueue(InferenceRequest(i, "m", f"q{i}", time.perf_counter()))
+    j.started(1)
+    j.completed(1, "ok")
+    j.stop()
+    assert [row[0] for row in RequestJournal(path).pending()] == [2]
@@ -0,0 +1,50 @@
+import os
+import sys
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+from llm_manager_stream_web import PrefetchBackoff  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_failed_prefetch_blocked_until_state_changes():
+    clock = FakeClock()
+    b = PrefetchBackoff(base_s=5.0, max_s=60.0, clock=clock)
+    st = PrefetchBackoff.state({"a"}, 10.0)
+    assert not b.blocked("m", st)
+    b.record("m", st)
+    assert b.blocked("m", st)
+    # same residency state: stays blocked even after the backoff
+    clock.t += 3600
+    assert b.blocked("m", st)
+    # a server stopped / VRAM freed -> retry allowed once the backoff passed
+    assert not b.blocked("m", PrefetchBackoff.state(set(), 24.0))
+
+
+def test_backoff_doubles_and_clear_resets():
+    clock = FakeClock()
+    b = PrefetchBackoff(base_s=5.0, max_s=12.0, clock=clock)
+    other = PrefetchBackoff.state({"x"}, 1.0)
+    b.record("m", PrefetchBackoff.state(set(), 8.0))
+    clock.t += 4.9
+    assert b.blocked("m", other)
+    clock.t += 0.2
+    assert not b.blocked("m", other)
+    b.record("m", PrefetchBackoff.state(set(), 8.0))  # 2nd failure: 10 s
+    clock.t += 9.9
+    assert b.blocked("m", other)
+    b.record("m", PrefetchBackoff.state(set(), 8.0))  # 3rd: capped at 12 s
+    clock.t += 12.1
+    assert not b.blocked("m", other)
+    b.clear("m")
+    assert not b.blocked("m", PrefetchBackoff.state(set(), 8.0))
@@ -0,0 +1,68 @@
+import logging
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+import llm_manager_stream_web as lmw  # noqa: E402
+from llm_manager_stream_web import LLMManager, MetricsRegistry, ModelSpec, PrefetchBackoff, VRAMTracker  # noqa: E402
+
+
+def _manager(monkeypatch, start_ok):
+    """Just the state _prefetch_server touches; _start_server blocks until `release` is set."""
+    monkeypatch.setattr(lmw, "get_actual_vram_free_gb", lambda logger=None: None)
+    mgr = object.__new__(LLMManager)
+    mgr.cfg = SimpleNamespace(safety_vram_margin_gb=0.5)
+    mgr.logger = logging.getLogger("test_prefetch_lock")
+    mgr.metrics = MetricsRegistry()
+    mgr.vram = VRAMTracker(total_vram_gb=24.0, reserve_gb=0.0)
+    mgr.servers = {}
+    mgr._stop = threading.Event()
+    mgr._lifecycle_lock = threading.RLock()
+    mgr._prefetching = {"m"}
+    mgr._warmed = set()
+    mgr._starting = {}
+    mgr._prefetch_lock = threading.Lock()
+    mgr._prefetch_backoff = PrefetchBackoff()
+    mgr.loading = threading.Event()
+    mgr.release = threading.Event()
+
+    def start_server(m):
+        mgr.loading.set()
+        mgr.release.wait(5.0)
+        if start_ok:
+            mgr.servers[m.name] = object()
+        return start_ok
+
+    mgr._start_server = start_server
+    return mgr
+
+
+def test_prefetch_load_runs_outside_the_lifecycle_lock(monkeypatch):
+    mgr = _manager(monkeypatch, start_ok=True)
+    t = threading.Thread(target=mgr._prefetch_server, args=(ModelSpec(name="m", vram_gb=8.0),))
+    t.start()
+    assert mgr.loading.wait(5.0)
+    # while the speculative load runs, starts/evictions of other models can take the lock
+    assert mgr._lifecycle_lock.acquire(timeout=1.0)
+    mgr._lifecycle_lock.release()
+    assert "m" in mgr._starting
+    assert mgr.vram.free_gb() == 16.0  # VRAM already reserved for it
+    mgr.release.set()
+    t.join(5.0)
+    assert "m" not in mgr._starting and "m" not in mgr._prefetching
+    assert mgr.vram.is_loaded("m")
+
+
+def test_failed_prefetch_rolls_back_the_reservation(monkeypatch):
+    mgr = _manager(monkeypatch, start_ok=False)
+    mgr.release.set()
+    mgr._prefetch_server(ModelSpec(name="m", vram_gb=8.0))
+    assert not mgr.vram.is_loaded("m")
+    assert mgr.vram.free_gb() == 24.0
+    assert mgr._starting == {}
@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+
+# Make the single-file tool importable
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+from llm_manager_stream_web import FairScheduler, InferenceRequest  # noqa: E402
+
+
+def _backlog(sched, models, per_model, deadline_offset_s, lane="normal"):
+    now = time.perf_counter()
+    rid = 0
+    for i in range(per_model):
+        for m in models:
+            rid += 1
+            # spread deadlines so EDF order inside each model is well defined
+            sched.add(InferenceRequest(rid, m, f"q{rid}", now - 1.0, lane, now + deadline_offset_s + rid * 0.001))
+    return rid
+
+
+def _drain(sched):
+    order = []
+    while sched.has_any():
+        order.append(sched.next_request().model_name)
+    return "".join(order)
+
+
+def test_fresh_backlog_batches_per_model():
+    sched = FairScheduler(timeslice_s=60.0)
+    _backlog(sched, "AB", 6, deadline_offset_s=300.0)
+    assert _drain(sched) == "AAAAAABBBBBB"
+
+
+def test_overdue_backlog_does_not_thrash_models():
+    # Every head is already past its deadline: switching can't save any of them,
+    # so the current model must keep its slice instead of alternating per pop.
+    sched = FairScheduler(timeslice_s=60.0)
+    _backlog(sched, "AB", 6, deadline_offset_s=-30.0)
+    assert _drain(sched) == "AAAAAABBBBBB"
+
+
+def test_overdue_backlog_with_switch_cost_does_not_thrash():
+    sched = FairScheduler(timeslice_s=60.0, switch_cost=lambda _m: 5.0)
+    _backlog(sched, "AB", 4, deadline_offset_s=-1.0)
+    assert _drain(sched) == "AAAABBBB"
+
+
+def test_meetable_deadline_preempts_current_slice():
+    sched = FairScheduler(timeslice_s=60.0)
+    now = time.perf_counter()
+    for rid in range(1, 4):
+        sched.add(InferenceRequest(rid, "A", "q", now, "normal", now + 300.0 + rid))
+    assert sched.next_request().model_name == "A"
+    # B can still make it, but only if it goes before A's slice ends
+    sched.add(InferenceRequest(10, "B", "q", now, "normal", time.perf_counter() + 5.0))
+    assert sched.next_request().model_name == "B"
+
+
+def test_higher_lane_preempts_even_when_overdue():
+    sched = FairScheduler(timeslice_s=60.0)
+    now = time.perf_counter()
+    for rid in range(1, 4):
+        sched.add(InferenceRequest(rid, "A", "q", now, "batch", now + 300.0 + rid))
+    assert sched.next_request().model_name == "A"
+    sched.add(InferenceRequest(10, "B", "q", now - 60.0, "interactive", now - 30.0))
+    assert sched.next_request().model_name == "B"
+
+
+def test_steady_interactive_stream_still_lets_batch_through():
+    # A's interactive work never runs dry; when A's slice ends, B gets a turn
+    sched = FairScheduler(timeslice_s=0.05, starvation_avoidance_min_other=1)
+    now = time.perf_counter()
+    sched.add(InferenceRequest(1, "B", "q", now, "batch", now + 3600.0))
+    served = []
+    for rid in range(2, 200):
+        sched.add(InferenceRequest(rid, "A", "q", time.perf_counter(), "interactive", time.perf_counter() + 30.0))
+        req = sched.next_request()
+        served.append(req.model_name)
+        if req.model_name == "B":
+            break
+        time.sleep(0.002)
+    assert served[-1] == "B"
+    assert served.count("A") >= 2  # A batched within its slice before handing over
+
+
+def test_overdue_batch_head_is_promoted_past_interactive_work():
+    # same model, so only lane promotion (not model turns) can let the batch request out
+    sched = FairScheduler(timeslice_s=60.0, lane_deadlines_s={"normal": 10.0})
+    now = time.perf_counter()
+    for rid in range(1, 4):
+        sched.add(InferenceRequest(rid, "A", "q", now, "interactive", now + 30.0 + rid))
+    # missed its own deadline and then the normal lane's 10s: now competes as interactive, oldest first
+    sched.add(InferenceRequest(9, "A", "q", now - 100.0, "batch", now - 20.0))
+    sched.add(InferenceRequest(10, "A", "q", now, "batch", now + 3600.0))
+    assert [sched.next_request().req_id for _ in range(5)] == [9, 1, 2, 3, 10]
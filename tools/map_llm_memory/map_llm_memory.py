@@ -17,12 +17,22 @@ Key features
     * Run a tiny generation (-p "probe" -n 1, configurable)
     * Write BOTH stdout and stderr to files (avoid drop due to buffering)
     * Monitor peak GPU VRAM and peak CPU RSS while the process is running
+      (one sampler thread: persistent NVML session, /proc for RSS, ring
+      buffers; p95 and time-weighted average VRAM are logged too)
     * Parse same buffer/metadata lines from merged logs
 - Common:
     * Detect total layers (from "offloaded X/Y" and/or meta)
     * Compute per-layer deltas, avg per-layer VRAM, overhead estimate
     * Print non-zero return codes for quick diagnosis
     * Write a single log: <binary>.log
+- Sweep:
+    * --strategy bisect (default) binary-searches the largest -ngl that loads
+      without OOM in O(log n) runs (plus -ngl min+1 for the per-layer estimate);
+      --strategy linear probes every -ngl as before
+    * Parsed results are cached in SQLite (--cache) keyed by (model hash, ngl,
+      ctx, settings), so repeat sweeps only run probes they haven't seen
+    * Probes stay sequential: concurrent runs would share the GPU and skew both
+      the peaks and the OOM boundary
 
 This script borrows proven ideas (per-PID GPU/CPU monitors, merged-log parsing,
 NVML/nvidia-smi use, offload+buffer regexes) from the user's tuner script. :contentReference[oaicite:1]{index=1}
@@ -31,11 +41,14 @@ NVML/nvidia-smi use, offload+buffer regexes) from the user's tuner script. :cont
 import argparse
 import datetime as dt
 import errno
+import hashlib
+import json
 import os
 import re
 import shlex
 import signal
 import socket
+import sqlite3
 import subprocess
 import sys
 import threading
@@ -125,130 +138,11 @@ def wait_port_closed(host: str, port: int, timeout_s: float = 10.0) -> bool:
         time.sleep(0.2)
     return False
 
-# --------------------------- CPU RSS monitor ---------------------------
+# --------------------------- resource sampler (GPU memory + RSS) ---------------------------
 
-def _parse_kib_from_status_val(s: str) -> Optional[int]:
-    m = re.search(r"(\d+)\s*kB", s or "")
-    return int(m.group(1)) if m else None
-
-class CPUProcessMonitor(threading.Thread):
-    """
-    Polls /proc/<pid>/status for VmRSS / VmHWM and keeps the peak (KiB).
-    """
-    def __init__(self, pid: int, interval: float = 0.2):
-        super().__init__(daemon=True)
-        self.pid = pid
-        self.interval = interval
-        self._stop_event = threading.Event()
-        self.peak_kib = 0
-
-    def stop(self):
-        self._stop_event.set()
-
-    def run(self):
-        status_path = Path(f"/proc/{self.pid}/status")
-        while not self._stop_event.is_set():
-            try:
-                txt = status_path.read_text()
-                m_hwm = re.search(r"^VmHWM:\s*(.+)$", txt, re.MULTILINE)
-                m_rss = re.search(r"^VmRSS:\s*(.+)$", txt, re.MULTILINE)
-                kib = None
-                if m_hwm:
-                    kib = _parse_kib_from_status_val(m_hwm.group(1))
-                if kib is None and m_rss:
-                    kib = _parse_kib_from_status_val(m_rss.group(1))
-                if kib is not None and kib > self.peak_kib:
-                    self.peak_kib = kib
-            except Exception:
-                pass
-            self._stop_event.wait(self.interval)
-
-# --------------------------- GPU memory monitor (sum across GPUs) ---------------------------
-
-class GPUMonitorAll(threading.Thread):
-    """
-    Polls NVML (if available) or `nvidia-smi` (compute-apps) to track total GPU memory
-    used by the target PID (summed across GPUs). Records peak (MiB).
-    """
-    def __init__(self, pid: int, interval: float = 0.1):
-        super().__init__(daemon=True)
-        self.pid = pid
-        self.interval = interval
-        self._stop_event = threading.Event()
-        self.peak_total_mib = 0
-        self._use_nvml = False
-        try:
-            import pynvml  # type: ignore
-            self.pynvml = pynvml
-            self.pynvml.nvmlInit()
-            self._nvml_device_count = self.pynvml.nvmlDeviceGetCount()
-            self._use_nvml = True
-        except Exception:
-            self._use_nvml = False
-
-    def stop(self):
-        self._stop_event.set()
-
-    def _poll_nvml(self):
-        total = 0
-        try:
-            for i in range(self._nvml_device_count):
-                try:
-                    h = self.pynvml.nvmlDeviceGetHandleByIndex(i)
-                    try:
-                        procs = self.pynvml.nvmlDeviceGetComputeRunningProcesses_v2(h)
-                    except Exception:
-                        procs = self.pynvml.nvmlDeviceGetComputeRunningProcesses(h)
-                    for p in procs:
-                        if int(p.pid) == int(self.pid):
-                            used = getattr(p, "usedGpuMemory", 0) or 0
-                            total += int(used // (1024 * 1024))
-                except Exception:
-                    continue
-        except Exception:
-            return
-        if total > self.peak_total_mib:
-            self.peak_total_mib = total
-
-    def _run_with_timeout(self, cmd: List[str], timeout_s: float = 0.8) -> Optional[str]:
-        try:
-            res = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout_s)
-            if res.returncode == 0:
-                return res.stdout
-        except Exception:
-            pass
-        return None
-
-    def _poll_nvidia_smi(self):
-        if not cmd_exists("nvidia-smi"):
-            return
-        out = self._run_with_timeout(
-            ["nvidia-smi", "--query-compute-apps=pid,used_memory", "--format=csv,noheader,nounits"],
-            timeout_s=0.8
-        )
-        if not out:
-            return
-        total = 0
-        for line in out.strip().splitlines():
-            parts = [p.strip() for p in line.split(",")]
-            if len(parts) != 2:
-                continue
-            pid_str, mem_mib_str = parts
-            try:
-                if int(pid_str) == int(self.pid):
-                    total += int(mem_mib_str)
-            except Exception:
-                continue
-        if total > self.peak_total_mib:
-            self.peak_total_mib = total
-
-    def run(self):
-        while not self._stop_event.is_set():
-            if self._use_nvml:
-                self._poll_nvml()
-            else:
-                self._poll_nvidia_smi()
-            self._stop_event.wait(self.interval)
+# shared with the other llamafile tools: tools/common/resource_sampler.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "common"))
+from resource_sampler import DEFAULT_SMI_INTERVAL_S, ResourceSampler  # noqa: E402
 
 # ------------------------------ parsing --------------------------------
 
@@ -389,7 +283,8 @@ def run_cli_once(binary: Path,
                  n_predict: int,
                  extra_args_cli: str,
                  exec_via: str,
-                 timeout_s: int) -> Dict:
+                 timeout_s: int,
+                 smi_interval: float = DEFAULT_SMI_INTERVAL_S) -> Dict:
     """
     Run a tiny CLI generation; capture stdout+stderr to memory;
     record peak GPU VRAM and peak CPU RSS while running.
@@ -427,11 +322,9 @@ def run_cli_once(binary: Path,
         else:
             raise
 
-    # start monitors
-    gpu_mon = GPUMonitorAll(proc.pid, interval=0.05)
-    gpu_mon.start()
-    cpu_mon = CPUProcessMonitor(proc.pid, interval=0.05)
-    cpu_mon.start()
+    # start sampler (GPU memory summed across GPUs + RSS)
+    mon = ResourceSampler(proc.pid, interval=0.05, smi_interval=smi_interval)
+    mon.start()
 
     # Collect output (both streams)
     out_lines: List[str] = []
@@ -463,9 +356,8 @@ def run_cli_once(binary: Path,
             pass
         rc = -9
 
-    # stop monitors
-    gpu_mon.stop(); gpu_mon.join(timeout=1.0)
-    cpu_mon.stop(); cpu_mon.join(timeout=1.0)
+    # stop sampler
+    mon.stop(); mon.join(timeout=1.0)
 
     try:
         proc.stdout.close()
@@ -482,8 +374,10 @@ def run_cli_once(binary: Path,
         "cmd": cmd,
         "rc": rc,
         "text": merged_text,
-        "peak_gpu_mib": gpu_mon.peak_total_mib or None,
-        "peak_cpu_mib": int(cpu_mon.peak_kib/1024) if cpu_mon.peak_kib else None,
+        "peak_gpu_mib": mon.peak_gpu_mib,
+        "peak_cpu_mib": int(mon.peak_rss_kib/1024) if mon.peak_rss_kib else None,
+        "p95_gpu_mib": round2(mon.percentile("gpu_mib", 95)),
+        "avg_gpu_mib": round2(mon.time_weighted_avg("gpu_mib")),
     }
 
 # ------------------------------ Server mode ----------------------------------
@@ -496,7 +390,8 @@ def run_server_once(binary: Path,
                     port: int,
                     sample_seconds: float,
                     exec_via: str,
-                    timeout_s: int) -> Dict:
+                    timeout_s: int,
+                    smi_interval: float = DEFAULT_SMI_INTERVAL_S) -> Dict:
     """
     Start server; detect readiness from logs; sample VRAM while running; parse logs; shutdown.
     """
@@ -573,16 +468,17 @@ def run_server_once(binary: Path,
     # if ready, sample VRAM for sample_seconds
     gpu_peak = None
     cpu_peak = None
+    gpu_p95 = None
+    gpu_avg = None
     if server_ready:
-        gpu_mon = GPUMonitorAll(proc.pid, interval=0.05)
-        gpu_mon.start()
-        cpu_mon = CPUProcessMonitor(proc.pid, interval=0.05)
-        cpu_mon.start()
+        mon = ResourceSampler(proc.pid, interval=0.05, smi_interval=smi_interval)
+        mon.start()
         time.sleep(max(0.1, sample_seconds))
-        gpu_mon.stop(); gpu_mon.join(timeout=1.0)
-        cpu_mon.stop(); cpu_mon.join(timeout=1.0)
-        gpu_peak = gpu_mon.peak_total_mib or None
-        cpu_peak = int(cpu_mon.peak_kib/1024) if cpu_mon.peak_kib else None
+        mon.stop(); mon.join(timeout=1.0)
+        gpu_peak = mon.peak_gpu_mib
+        cpu_peak = int(mon.peak_rss_kib/1024) if mon.peak_rss_kib else None
+        gpu_p95 = round2(mon.percentile("gpu_mib", 95))
+        gpu_avg = round2(mon.time_weighted_avg("gpu_mib"))
 
     # shutdown
     try:
@@ -613,10 +509,134 @@ def run_server_once(binary: Path,
         "server_ready": server_ready,
         "peak_gpu_mib": gpu_peak,
         "peak_cpu_mib": cpu_peak,
+        "p95_gpu_mib": gpu_p95,
+        "avg_gpu_mib": gpu_avg,
         "host": host,
         "port": port,
     }
 
+# ------------------------------ probe cache ----------------------------------
+
+# Bump when the parsers above change so cached parsed results are re-probed
+PARSER_VERSION = 1
+
+RE_OOM = re.compile(r"(out of memory|failed to allocate|cudaMalloc failed|unable to allocate)", re.IGNORECASE)
+
+def model_fingerprint(path: Path, sample_bytes: int = 4 * 1024 * 1024) -> str:
+    """
+    Cheap content hash for multi-GB models: size + sha256 of the first and
+    last `sample_bytes`. Re-hashing the whole file would cost more than a probe.
+    """
+    size = path.stat().st_size
+    h = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        h.update(f.read(sample_bytes))
+        if size > sample_bytes:
+            f.seek(max(sample_bytes, size - sample_bytes))
+            h.update(f.read(sample_bytes))
+    return h.hexdigest()[:32]
+
+def weights_path_from_args(extra_args: str) -> Optional[Path]:
+    """The -m/--model file in extra args (llama.cpp binaries load weights from it), if any."""
+    toks = shlex.split(extra_args or "")
+    for i, tok in enumerate(toks):
+        if tok in ("-m", "--model") and i + 1 < len(toks):
+            return Path(toks[i + 1])
+        for prefix in ("--model=", "-m="):
+            if tok.startswith(prefix):
+                return Path(tok[len(prefix):])
+    return None
+
+def gpu_fingerprint() -> str:
+    """GPU names + total memory; OOM boundaries don't carry over between cards."""
+    if not cmd_exists("nvidia-smi"):
+        return "no-nvidia-smi"
+    try:
+        res = subprocess.run(["nvidia-smi", "--query-gpu=name,memory.total", "--format=csv,noheader"],
+                             capture_output=True, text=True, timeout=5)
+        if res.returncode == 0 and res.stdout.strip():
+            return ";".join(line.strip() for line in res.stdout.strip().splitlines())
+    except Exception:
+        pass
+    return "unknown-gpu"
+
+class ProbeCache:
+    """
+    SQLite store of parsed probe results keyed by (model hash, ngl, ctx) plus
+    a hash of everything else that changes memory use (mode, extra args, GPU,
+    parser version). Only parsed fields are stored; raw logs stay in <binary>.log.
+    """
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS probes ("
+            " model_hash TEXT NOT NULL, ngl INTEGER NOT NULL, ctx INTEGER NOT NULL, settings TEXT NOT NULL,"
+            " result TEXT NOT NULL, created TEXT NOT NULL,"
+            " PRIMARY KEY (model_hash, ngl, ctx, settings))")
+        self.conn.commit()
+
+    def get(self, model_hash: str, ngl: int, ctx: int, settings: str) -> Optional[Dict]:
+        row = self.conn.execute("SELECT result FROM probes WHERE model_hash=? AND ngl=? AND ctx=? AND settings=?",
+                                (model_hash, ngl, ctx, settings)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, model_hash: str, ngl: int, ctx: int, settings: str, result: Dict):
+        self.conn.execute("INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?)",
+                          (model_hash, ngl, ctx, settings, json.dumps(result), now_iso()))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def probe_fits(res: Dict, mode: str) -> bool:
+    """A probe 'fits' when the model loaded: server became ready / CLI exited 0, with no OOM in the log."""
+    if res.get("oom"):
+        return False
+    if mode == "server":
+        return bool(res.get("server_ready"))
+    return res.get("rc") == 0
+
+def probe_cacheable(res: Dict) -> bool:
+    """
+    Only outcomes that repeat are cached: a fit, or a failure with an OOM in
+    the log. Timeouts and other failures may be transient and are re-probed,
+    otherwise one bad run would move the bisect boundary on every later run.
+    """
+    return bool(res.get("fits") or res.get("oom"))
+
+# ------------------------------ sweep strategies -----------------------------
+
+def linear_sweep(lo: int, hi: int, probe) -> None:
+    for ngl in range(lo, hi + 1):
+        probe(ngl)
+
+def bisect_sweep(lo: int, hi: int, probe) -> Optional[int]:
+    """
+    Find the largest -ngl that still fits in O(log n) probes, plus ngl lo+1 for
+    the per-layer/overhead estimate. Returns the boundary (None if even lo fails).
+    """
+    if probe(hi)["fits"]:
+        if hi > lo:
+            probe(lo)
+            if hi > lo + 1:
+                probe(lo + 1)
+        return hi
+    if not probe(lo)["fits"]:
+        return None
+    if hi > lo + 1:
+        probe(lo + 1)
+    good, bad = lo, hi
+    while bad - good > 1:
+        mid = (good + bad) // 2
+        if probe(mid)["fits"]:
+            good = mid
+        else:
+            bad = mid
+    return good
+
 # ------------------------------ main -----------------------------------------
 
 SERVER_FLAGS = {"--host", "--port", "-p", "--nobrowser"}
@@ -670,8 +690,15 @@ def main():
     ap.add_argument("--server-port", type=int, default=8900, help="Server mode default port (used if not in extra-args).")
     ap.add_argument("--server-sample-seconds", type=float, default=2.0, help="How long to sample VRAM after readiness (server mode).")
     ap.add_argument("--timeout", type=int, default=300, help="Per run timeout seconds.")
+    ap.add_argument("--smi-interval", type=float, default=DEFAULT_SMI_INTERVAL_S,
+                    help="Report interval (s) of the looping nvidia-smi used when pynvml is unavailable (default 0.1).")
     ap.add_argument("--exec-via", choices=["auto","direct","sh","bash"], default="auto",
                     help="How to execute the binary. 'auto' falls back to 'sh' on ENOEXEC.")
+    ap.add_argument("--strategy", choices=["bisect","linear"], default="bisect",
+                    help="bisect: binary-search the largest -ngl that fits; linear: probe every -ngl.")
+    ap.add_argument("--cache", default=str(Path(__file__).resolve().parent / "results" / "probe_cache.sqlite3"),
+                    help="SQLite probe cache ('' disables).")
+    ap.add_argument("--refresh", action="store_true", help="Ignore cached probes (new results are still cached).")
     args = ap.parse_args()
 
     binary = Path(args.binary).resolve()
@@ -696,7 +723,8 @@ def main():
     header.append(f"Mode           : {mode}  (auto_server_detected={auto_server})")
     header.append(f"Extra args     : {args.extra_args or '(none)'}")
     header.append(f"Context Size   : {args.ctx_size}")
-    header.append(f"NGL range      : {args.min_ngl}..{args.max_ngl}")
+    header.append(f"NGL range      : {args.min_ngl}..{args.max_ngl}  (strategy={args.strategy})")
+    header.append(f"Probe cache    : {args.cache or '(disabled)'}{'  (refresh)' if args.refresh else ''}")
     if mode == "server":
         header.append(f"Server probe   : host={args.server_host}, port={args.server_port}, sample={args.server_sample_seconds}s")
     else:
@@ -712,11 +740,28 @@ def main():
         sys.exit(1)
     print(header_txt, end="")
 
-    results = []
+    results: Dict[int, Dict] = {}
     detected_layers = None
 
-    for ngl in range(args.min_ngl, args.max_ngl + 1):
-        print(f"[*] -ngl {ngl} ...")
+    cache = ProbeCache(Path(args.cache)) if args.cache else None
+    model_hash, settings = "", ""
+    if cache:
+        model_hash = model_fingerprint(binary)
+        weights = weights_path_from_args(args.extra_args)
+        if weights is not None and weights.is_file():
+            # llama.cpp: a .gguf replaced in place keeps the same args, so key on its content too
+            model_hash += "+" + model_fingerprint(weights)
+        settings = hashlib.sha256(json.dumps({
+            "mode": mode, "extra_args": args.extra_args, "prompt": args.prompt, "n_predict": args.n_predict,
+            "sample_seconds": args.server_sample_seconds if mode == "server" else None,
+            "smi_interval": args.smi_interval,
+            "gpu": gpu_fingerprint(), "parser": PARSER_VERSION,
+        }, sort_keys=True).encode()).hexdigest()[:16]
+
+    def fmt(x):
+        return "N/A" if x is None else (f"{x:.2f}" if isinstance(x, float) else str(x))
+
+    def run_probe(ngl: int) -> Dict:
         if mode == "cli":
             extra_cli = filter_server_only_flags(args.extra_args)
             res = run_cli_once(
@@ -728,6 +773,7 @@ def main():
                 extra_args_cli=extra_cli,
                 exec_via=args.exec_via,
                 timeout_s=args.timeout,
+                smi_interval=args.smi_interval,
             )
         else:
             # server
@@ -741,36 +787,74 @@ def main():
                 sample_seconds=args.server_sample_seconds,
                 exec_via=args.exec_via,
                 timeout_s=args.timeout,
+                smi_interval=args.smi_interval,
             )
+            # For server: ensure port closes before next run if port fixed
+            wait_port_closed(args.server_host if args.server_host != "0.0.0.0" else "127.0.0.1",
+                             args.server_port, timeout_s=10.0)
 
+        # parse once; only the parsed fields are kept (and cached)
         text = res.get("text","")
-        rc = res.get("rc")
-        gpu_peak = res.get("peak_gpu_mib")
-        cpu_peak = res.get("peak_cpu_mib")
-
-        # parse
         layers, off_total = parse_layers(text)
-        bufs = parse_buffers_and_meta(text)
-
+        r = {
+            "ngl": ngl,
+            "cmd": res.get("cmd", []),
+            "rc": res.get("rc"),
+            "server_ready": res.get("server_ready"),
+            "host": res.get("host"),
+            "port": res.get("port"),
+            "gpu_peak_mib": res.get("peak_gpu_mib"),
+            "cpu_peak_mib": res.get("peak_cpu_mib"),
+            "gpu_p95_mib": res.get("p95_gpu_mib"),
+            "gpu_avg_mib": res.get("avg_gpu_mib"),
+            "layers": layers,
+            "off_total": off_total,
+            "bufs": parse_buffers_and_meta(text),
+            "oom": bool(RE_OOM.search(text)),
+        }
+        r["fits"] = probe_fits(r, mode)
+        return r
+
+    def probe(ngl: int) -> Dict:
+        nonlocal detected_layers
+        if ngl in results:
+            return results[ngl]
+        r = None
+        if cache and not args.refresh:
+            r = cache.get(model_hash, ngl, args.ctx_size, settings)
+            if r is not None and not probe_cacheable(r):
+                r = None  # stored by an older version that cached every outcome
+        cached = r is not None
+        if cached:
+            print(f"[*] -ngl {ngl} (cached)")
+        else:
+            print(f"[*] -ngl {ngl} ...")
+            r = run_probe(ngl)
+            if cache and probe_cacheable(r):
+                cache.put(model_hash, ngl, args.ctx_size, settings, r)
+        r["cached"] = cached
+        results[ngl] = r
+
+        layers = r["layers"]
+        bufs = r["bufs"]
         if layers and (detected_layers is None or layers > detected_layers):
             detected_layers = layers
 
         # log chunk
-        def fmt(x):
-            return "N/A" if x is None else (f"{x:.2f}" if isinstance(x, float) else str(x))
-
         with open(log_path, "a", encoding="utf-8") as f:
-            f.write(f"[Run -ngl {ngl}]\n")
-            f.write(f"  cmd               : {' '.join(shlex.quote(c) for c in res.get('cmd', []))}\n")
-            f.write(f"  return_code       : {rc}\n")
+            f.write(f"[Run -ngl {ngl}]{' (cached)' if cached else ''}\n")
+            f.write(f"  cmd               : {' '.join(shlex.quote(c) for c in r.get('cmd', []))}\n")
+            f.write(f"  return_code       : {r['rc']}\n")
             if mode == "server":
-                f.write(f"  server_ready      : {res.get('server_ready')}\n")
-                f.write(f"  effective_host    : {res.get('host')}\n")
-                f.write(f"  effective_port    : {res.get('port')}\n")
-            f.write(f"  peak_gpu_mib      : {fmt(gpu_peak)}\n")
-            f.write(f"  peak_cpu_mib      : {fmt(cpu_peak)}\n")
+                f.write(f"  server_ready      : {r.get('server_ready')}\n")
+                f.write(f"  effective_host    : {r.get('host')}\n")
+                f.write(f"  effective_port    : {r.get('port')}\n")
+            f.write(f"  fits (no OOM)     : {r['fits']}\n")
+            f.write(f"  peak_gpu_mib      : {fmt(r['gpu_peak_mib'])}\n")
+            f.write(f"  peak_cpu_mib      : {fmt(r['cpu_peak_mib'])}\n")
+            f.write(f"  gpu_p95/avg_mib   : {fmt(r.get('gpu_p95_mib'))} / {fmt(r.get('gpu_avg_mib'))} (time-weighted)\n")
             f.write(f"  parsed.n_layer    : {fmt(layers)}\n")
-            f.write(f"  parsed.off_total  : {fmt(off_total)}\n")
+            f.write(f"  parsed.off_total  : {fmt(r['off_total'])}\n")
             f.write(f"  parsed.cpu_buffer : {fmt(bufs.get('cpu_buffer_mib'))} MiB\n")
             f.write(f"  parsed.gpu_weights: {fmt(bufs.get('gpu_weights_mib'))} MiB\n")
             f.write(f"  parsed.gpu_compute: {fmt(bufs.get('gpu_compute_mib'))} MiB\n")
@@ -783,20 +867,20 @@ def main():
             f.write("\n")
 
         # Print quick status (include rc if nonzero)
+        rc = r["rc"]
         rc_str = "" if rc == 0 else f" rc={rc}"
-        print(f"    VRAM={fmt(gpu_peak)} MiB | CPU={fmt(cpu_peak)} MiB | {('ready' if res.get('server_ready') else 'done')} {rc_str}")
+        state = ("ready" if r.get("server_ready") else "done") if r["fits"] else "OOM/failed"
+        print(f"    VRAM={fmt(r['gpu_peak_mib'])} MiB | CPU={fmt(r['cpu_peak_mib'])} MiB | {state} {rc_str}")
+        return r
 
-        results.append({
-            "ngl": ngl,
-            "gpu_peak_mib": gpu_peak,
-            "cpu_peak_mib": cpu_peak,
-            "bufs": bufs,
-        })
-
-        # For server: ensure port closes before next run if port fixed
-        if mode == "server":
-            wait_port_closed(args.server_host if args.server_host != "0.0.0.0" else "127.0.0.1",
-                             args.server_port, timeout_s=10.0)
+    try:
+        if args.strategy == "linear":
+            linear_sweep(args.min_ngl, args.max_ngl, probe)
+        else:
+            bisect_sweep(args.min_ngl, args.max_ngl, probe)
+    finally:
+        if cache:
+            cache.close()
 
     # Compute deltas (prefer GPU measured peak; if none, fall back to parsed sums)
     def measured_or_estimate(r: Dict) -> Optional[float]:
@@ -810,21 +894,21 @@ def main():
                 parts.append(float(b[k]))
         return sum(parts) if parts else None
 
+    # Memory curve over the runs that loaded; gaps (bisect) are spread evenly per layer
     start = args.min_ngl
-    last  = args.max_ngl
-    v_by_ngl: Dict[int, Optional[float]] = {r["ngl"]: measured_or_estimate(r) for r in results}
-    deltas = []
-    for ngl in range(start + 1, last + 1):
-        a = v_by_ngl.get(ngl - 1)
-        b = v_by_ngl.get(ngl)
-        deltas.append(None if (a is None or b is None) else (b - a))
-
-    real = [d for d in deltas if d is not None]
-    avg_delta = sum(real)/len(real) if real else None
+    v_by_ngl: Dict[int, Optional[float]] = {ngl: measured_or_estimate(r) for ngl, r in sorted(results.items()) if r["fits"]}
+    fitting = sorted(v_by_ngl)
+    last = fitting[-1] if fitting else args.max_ngl
+    deltas: List[Tuple[int, int, Optional[float]]] = []
+    for a_ngl, b_ngl in zip(fitting, fitting[1:]):
+        a = v_by_ngl.get(a_ngl)
+        b = v_by_ngl.get(b_ngl)
+        deltas.append((a_ngl, b_ngl, None if (a is None or b is None) else (b - a) / (b_ngl - a_ngl)))
 
     baseline = v_by_ngl.get(start)
     full     = v_by_ngl.get(last)
     weights_on_gpu_est = (full - baseline) if (full is not None and baseline is not None) else None
+    avg_delta = weights_on_gpu_est / (last - start) if (weights_on_gpu_est is not None and last > start) else None
 
     # heuristic overhead
     per_layer_est = None
@@ -834,6 +918,8 @@ def main():
     if per_layer_est is not None and v_by_ngl.get(start + 1) is not None:
         overhead_est = v_by_ngl[start + 1] - per_layer_est
 
+    n_cached = sum(1 for r in results.values() if r.get("cached"))
+
     def fmt2(x):
         return "N/A" if x is None else f"{x:.2f}"
 
@@ -843,21 +929,24 @@ def main():
     summary.append(f"  Mode               : {mode}")
     summary.append(f"  Binary             : {binary.name}")
     summary.append(f"  n_layer (detected) : {detected_layers if detected_layers is not None else 'unknown'}")
-    summary.append(f"  NGL swept          : {start}..{last}")
+    summary.append(f"  NGL swept          : {start}..{args.max_ngl} ({args.strategy}; {len(results)} probes, {n_cached} cached)")
+    summary.append(f"  Max -ngl that fits : {fitting[-1] if fitting else 'none'}")
     summary.append(f"  Baseline VRAM      : {fmt2(baseline)} MiB (-ngl {start})")
     summary.append(f"  Max VRAM           : {fmt2(full)} MiB (-ngl {last})")
     summary.append(f"  Est. weights-on-GPU: {fmt2(weights_on_gpu_est)} MiB (Max - Baseline)")
-    summary.append(f"  Avg per-layer VRAM : {fmt2(avg_delta)} MiB (from successive deltas)")
+    summary.append(f"  Avg per-layer VRAM : {fmt2(avg_delta)} MiB (Est. weights-on-GPU / layers)")
     summary.append(f"  Per-layer (early)  : {fmt2(per_layer_est)} MiB (ngl {start}->{start+1})")
     summary.append(f"  Overhead (heuristic): {fmt2(overhead_est)} MiB (VRAM(1) - per_layer)")
     summary.append("")
     summary.append("  Per-layer VRAM deltas (MiB):")
-    for i, d in enumerate(deltas, start=start + 1):
-        summary.append(f"    - layer {i:>3}: {fmt2(d)}")
+    for a_ngl, b_ngl, d in deltas:
+        label = f"{b_ngl:>3}" if b_ngl == a_ngl + 1 else f"{a_ngl + 1}..{b_ngl}"
+        summary.append(f"    - layer {label}: {fmt2(d)}")
     summary.append("")
     summary.append("  Per-run peaks:")
-    for r in results:
-        summary.append(f"    - -ngl {r['ngl']:>3}: GPU={fmt2(r['gpu_peak_mib'])} MiB | CPU={fmt2(r['cpu_peak_mib'])} MiB")
+    for ngl, r in sorted(results.items()):
+        note = "" if r["fits"] else " | OOM/failed"
+        summary.append(f"    - -ngl {ngl:>3}: GPU={fmt2(r['gpu_peak_mib'])} MiB | CPU={fmt2(r['cpu_peak_mib'])} MiB{note}")
     summary.append("-"*80)
     summary.append("")
 
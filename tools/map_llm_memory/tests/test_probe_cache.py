@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+from map_llm_memory import ProbeCache, probe_cacheable, probe_fits, weights_path_from_args  # noqa: E402
+
+
+def _result(rc, oom=False, server_ready=None):
+    r = {"rc": rc, "oom": oom, "server_ready": server_ready}
+    r["fits"] = probe_fits(r, "server" if server_ready is not None else "cli")
+    return r
+
+
+def test_only_fits_and_ooms_are_cacheable():
+    assert probe_cacheable(_result(0))
+    assert probe_cacheable(_result(1, oom=True))
+    assert probe_cacheable(_result(None, server_ready=True))
+    # timeout / crash without an OOM in the log: may be transient
+    assert not probe_cacheable(_result(None))
+    assert not probe_cacheable(_result(139))
+    assert not probe_cacheable(_result(None, server_ready=False))
+
+
+def test_probe_cache_roundtrip_is_keyed_by_settings():
+    tmpdir = tempfile.mkdtemp(prefix="probe-cache-test-")
+    cache = ProbeCache(Path(tmpdir) / "probe_cache.sqlite3")
+    r = dict(_result(0), ngl=12)
+    cache.put("model", 12, 4096, "settings-a", r)
+    assert cache.get("model", 12, 4096, "settings-a")["ngl"] == 12
+    assert cache.get("model", 12, 4096, "settings-b") is None
+    assert cache.get("model", 13, 4096, "settings-a") is None
+    cache.close()
+
+
+def test_weights_path_from_extra_args():
+    assert weights_path_from_args("--host 0.0.0.0 -m ./w.gguf --mlock") == Path("./w.gguf")
+    assert weights_path_from_args("--model '/models/a b.gguf' -ngl 9") == Path("/models/a b.gguf")
+    assert weights_path_from_args("--model=/m/x.gguf") == Path("/m/x.gguf")
+    assert weights_path_from_args("--mlock") is None
+    assert weights_path_from_args("") is None
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replay benchmark for the node watcher detectors (no live nodes needed)
+
+- Replays captured cortensord logs (one file per node) into fresh log files at
+  an accelerated speed, honouring the gaps between timestamped lines
+  (ISO "2025-08-19 23:45:00" or syslog "Aug 19 23:45:00"); files without
+  timestamps are written at --rate lines/s
+- Follows them with the watcher's own FileTailer / InotifyWatch, DetectorEngine
+  and RuleSet, so what is measured is what runs in production
+- RestartManager is replaced by a stub that only records decisions (cooldown
+  is applied on the replayed clock, nothing is ever restarted)
+- Reports:
+    * lines/sec end to end, and detector throughput (lines per detector CPU second)
+    * per-detector CPU time and hit counts
+    * latency from the triggering line being written to the restart decision,
+      per reason (p50 / p95 / max)
+- --speed 0 writes everything as fast as possible (pure throughput run)
+- --fail-below-lps / --fail-above-p95-ms make it exit 1, for regression checks
+
+Usage:
+  python3 replay_bench.py /var/log/cortensord-1.log.1 /var/log/cortensord-2.log.1 --speed 120
+  python3 replay_bench.py captured/*.log --speed 0 --json bench.json --fail-below-lps 50000
+
+Python 3.10+ (standard library only).
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+from typing import List, Dict, Optional, Tuple
+from pathlib import Path
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from collections import deque
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import watcher as W  # noqa: E402
+
+# -------------------------
+# Captured log loading
+# -------------------------
+
+ISO_TS_RE = re.compile(r"(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(\.\d+)?")
+SYSLOG_TS_RE = re.compile(r"^([A-Z][a-z]{2})\s+(\d{1,2}) (\d{2}:\d{2}:\d{2})")
+
+def parse_line_ts(line: str) -> Optional[datetime]:
+    """Timestamp near the start of a log line, or None."""
+    m = ISO_TS_RE.search(line[:48])
+    if m:
+        try:
+            ts = datetime.strptime(f"{m.group(1)} {m.group(2)}", "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return None
+        if m.group(3):
+            ts += timedelta(seconds=float(m.group(3)))
+        return ts.replace(tzinfo=timezone.utc)
+    m = SYSLOG_TS_RE.match(line)
+    if m:
+        try:
+            # year is not in the line; only the differences matter here
+            ts = datetime.strptime(f"2000 {m.group(1)} {m.group(2)} {m.group(3)}", "%Y %b %d %H:%M:%S")
+        except ValueError:
+            return None
+        return ts.replace(tzinfo=timezone.utc)
+    return None
+
+@dataclass
+class ReplayLine:
+    at: float        # seconds since the start of the capture
+    node: int        # node index (1-based, order of the files on the command line)
+    text: str
+
+def load_capture(paths: List[str], rate: float) -> Tuple[List[ReplayLine], Optional[datetime]]:
+    """
+    Read every file into one schedule ordered by capture time. Untimestamped
+    lines inherit the previous timestamp; a file with no timestamps at all is
+    spread at `rate` lines/s.
+    """
+    per_file: List[List[Tuple[Optional[datetime], str]]] = []
+    first_ts: Optional[datetime] = None
+    for p in paths:
+        rows = []
+        with open(p, "r", encoding="utf-8", errors="replace") as f:
+            for raw in f:
+                ln = raw.rstrip("\r\n")
+                ts = parse_line_ts(ln)
+                if ts is not None and (first_ts is None or ts < first_ts):
+                    first_ts = ts
+                rows.append((ts, ln))
+        per_file.append(rows)
+
+    schedule: List[ReplayLine] = []
+    for node, rows in enumerate(per_file, start=1):
+        has_ts = any(ts is not None for ts, _ in rows)
+        last = 0.0
+        for i, (ts, ln) in enumerate(rows):
+            if has_ts and first_ts is not None:
+                if ts is not None:
+                    last = max(last, (ts - first_ts).total_seconds())  # never go back in time
+                at = last
+            else:
+                at = i / rate if rate > 0 else 0.0
+            schedule.append(ReplayLine(at=at, node=node, text=ln))
+    schedule.sort(key=lambda r: r.at)  # stable: per-node order is kept
+    return schedule, first_ts
+
+# -------------------------
+# Replay writer
+# -------------------------
+
+class ReplayWriter(threading.Thread):
+    """
+    Appends the schedule to <workdir>/cortensord-<n>.log. Capture time is divided
+    by `speed` and idle gaps are capped at `max_gap` seconds; speed 0 writes
+    as fast as possible. `written[n][k]` is the monotonic time line k+1 of
+    node n was flushed.
+    """
+    def __init__(self, schedule: List[ReplayLine], log_paths: Dict[int, str], speed: float, max_gap: float):
+        super().__init__(daemon=True)
+        self.schedule = schedule
+        self.speed = speed
+        self.max_gap = max_gap
+        self.files = {n: open(p, "ab", buffering=0) for n, p in log_paths.items()}
+        self.written: Dict[int, List[float]] = {n: [] for n in log_paths}
+        self.capture_at = 0.0   # capture time of the latest written line (the replay clock)
+        self.done = threading.Event()
+
+    def run(self) -> None:
+        try:
+            start = time.monotonic()
+            shift = 0.0   # time removed by capping gaps
+            prev_at = 0.0
+            i, n = 0, len(self.schedule)
+            while i < n:
+                if self.speed > 0:
+                    at = self.schedule[i].at
+                    gap = (at - prev_at) / self.speed
+                    if gap > self.max_gap:
+                        shift += gap - self.max_gap
+                    prev_at = at
+                    due = start + at / self.speed - shift
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                # everything due at the same capture time goes out as one write per node
+                j = i + 1
+                while j < n and self.schedule[j].at == self.schedule[i].at:
+                    j += 1
+                chunks: Dict[int, List[str]] = {}
+                for r in self.schedule[i:j]:
+                    chunks.setdefault(r.node, []).append(r.text + "\n")
+                for node, lines in chunks.items():
+                    self.files[node].write("".join(lines).encode("utf-8"))
+                    t = time.monotonic()
+                    self.written[node].extend([t] * len(lines))
+                self.capture_at = self.schedule[j - 1].at
+                i = j
+        finally:
+            for f in self.files.values():
+                f.close()
+            self.done.set()
+
+# -------------------------
+# Stubbed restarts
+# -------------------------
+
+@dataclass
+class Decision:
+    service: str
+    reason: str
+    accepted: bool                 # False when the cooldown suppressed it
+    latency_s: Optional[float]     # trigger line written -> decision (None if time-based)
+
+class StubRestarter:
+    """Same interface RuleSet / main use from RestartManager; records instead of restarting."""
+    def __init__(self, cooldown_minutes: float, clock):
+        self.cooldown = timedelta(minutes=cooldown_minutes)
+        self.clock = clock
+        self.last_restart: Dict[str, datetime] = {}
+        self.decisions: List[Decision] = []
+        self.pending_latency: Optional[float] = None   # set by ReplayRules right before the call
+
+    def attempt_restart(self, node_service: str, reason_key: str, evidence_lines: List[str]) -> bool:
+        now = self.clock()
+        last = self.last_restart.get(node_service)
+        accepted = last is None or now - last >= self.cooldown
+        if accepted:
+            self.last_restart[node_service] = now
+        self.decisions.append(Decision(node_service, reason_key, accepted, self.pending_latency))
+        return accepted
+
+    def in_flight(self):
+        return set()
+
+    def shutdown(self, wait: bool = True) -> None:
+        pass
+
+class ReplayRules(W.RuleSet):
+    """RuleSet that timestamps each restart decision against its triggering line."""
+    def __init__(self, cfg: dict, restarter: StubRestarter, writer: ReplayWriter):
+        super().__init__(cfg, restarter)
+        self.writer = writer
+
+    def restart(self, st, reason, evidence, trigger):
+        latency = None
+        if trigger is not None and trigger[1] is not None:
+            node, line_no = trigger
+            written = self.writer.written.get(node, [])
+            if 0 < line_no <= len(written):
+                latency = time.monotonic() - written[line_no - 1]
+        self.restarter.pending_latency = latency
+        super().restart(st, reason, evidence, trigger)
+        self.restarter.pending_latency = None
+
+# -------------------------
+# Replay driver
+# -------------------------
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, int(round(q * (len(s) - 1)))))]
+
+def run_replay(args, cfg: dict, schedule: List[ReplayLine], base_ts: Optional[datetime],
+               n_nodes: int, workdir: Path) -> dict:
+    addresses = [a.strip().lower() for a in (args.addresses or "").split(",") if a.strip()]
+    log_paths: Dict[int, str] = {}
+    for n in range(1, n_nodes + 1):
+        p = workdir / f"cortensord-{n}.log"
+        p.write_bytes(b"")
+        log_paths[n] = str(p)
+
+    writer = ReplayWriter(schedule, log_paths, speed=args.speed, max_gap=args.max_gap)
+    base = base_ts or datetime.now(timezone.utc)
+    clock = lambda: base + timedelta(seconds=writer.capture_at)  # noqa: E731
+
+    tail_lines = int(cfg.get("tail_lines", 200))
+    watch = None if args.no_inotify else W.InotifyWatch.create()
+    engine = W.DetectorEngine(profile=True)
+    states: Dict[int, W.NodeState] = {}
+    for n in range(1, n_nodes + 1):
+        nd = W.NodeConfigState(
+            index=n,
+            address=addresses[n - 1] if n - 1 < len(addresses) else f"0x{n:040x}",
+            env_path="",
+            log_path=log_paths[n],
+            service=W.SYSTEMD_SERVICE_FMT.format(idx=n),
+        )
+        tailer = W.FileTailer(nd.log_path, init_tail_lines=tail_lines, watch=watch)
+        st = W.NodeState(cfg=nd, tailer=tailer, buf=deque(maxlen=tail_lines))
+        engine.feed(st, tailer.prime_tail(), prime=True)
+        states[n] = st
+
+    restarter = StubRestarter(float(cfg.get("cooldown_minutes", 2)), clock)
+    rules = ReplayRules(cfg, restarter, writer)
+    rules_cpu_ns = 0
+    poll = float(cfg.get("poll_interval_seconds", 0.5)) if args.poll is None else args.poll
+
+    out = sys.stdout if args.verbose else open(os.devnull, "w")
+    t0 = time.monotonic()
+    writer.start()
+    with contextlib.redirect_stdout(out):
+        while True:
+            finished = writer.done.is_set()
+            if watch is not None:
+                watch.wait(0.2)
+            else:
+                time.sleep(poll)
+            batches: Dict[int, W.LineBatch] = {}
+            for n, st in states.items():
+                batches[n] = engine.feed(st, st.tailer.read_new_lines())
+            c0 = time.process_time_ns()
+            rules.evaluate(clock(), states, batches)
+            rules_cpu_ns += time.process_time_ns() - c0
+            if finished and all(st.line_no >= len(writer.written[n]) for n, st in states.items()):
+                break
+    elapsed = time.monotonic() - t0
+    if watch is not None:
+        watch.close()
+    if out is not sys.stdout:
+        out.close()
+
+    detector_ns = sum(engine.cpu_ns.values())
+    by_reason: Dict[str, dict] = {}
+    for d in restarter.decisions:
+        r = by_reason.setdefault(d.reason, {"decisions": 0, "accepted": 0, "latencies": []})
+        r["decisions"] += 1
+        r["accepted"] += int(d.accepted)
+        if d.latency_s is not None:
+            r["latencies"].append(d.latency_s)
+    latency = {}
+    all_lat: List[float] = []
+    for reason, r in sorted(by_reason.items()):
+        lat = r.pop("latencies")
+        all_lat.extend(lat)
+        latency[reason] = dict(r, p50_ms=_ms(percentile(lat, 0.5)), p95_ms=_ms(percentile(lat, 0.95)),
+                               max_ms=_ms(max(lat) if lat else None))
+
+    return {
+        "files": list(args.logs),
+        "nodes": n_nodes,
+        "speed": args.speed,
+        "inotify": watch is not None,
+        "lines": engine.lines,
+        "elapsed_s": round(elapsed, 3),
+        "lines_per_s": round(engine.lines / elapsed, 1) if elapsed > 0 else None,
+        "detector_cpu_ms": round(detector_ns / 1e6, 3),
+        "detector_lines_per_cpu_s": round(engine.lines / (detector_ns / 1e9), 1) if detector_ns else None,
+        "rules_cpu_ms": round(rules_cpu_ns / 1e6, 3),
+        "per_detector": {name: {"cpu_ms": round(ns / 1e6, 3), "hits": engine.hits.get(name)}
+                         for name, ns in engine.cpu_ns.items()},
+        "restart_latency": latency,
+        "restart_latency_p95_ms": _ms(percentile(all_lat, 0.95)),
+    }
+
+def _ms(v: Optional[float]) -> Optional[float]:
+    return None if v is None else round(v * 1000.0, 2)
+
+def print_report(rep: dict) -> None:
+    print(f"=== replay: {rep['nodes']} node(s) | {rep['lines']} lines | speed={rep['speed'] or 'max'} "
+          f"| inotify={'on' if rep['inotify'] else 'off'} ===")
+    print(f"elapsed {rep['elapsed_s']:.3f}s | {rep['lines_per_s']} lines/s end to end | "
+          f"detectors {rep['detector_cpu_ms']:.1f} ms CPU ({rep['detector_lines_per_cpu_s']} lines/CPU-s) | "
+          f"rules {rep['rules_cpu_ms']:.1f} ms CPU")
+    print("")
+    print(f"{'detector':<18} {'cpu_ms':>10} {'hits':>8} {'us/hit':>8}")
+    for name, d in rep["per_detector"].items():
+        hits = d["hits"]
+        per = f"{d['cpu_ms'] * 1000.0 / hits:.2f}" if hits else "-"
+        print(f"{name:<18} {d['cpu_ms']:>10.3f} {hits if hits is not None else '-':>8} {per:>8}")
+    print("")
+    if not rep["restart_latency"]:
+        print("No restart decisions.")
+        return
+    print(f"{'reason':<22} {'decisions':>9} {'accepted':>8} {'p50_ms':>8} {'p95_ms':>8} {'max_ms':>8}")
+    for reason, r in rep["restart_latency"].items():
+        cells = [("-" if r[k] is None else f"{r[k]:.2f}") for k in ("p50_ms", "p95_ms", "max_ms")]
+        print(f"{reason:<22} {r['decisions']:>9} {r['accepted']:>8} {cells[0]:>8} {cells[1]:>8} {cells[2]:>8}")
+
+# -------------------------
+# Main
+# -------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay captured cortensord logs through the watcher detectors.")
+    ap.add_argument("logs", nargs="+", help="captured log files, one per node (node 1, 2, ... in this order)")
+    ap.add_argument("--speed", type=float, default=60.0,
+                    help="replay speed-up over the capture's timestamps; 0 = as fast as possible (default 60)")
+    ap.add_argument("--rate", type=float, default=2000.0,
+                    help="capture-time lines/s assumed for files without timestamps; --speed still "
+                         "applies on top (default 2000)")
+    ap.add_argument("--max-gap", type=float, default=2.0,
+                    help="cap on any single idle gap after scaling, in seconds (default 2)")
+    ap.add_argument("--config", default=None,
+                    help="watcher config.json to take thresholds/flags from (default: built-in defaults "
+                         "with every restart flag on)")
+    ap.add_argument("--addresses", default=None,
+                    help="comma-separated node addresses in file order (for wrong_user_state)")
+    ap.add_argument("--poll", type=float, default=None,
+                    help="poll interval without inotify (default: poll_interval_seconds from config)")
+    ap.add_argument("--no-inotify", action="store_true", help="poll instead of using inotify")
+    ap.add_argument("--workdir", default=None, help="where replayed logs are written (default: a temp dir)")
+    ap.add_argument("--json", default=None, help="also write the report as JSON here")
+    ap.add_argument("--fail-below-lps", type=float, default=None,
+                    help="exit 1 if detector throughput (lines per CPU second) is below this")
+    ap.add_argument("--fail-above-p95-ms", type=float, default=None,
+                    help="exit 1 if the p95 trigger-to-decision latency is above this")
+    ap.add_argument("--verbose", action="store_true", help="show the watcher's own output during replay")
+    args = ap.parse_args()
+
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            cfg = W.deep_merge(W.DEFAULT_CONFIG, json.load(f))
+    else:
+        cfg = W.deep_merge(W.DEFAULT_CONFIG, {"restart_flags": {k: True for k in W.DEFAULT_CONFIG["restart_flags"]}})
+
+    schedule, base_ts = load_capture(args.logs, args.rate)
+    if not schedule:
+        print("[ERROR] No lines in the given files.", file=sys.stderr)
+        sys.exit(1)
+
+    tmp = None
+    if args.workdir:
+        workdir = Path(args.workdir)
+        workdir.mkdir(parents=True, exist_ok=True)
+    else:
+        tmp = tempfile.mkdtemp(prefix="watch_replay_")
+        workdir = Path(tmp)
+    try:
+        rep = run_replay(args, cfg, schedule, base_ts, len(args.logs), workdir)
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    print_report(rep)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+        print(f"\n[OK] Wrote {args.json}")
+
+    failed = []
+    lps = rep["detector_lines_per_cpu_s"]
+    if args.fail_below_lps is not None and lps is not None and lps < args.fail_below_lps:
+        failed.append(f"detector throughput {lps} lines/CPU-s < {args.fail_below_lps}")
+    p95 = rep["restart_latency_p95_ms"]
+    if args.fail_above_p95_ms is not None and p95 is not None and p95 > args.fail_above_p95_ms:
+        failed.append(f"p95 restart latency {p95} ms > {args.fail_above_p95_ms}")
+    for msg in failed:
+        print(f"[FAIL] {msg}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n[INFO] Interrupted by user.")
@@ -0,0 +1,289 @@
+import os
+import random
+import sys
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+from watcher import (  # noqa: E402
+    ASSIGNED_MINERS_RE,
+    PING_FAIL_PATTERN,
+    TRACEBACK_PATTERN,
+    USER_TOKEN,
+    DetectorEngine,
+    NodeConfigState,
+    NodeState,
+    RuleSet,
+    extract_addresses,
+    extract_context,
+    maybe_update_cognitive_level,
+    parse_latest_id_only,
+    parse_latest_state_only,
+    parse_session_state_from_line,
+    saw_node_pool_stale,
+)
+
+
+# ---- oracle: the per-cycle buffer rescans the watcher ran before DetectorEngine ----
+
+def old_saw_traceback(lines):
+    return any(TRACEBACK_PATTERN in ln for ln in lines)
+
+
+def old_saw_ping_fail(buf, threshold, window):
+    recent = list(buf)[-window:]
+    count = sum(1 for ln in recent if ln.strip().startswith(PING_FAIL_PATTERN))
+    return count >= threshold
+
+
+def old_scan_assigned_miners_from_lines(lines):
+    for idx, ln in enumerate(lines):
+        m = ASSIGNED_MINERS_RE.search(ln)
+        if m:
+            return extract_addresses(m.group(1)), idx
+    return None
+
+
+def old_line_idx_in_buf(buf, pattern):
+    arr = list(buf)
+    for i in range(len(arr) - 1, -1, -1):
+        if pattern.search(arr[i]):
+            return i
+    return None
+
+
+class OldLoop:
+    """One node as the old main loop saw it: every check rescans the new lines or the buffer."""
+
+    def __init__(self, maxlen, threshold, window):
+        self.buf = deque(maxlen=maxlen)
+        self.consumed = deque(maxlen=maxlen)  # ping fails already used by a restart
+        self.threshold = threshold
+        self.window = window
+        self.last_cl = None
+        self.last_session_id = None
+        self.last_state = None
+
+    def _parse(self, ln):
+        """Returns the session id if this line completed one (State=6)."""
+        maybe_update_cognitive_level(self, ln)
+        res = parse_session_state_from_line(ln)
+        if res:
+            self.last_session_id, self.last_state = res
+            return self.last_session_id if self.last_state == 6 else None
+        sid_only = parse_latest_id_only(ln)
+        if sid_only is not None:
+            self.last_session_id = sid_only
+        st_only = parse_latest_state_only(ln)
+        if st_only is not None:
+            self.last_state = st_only
+            if st_only == 6 and self.last_session_id is not None:
+                return self.last_session_id
+        return None
+
+    def _append(self, ln):
+        self.buf.append(ln)
+        self.consumed.append(False)
+
+    def prime(self, lines):
+        for ln in lines:
+            self._append(ln)
+            self._parse(ln)
+
+    def cycle(self, lines):
+        completed = None
+        for ln in lines:
+            self._append(ln)
+            sid = self._parse(ln)
+            if sid is not None:
+                completed = sid if completed is None else max(completed, sid)
+        assigned = old_scan_assigned_miners_from_lines(lines) if lines else None
+        out = {
+            "traceback": bool(lines) and old_saw_traceback(lines),
+            "node_pool_stale": bool(lines) and saw_node_pool_stale(lines),
+            "assigned": assigned[0] if assigned else None,
+            "context": extract_context(self.buf, old_line_idx_in_buf(self.buf, ASSIGNED_MINERS_RE)) if assigned else None,
+            "completed": completed,
+            "user_mode": any(USER_TOKEN in ln for ln in list(self.buf)[-30:]),
+            "pingfail": old_saw_ping_fail(self._unconsumed(), self.threshold, self.window),
+            "display": (self.last_cl, self.last_session_id, self.last_state),
+        }
+        if out["pingfail"]:
+            # The old loop deleted the consumed lines from the buffer, which also slid
+            # older lines into the window; mark them instead so positions stay put.
+            for i in range(max(0, len(self.buf) - self.window), len(self.buf)):
+                self.consumed[i] = True
+        return out
+
+    def _unconsumed(self):
+        return ["" if used else ln for ln, used in zip(self.buf, self.consumed)]
+
+
+def new_cycle(engine, st, lines, threshold, window):
+    batch = engine.feed(st, lines)
+    pingfail = st.ping_fail_count(window) >= threshold
+    if pingfail:
+        st.ping_fail_lines.clear()
+    return {
+        "traceback": batch.traceback is not None,
+        "node_pool_stale": batch.node_pool_stale is not None,
+        "assigned": batch.assigned[0] if batch.assigned else None,
+        "context": extract_context(st.buf, st.buf_index(batch.assigned[1])) if batch.assigned else None,
+        "completed": batch.completed_session,
+        "user_mode": st.is_user_mode_recent(),
+        "pingfail": pingfail,
+        "display": (st.last_cl, st.last_session_id, st.last_state),
+    }
+
+
+def random_line(rnd):
+    n, k = rnd.randint(1, 2000), rnd.randint(0, 7)
+    return rnd.choice([
+        "Traceback (most recent call last):",
+        '  File "node.py", line 12, in run',
+        "ValueError: boom",
+        "Pinging network...",
+        "   Pinging network... retry 2",
+        "[ok] after Pinging network... done",
+        "Node Pool Ephemeral Node Stale: true",
+        "Node Pool Reserved Node Stale: False",
+        "Node Pool Reserved Node Stale: TRUE (since 3m)",
+        f"Assigned Miners: 0x{n:04x}AbC, 0X{k:02d}dEf",
+        f"2025-08-19 12:00:00 Assigned Miners: 0x{n:x}",
+        f"Cognitive Level: {k}",
+        f"* CL: {n}.",
+        f"12:00:01  CL:{k} ready",
+        "CL: n/a.",
+        f"* Latest ID: {n}",
+        f"* Latest State: {k}",
+        f"* Latest ID:  {n}  / Latest State:  {k}",
+        f"Session ID: {n} State: {k}",
+        f"Remote Session = {n}",
+        f"State: {k}",
+        "Mode: USER",
+        "user mode off",
+        f"ordinary line {n}",
+        "",
+    ])
+
+
+@pytest.mark.parametrize("seed,maxlen,threshold,window", [
+    (1, 200, 2, 52),
+    (2, 200, 3, 20),
+    (3, 60, 2, 52),
+])
+def test_engine_matches_the_old_buffer_scanners(seed, maxlen, threshold, window):
+    rnd = random.Random(seed)
+    old = OldLoop(maxlen, threshold, window)
+    st = NodeState(cfg=None, tailer=None, buf=deque(maxlen=maxlen))
+    engine = DetectorEngine()
+
+    primed = [random_line(rnd) for _ in range(rnd.randint(0, maxlen))]
+    old.prime(primed)
+    engine.feed(st, primed, prime=True)
+
+    for cycle in range(3000):
+        lines = [random_line(rnd) for _ in range(rnd.choice([0, 0, 1, 2, 5, 12]))]
+        want = old.cycle(lines)
+        got = new_cycle(engine, st, lines, threshold, window)
+        if sum(1 for ln in lines if ASSIGNED_MINERS_RE.search(ln)) > 1:
+            # the old loop paired the first hit's miners with context around the last one
+            want["context"] = got["context"] = None
+        assert got == want, (cycle, lines)
+
+
+def test_primed_lines_seed_state_without_triggering():
+    st = NodeState(cfg=None, tailer=None)
+    engine = DetectorEngine()
+    batch = engine.feed(st, [
+        "Traceback (most recent call last):",
+        "Node Pool Ephemeral Node Stale: true",
+        "Assigned Miners: 0xAA",
+        "* Latest ID: 41 / Latest State: 6",
+        "Cognitive Level: 5",
+        "Pinging network...",
+        "mode USER",
+    ], prime=True)
+    assert batch.traceback is None and batch.node_pool_stale is None and batch.assigned is None
+    assert (st.last_session_id, st.last_state, st.last_cl) == (41, 6, "5")
+    assert list(st.ping_fail_lines) == [6]
+    assert st.is_user_mode_recent() and st.line_no == 7
+
+    batch = engine.feed(st, ["Traceback (most recent call last):", "Assigned Miners: 0xBb, 0xCC"])
+    assert batch.traceback == 8
+    assert batch.assigned == ({"0xbb", "0xcc"}, 9)
+    assert st.buf_index(9) == len(st.buf) - 1
+
+
+def test_profile_counts_hits_per_detector():
+    engine = DetectorEngine(profile=True)
+    st = NodeState(cfg=None, tailer=None)
+    engine.feed(st, ["Pinging network...", "Pinging network...", "Session ID: 3 State: 4", "nothing here"])
+    assert engine.lines == 4
+    assert engine.hits["pingfail"] == 2 and engine.hits["session_state"] == 1 and engine.hits["traceback"] == 0
+    assert engine.cpu_ns["dispatch"] > 0
+
+
+class RecordingRestarter:
+    def __init__(self):
+        self.calls = []
+
+    def attempt_restart(self, service, reason, evidence):
+        self.calls.append((service, reason))
+        return True
+
+
+def _node(index=1, address="0xaa"):
+    cfg = NodeConfigState(index=index, address=address, env_path="", log_path="", service=f"cortensor-{index}")
+    return NodeState(cfg=cfg, tailer=None)
+
+
+def test_ruleset_pingfail_restarts_once_per_burst():
+    restarter = RecordingRestarter()
+    rules = RuleSet({"nodes": [], "pingfail_threshold": 2, "pingfail_window": 10}, restarter)
+    engine = DetectorEngine()
+    st = _node()
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for lines in (["Pinging network..."], ["ok", "Pinging network..."], ["ok"], ["Pinging network..."]):
+        rules.evaluate(now, {1: st}, {1: engine.feed(st, lines)})
+    assert restarter.calls == [("cortensor-1", "pingfail")]
+
+
+def test_ruleset_traceback_unrecovered_after_grace():
+    restarter = RecordingRestarter()
+    rules = RuleSet({"nodes": [], "traceback_recovery_seconds": 60}, restarter)
+    engine = DetectorEngine()
+    st = _node()
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for dt in (0, 30, 61):
+        batch = engine.feed(st, ["Traceback (most recent call last):"])
+        rules.evaluate(t0 + timedelta(seconds=dt), {1: st}, {1: batch})
+    # "traceback" is off by default; the unrecovered rule fires once the grace has passed
+    assert restarter.calls == [("cortensor-1", "traceback_unrecovered")]
+    assert st.traceback_first_detected is None
+
+
+def test_ruleset_wrong_user_state_uses_snapshot_from_another_node():
+    restarter = RecordingRestarter()
+    cfg = {"nodes": [{"index": 1}, {"index": 2}], "restart_flags": {"wrong_user_state": True}}
+    rules = RuleSet(cfg, restarter)
+    engine = DetectorEngine()
+    a, b = _node(1, "0xaa"), _node(2, "0xbb")
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    batches = {
+        1: engine.feed(a, ["Assigned Miners: 0xBB, 0xcc"]),
+        2: engine.feed(b, ["mode USER", "Session ID: 7 State: 3"]),
+    }
+    assert rules.evaluate(now, {1: a, 2: b}, batches) is True
+    assert restarter.calls == [("cortensor-2", "wrong_user_state")]
+    assert rules.assigned_trigger == (1, 1)
+    assert cfg["nodes"][1]["last_selected_task"] == 7
+    # same snapshot: no second restart
+    rules.evaluate(now, {1: a, 2: b}, {1: engine.feed(a, []), 2: engine.feed(b, [])})
+    assert len(restarter.calls) == 1
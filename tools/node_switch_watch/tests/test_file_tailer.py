@@ -0,0 +1,63 @@
+import os
+import sys
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+from watcher import FileTailer  # noqa: E402
+
+
+def _append(path, text):
+    with open(path, "ab") as f:
+        f.write(text.encode())
+
+
+def test_prime_reads_only_the_tail_across_small_blocks(tmp_path):
+    log = tmp_path / "node.log"
+    _append(log, "".join(f"line {i:04d}\n" for i in range(1000)))
+    tailer = FileTailer(str(log), init_tail_lines=10)
+    tailer.BLOCK = 64  # many blocks, the first one cut mid-line
+    assert tailer.prime_tail() == [f"line {i:04d}" for i in range(990, 1000)]
+    assert tailer.prime_tail() == []  # primes once
+    _append(log, "line 1000\n")
+    assert tailer.read_new_lines() == ["line 1000"]
+
+
+def test_prime_leaves_a_partial_last_line_to_arrive_whole(tmp_path):
+    log = tmp_path / "node.log"
+    _append(log, "a\r\nb\nhalf")
+    tailer = FileTailer(str(log), init_tail_lines=10)
+    assert tailer.prime_tail() == ["a", "b"]
+    assert tailer.read_new_lines() == []
+    _append(log, " done\nc\n")
+    assert tailer.read_new_lines() == ["half done", "c"]
+
+
+def test_prime_with_zero_tail_follows_from_eof(tmp_path):
+    log = tmp_path / "node.log"
+    _append(log, "old 1\nold 2\n")
+    tailer = FileTailer(str(log), init_tail_lines=0)
+    assert tailer.prime_tail() == []
+    _append(log, "new\n")
+    assert tailer.read_new_lines() == ["new"]
+
+
+def test_file_created_after_prime_is_read_from_the_top(tmp_path):
+    log = tmp_path / "node.log"
+    tailer = FileTailer(str(log), init_tail_lines=5)
+    assert tailer.prime_tail() == []
+    assert tailer.read_new_lines() == []
+    _append(log, "first\nsecond\n")
+    assert tailer.read_new_lines() == ["first", "second"]
+
+
+def test_rotation_after_prime_reads_the_new_file(tmp_path):
+    log = tmp_path / "node.log"
+    _append(log, "x\ny\n")
+    tailer = FileTailer(str(log), init_tail_lines=5)
+    assert tailer.prime_tail() == ["x", "y"]
+    os.rename(log, tmp_path / "node.log.1")
+    _append(log, "fresh\n")
+    assert tailer.read_new_lines() == ["fresh"]
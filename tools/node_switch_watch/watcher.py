@@ -34,8 +34,13 @@ import sys
 import json
 import time
 import glob
+import select
 import signal
+import struct
+import ctypes
+import ctypes.util
 import subprocess
+import threading
 import urllib.request
 import urllib.error
 from typing import List, Dict, Optional, Tuple, Set
@@ -43,6 +48,7 @@ from pathlib import Path
 from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # -------------------------
 # Versioning (local + remote check)
@@ -127,6 +133,11 @@ SESSION_STATE_COMBINED_RE = re.compile(
 )
 SESSION_ID_RE = re.compile(r"(?i)(?:Remote\s*Session|Session\s*ID)\s*[:=\s]*\s*(\d+)")
 STATE_RE = re.compile(r"(?i)\bState\s*[:=\s]*\s*(\d+)")
+# - Legacy split forms (whole line is just the id / just the state)
+SESSION_ID_ONLY_RE = re.compile(r"^\s*(?:\*\s*)?(?:Remote\s*Session|Session\s*ID)\s*[:=\s]*\s*(\d+)\s*$", re.IGNORECASE)
+STATE_ONLY_RE = re.compile(r"^\s*(?:\*\s*)?\bState\s*[:=\s]*\s*(\d+)\s*$", re.IGNORECASE)
+DIGITS_RE = re.compile(r"(\d+)")
+TRAILING_PUNCT_RE = re.compile(r"[.\s]+$")
 
 # Address extraction & normalization
 ADDR_RE = re.compile(r"0[xX][0-9a-fA-F]+")  # accept any length hex token beginning with 0x/0X
@@ -167,7 +178,10 @@ def short_addr(addr: Optional[str], head: int = 6, tail: int = 6) -> str:
 # -------------------------
 
 DEFAULT_CONFIG = {
-    "check_interval_seconds": 5,               # polling interval
+    "check_interval_seconds": 5,               # status redraw interval (detection is event-driven)
+    "poll_interval_seconds": 0.5,              # log polling when inotify is unavailable
+    "restart_workers": 4,                      # concurrent systemctl restarts
+    "restart_timeout_seconds": 60,             # give up on a hung systemctl after this
     "tail_lines": 400,                         # in-memory buffer per node
     "traceback_recovery_seconds": 240,         # window before 'traceback_unrecovered'
     "pingfail_threshold": 2,                   # count within window
@@ -310,22 +324,137 @@ def merge_discovered_nodes_into_config(cfg: dict, discovered: List[NodeConfig])
 # File Tailer
 # -------------------------
 
+# inotify (Linux) via ctypes; stdlib-only, so no pyinotify/watchdog
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+class InotifyWatch:
+    """
+    One inotify fd shared by all tailers. Watches the *directories* holding the
+    logs, so creation and rename-based rotation are seen as well as appends.
+    `poll()` drains pending events and marks the matching tailers dirty;
+    `fileno()` lets a caller select() on it. Construct with `InotifyWatch.create()`,
+    which returns None where inotify isn't available (non-Linux, exhausted limits).
+    """
+    def __init__(self, libc, fd: int):
+        self._libc = libc
+        self._fd = fd
+        self._dirs: Dict[int, str] = {}            # wd -> dir
+        self._wd_by_dir: Dict[str, int] = {}
+        self._tailers: Dict[Tuple[str, str], List["FileTailer"]] = {}  # (dir, name) -> tailers
+
+    @classmethod
+    def create(cls) -> Optional["InotifyWatch"]:
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except Exception:
+            return None
+        if fd < 0:
+            print(f"[WARN] inotify unavailable ({os.strerror(ctypes.get_errno())}); polling logs instead.", file=sys.stderr)
+            return None
+        return cls(libc, fd)
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def add(self, tailer: "FileTailer") -> bool:
+        d, name = os.path.split(os.path.abspath(tailer.path))
+        if d not in self._wd_by_dir:
+            mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            wd = self._libc.inotify_add_watch(self._fd, d.encode(), mask)
+            if wd < 0:
+                print(f"[WARN] inotify_add_watch({d}) failed: {os.strerror(ctypes.get_errno())}", file=sys.stderr)
+                return False
+            self._dirs[wd] = d
+            self._wd_by_dir[d] = wd
+        self._tailers.setdefault((d, name), []).append(tailer)
+        return True
+
+    def poll(self) -> int:
+        """Drain events without blocking; returns the number of tailers marked dirty."""
+        marked = 0
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            except OSError:
+                break
+            if not data:
+                break
+            off = 0
+            while off + _INOTIFY_EVENT.size <= len(data):
+                wd, mask, _cookie, ln = _INOTIFY_EVENT.unpack_from(data, off)
+                name = data[off + _INOTIFY_EVENT.size: off + _INOTIFY_EVENT.size + ln].split(b"\0", 1)[0]
+                off += _INOTIFY_EVENT.size + ln
+                if mask & IN_Q_OVERFLOW:
+                    # events were dropped; every tailer has to look for itself
+                    for ts in self._tailers.values():
+                        for t in ts:
+                            t.dirty = True
+                            marked += 1
+                    continue
+                d = self._dirs.get(wd)
+                for t in self._tailers.get((d, name.decode(errors="replace")), ()):
+                    t.dirty = True
+                    marked += 1
+        return marked
+
+    def wait(self, timeout: float) -> int:
+        """Block up to `timeout` seconds for events, then poll()."""
+        try:
+            select.select([self._fd], [], [], max(0.0, timeout))
+        except (InterruptedError, OSError):
+            pass
+        return self.poll()
+
+    def close(self) -> None:
+        try:
+            os.close(self._fd)
+        except Exception:
+            pass
+
 class FileTailer:
     """
     Minimal tail -F like follower:
-      - Reads appended data as the file grows
+      - Priming reads the last `init_tail_lines` lines by seeking backwards from EOF
+        in blocks (cost is O(tail), not O(file size)); following resumes exactly
+        where priming stopped, so nothing written in between is lost
+      - Reads appended data as the file grows; with an InotifyWatch attached it
+        only touches the file when an event (or the periodic safety rescan) says so
       - Reopens when inode changes or file is truncated (rotation)
-      - On open, captures last `init_tail_lines` lines to buffer (returned once via `prime_tail()`)
     """
-    def __init__(self, path: str, init_tail_lines: int = 200, encoding: str = "utf-8"):
+    BLOCK = 64 * 1024
+    RESCAN_SECONDS = 30.0  # stat the file this often even without events (NFS, missed events)
+
+    def __init__(self, path: str, init_tail_lines: int = 200, encoding: str = "utf-8",
+                 watch: Optional[InotifyWatch] = None):
         self.path = path
         self.encoding = encoding
         self.init_tail_lines = init_tail_lines
         self._f = None
         self._inode = None
-        self._leftover = ""
+        self._leftover = b""
         self._primed = False
         self._missing_notice = False
+        self.dirty = True
+        self._last_check = 0.0
+        self._watched = bool(watch and watch.add(self))
+
+    def _decode(self, raw: bytes) -> str:
+        return raw.decode(self.encoding, errors="replace").rstrip("\r")
 
     def prime_tail(self) -> List[str]:
         if self._primed:
@@ -337,20 +466,37 @@ class FileTailer:
                     print(f"[INFO] Waiting for log file to appear: {self.path}")
                     self._missing_notice = True
                 return []
-            with open(self.path, "r", encoding=self.encoding, errors="replace") as f:
-                lines = f.readlines()
+            f = open(self.path, "rb")
+            st = os.fstat(f.fileno())
+            end = f.seek(0, os.SEEK_END)
+            pos, data = end, b""
+            while pos > 0 and data.count(b"\n") <= self.init_tail_lines:
+                step = min(self.BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+            parts = data.split(b"\n")
+            partial = parts.pop()   # text after the last newline: not a complete line yet
+            if pos > 0 and parts:
+                parts.pop(0)        # cut mid-line by the block boundary
+            # follow from the start of the incomplete last line, so it arrives whole later
+            f.seek(end - len(partial))
+            self._f, self._inode, self._leftover = f, st.st_ino, b""
             if self._missing_notice:
                 self._missing_notice = False
-            return [ln.rstrip("\n") for ln in lines[-self.init_tail_lines:]]
+            return [self._decode(ln) for ln in parts[-self.init_tail_lines:]] if self.init_tail_lines > 0 else []
         except Exception as e:
             print(f"[WARN] Failed to prime tail for {self.path}: {e}", file=sys.stderr)
             return []
 
-    def _open_follow(self):
+    def _open_follow(self, from_start: bool = False):
         st = os.stat(self.path)
-        self._f = open(self.path, "r", encoding=self.encoding, errors="replace")
+        self._f = open(self.path, "rb")
         self._inode = st.st_ino
-        self._f.seek(0, os.SEEK_END)
+        self._leftover = b""
+        # a rotated-in file is new: read it from the top; a first open follows from EOF
+        if not from_start:
+            self._f.seek(0, os.SEEK_END)
 
     def _maybe_reopen_on_rotate(self):
         try:
@@ -364,7 +510,7 @@ class FileTailer:
                     self._f.close()
                 except Exception:
                     pass
-                self._open_follow()
+                self._open_follow(from_start=True)
         except FileNotFoundError:
             if self._f:
                 try:
@@ -376,6 +522,13 @@ class FileTailer:
 
     def read_new_lines(self) -> List[str]:
         out: List[str] = []
+        now = time.monotonic()
+        if self._watched and self._f is not None and not self.dirty \
+                and now - self._last_check < self.RESCAN_SECONDS:
+            return out
+        self.dirty = False
+        self._last_check = now
+
         if not os.path.exists(self.path):
             if not self._missing_notice:
                 print(f"[INFO] Waiting for log file to appear: {self.path}")
@@ -388,25 +541,23 @@ class FileTailer:
 
         if self._f is None or self._inode is None:
             try:
-                self._open_follow()
+                self._open_follow(from_start=self._primed)
             except Exception:
                 return out
 
         self._maybe_reopen_on_rotate()
+        if self._f is None:
+            return out
 
         try:
             chunk = self._f.read()
             if not chunk:
                 return out
             data = self._leftover + chunk
-            lines = data.splitlines(keepends=True)
-            if lines and not lines[-1].endswith("\n"):
-                self._leftover = lines[-1]
-                lines = lines[:-1]
-            else:
-                self._leftover = ""
+            lines = data.split(b"\n")
+            self._leftover = lines.pop()
             for ln in lines:
-                out.append(ln.rstrip("\n"))
+                out.append(self._decode(ln))
             return out
         except Exception:
             return out
@@ -416,6 +567,12 @@ class FileTailer:
 # -------------------------
 
 class RestartManager:
+    """
+    Restart decisions are made synchronously (cooldown + in-flight checks, so
+    callers know immediately), while the evidence files and the slow
+    `systemctl restart` run on a small bounded worker pool: one stuck unit
+    never stalls detection for the other nodes.
+    """
     def __init__(
         self,
         log_dir="restart_logs",
@@ -426,6 +583,9 @@ class RestartManager:
         sudo_path="/usr/bin/sudo",
         sudo_non_interactive=True,
         systemctl_path="/bin/systemctl",
+        workers=4,
+        timeout_seconds=60,
+        node_cooldown_minutes: Optional[Dict[str, float]] = None,
     ):
         self.log_dir = Path(log_dir)
         self.log_dir.mkdir(exist_ok=True)
@@ -433,6 +593,7 @@ class RestartManager:
         if not self.master_log.exists():
             self.master_log.write_text("", encoding="utf-8")
         self.cooldown = timedelta(minutes=cooldown_minutes)
+        self.node_cooldown = {svc: timedelta(minutes=m) for svc, m in (node_cooldown_minutes or {}).items()}
         self.last_restart: Dict[str, datetime] = {}
         self.dry_run = dry_run
 
@@ -441,45 +602,74 @@ class RestartManager:
         self.sudo_non_interactive = sudo_non_interactive
         self.systemctl_path = systemctl_path
 
+        self.timeout_seconds = timeout_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="restart")
+        self._inflight: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def cooldown_for(self, node_service: str) -> timedelta:
+        return self.node_cooldown.get(node_service, self.cooldown)
+
     def attempt_restart(self, node_service: str, reason_key: str, evidence_lines: List[str]) -> bool:
         now = datetime.now(timezone.utc)
-        last = self.last_restart.get(node_service, datetime.fromtimestamp(0, timezone.utc))
-        if now - last < self.cooldown:
-            print(f"[{node_service}] ⚠ Restart skipped (cooldown active)")
-            return False
-
-        ts = now.strftime("%Y%m%dT%H%M%S")
-        fname = f"{node_service}_{reason_key}_{ts}.log"
-        try:
-            self.log_dir.joinpath(fname).write_text("\n".join(evidence_lines), encoding="utf-8")
-        except Exception as e:
-            print(f"[WARN] Failed to write evidence file {fname}: {e}", file=sys.stderr)
+        with self._lock:
+            if node_service in self._inflight:
+                print(f"[{node_service}] ⚠ Restart skipped (restart already in progress)")
+                return False
+            last = self.last_restart.get(node_service, datetime.fromtimestamp(0, timezone.utc))
+            if now - last < self.cooldown_for(node_service):
+                print(f"[{node_service}] ⚠ Restart skipped (cooldown active)")
+                return False
+            self.last_restart[node_service] = now
+            self._inflight.add(node_service)
+        self._pool.submit(self._do_restart, node_service, reason_key, list(evidence_lines), now)
+        return True
 
-        entry = f"{now.isoformat()}Z  Restarted '{node_service}' ({reason_key}) -> '{fname}'\n"
+    def _do_restart(self, node_service: str, reason_key: str, evidence_lines: List[str], now: datetime) -> None:
         try:
-            with self.master_log.open("a", encoding="utf-8") as f:
-                f.write(entry)
-        except Exception as e:
-            print(f"[WARN] Failed to write master log: {e}", file=sys.stderr)
-
-        if self.dry_run:
-            print(f"[{node_service}] ✔ (dry-run) Would restart ({reason_key})")
-        else:
-            cmd: List[str] = []
-            if self.use_sudo:
-                cmd.extend([self.sudo_path])
-                if self.sudo_non_interactive:
-                    cmd.append("-n")
-            cmd.extend([self.systemctl_path, "restart", node_service])
+            ts = now.strftime("%Y%m%dT%H%M%S")
+            fname = f"{node_service}_{reason_key}_{ts}.log"
+            try:
+                self.log_dir.joinpath(fname).write_text("\n".join(evidence_lines), encoding="utf-8")
+            except Exception as e:
+                print(f"[WARN] Failed to write evidence file {fname}: {e}", file=sys.stderr)
 
+            entry = f"{now.isoformat()}Z  Restarted '{node_service}' ({reason_key}) -> '{fname}'\n"
             try:
-                subprocess.run(cmd, check=True)
-                print(f"[{node_service}] ✔ Restarted ({reason_key})")
-            except subprocess.CalledProcessError as e:
-                print(f"[{node_service}] ✘ Restart failed: {e}", file=sys.stderr)
+                with self._lock, self.master_log.open("a", encoding="utf-8") as f:
+                    f.write(entry)
+            except Exception as e:
+                print(f"[WARN] Failed to write master log: {e}", file=sys.stderr)
 
-        self.last_restart[node_service] = now
-        return True
+            if self.dry_run:
+                print(f"[{node_service}] ✔ (dry-run) Would restart ({reason_key})")
+            else:
+                cmd: List[str] = []
+                if self.use_sudo:
+                    cmd.extend([self.sudo_path])
+                    if self.sudo_non_interactive:
+                        cmd.append("-n")
+                cmd.extend([self.systemctl_path, "restart", node_service])
+
+                try:
+                    subprocess.run(cmd, check=True, timeout=self.timeout_seconds)
+                    print(f"[{node_service}] ✔ Restarted ({reason_key})")
+                except subprocess.CalledProcessError as e:
+                    print(f"[{node_service}] ✘ Restart failed: {e}", file=sys.stderr)
+                except subprocess.TimeoutExpired:
+                    print(f"[{node_service}] ✘ Restart timed out after {self.timeout_seconds}s", file=sys.stderr)
+                except OSError as e:
+                    print(f"[{node_service}] ✘ Restart failed: {e}", file=sys.stderr)
+        finally:
+            with self._lock:
+                self._inflight.discard(node_service)
+
+    def in_flight(self) -> Set[str]:
+        with self._lock:
+            return set(self._inflight)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
 
 # -------------------------
 # Node State
@@ -509,23 +699,29 @@ class NodeState:
     # session/state display
     last_session_id: Optional[int] = None
     last_state: Optional[int] = None
+    # incremental detector state (see DetectorEngine)
+    line_no: int = 0                                  # lines seen since start (primed included)
+    last_user_line: Optional[int] = None              # line_no of the latest USER line
+    ping_fail_lines: deque[int] = field(default_factory=lambda: deque(maxlen=1024))
 
     def is_user_mode_recent(self, window: int = 30) -> bool:
-        recent = list(self.buf)[-window:]
-        return any(USER_TOKEN in ln for ln in recent)
+        return self.last_user_line is not None and self.line_no - self.last_user_line < window
+
+    def ping_fail_count(self, window: int) -> int:
+        """Ping-fail lines among the last `window` lines."""
+        while self.ping_fail_lines and self.ping_fail_lines[0] <= self.line_no - window:
+            self.ping_fail_lines.popleft()
+        return len(self.ping_fail_lines)
+
+    def buf_index(self, line_no: int) -> Optional[int]:
+        """Position of absolute line `line_no` in buf, or None if it has scrolled out."""
+        idx = len(self.buf) - 1 - (self.line_no - line_no)
+        return idx if 0 <= idx < len(self.buf) else None
 
 # -------------------------
 # Error Scanners
 # -------------------------
 
-def saw_traceback(lines: List[str]) -> bool:
-    return any(TRACEBACK_PATTERN in ln for ln in lines)
-
-def saw_ping_fail(buf: deque[str], threshold: int, window: int) -> bool:
-    recent = list(buf)[-window:]
-    count = sum(1 for ln in recent if ln.strip().startswith(PING_FAIL_PATTERN))
-    return count >= threshold
-
 def saw_node_pool_stale(lines: List[str]) -> bool:
     for ln in lines:
         if any(k in ln for k in NODE_POOL_STALE_KEYS):
@@ -543,12 +739,12 @@ def maybe_update_cognitive_level(st: NodeState, line: str) -> None:
     if m:
         val = m.group(1).strip()
         # Normalize to just digits if present
-        mnum = re.search(r"(\d+)", val)
+        mnum = DIGITS_RE.search(val)
         if mnum:
             st.last_cl = mnum.group(1)
         else:
             # fallback to raw (trim trailing punctuation/space)
-            val = re.sub(r"[.\s]+$", "", val)
+            val = TRAILING_PUNCT_RE.sub("", val)
             if val:
                 st.last_cl = val
 
@@ -590,7 +786,7 @@ def parse_latest_id_only(line: str) -> Optional[int]:
             return int(m.group(1))
         except Exception:
             return None
-    m2 = re.search(r"^\s*(?:\*\s*)?(?:Remote\s*Session|Session\s*ID)\s*[:=\s]*\s*(\d+)\s*$", line, re.IGNORECASE)
+    m2 = SESSION_ID_ONLY_RE.search(line)
     if m2:
         try:
             return int(m2.group(1))
@@ -605,7 +801,7 @@ def parse_latest_state_only(line: str) -> Optional[int]:
             return int(m.group(1))
         except Exception:
             return None
-    m2 = re.search(r"^\s*(?:\*\s*)?\bState\s*[:=\s]*\s*(\d+)\s*$", line, re.IGNORECASE)
+    m2 = STATE_ONLY_RE.search(line)
     if m2:
         try:
             return int(m2.group(1))
@@ -624,14 +820,126 @@ class AssignedMinersSnapshot:
     miners: set[str]  # canonicalized addresses (lowercase)
     context: List[str]
 
-def scan_assigned_miners_from_lines(lines: List[str]) -> Optional[Tuple[set[str], int]]:
-    for idx, ln in enumerate(lines):
+# -------------------------
+# Detector Engine
+# -------------------------
+#
+# Every new line goes through ONE precompiled alternation of cheap markers.
+# Only the detectors whose marker hit run their exact regexes, and all
+# windowed checks (ping fails, USER mode) keep incremental counters on the
+# NodeState instead of rescanning the buffer. Cost per cycle is O(new lines).
+
+DETECTOR_MARKERS_RE = re.compile(
+    r"(?P<traceback>Traceback \(most recent call last\):)"
+    r"|(?P<pingfail>Pinging network\.\.\.)"
+    r"|(?P<node_pool_stale>Node Pool (?:Ephemeral|Reserved) Node Stale:)"
+    r"|(?P<assigned_miners>Assigned Miners:)"
+    r"|(?P<cognitive_level>(?i:Cognitive\s+Level|CL)\s*:)"
+    r"|(?P<session_state>(?i:Latest\s+(?:ID|State)|Remote\s*Session|Session\s*ID|\bState))"
+    r"|(?P<user_mode>USER)"
+)
+
+DETECTOR_NAMES = ("traceback", "pingfail", "node_pool_stale", "assigned_miners",
+                  "cognitive_level", "session_state", "user_mode")
+
+@dataclass
+class LineBatch:
+    """What one batch of new lines produced for a node (window state lives on NodeState)."""
+    traceback: Optional[int] = None                   # absolute line number of the first hit in batch
+    node_pool_stale: Optional[int] = None             # absolute line number of the first hit in batch
+    assigned: Optional[Tuple[set[str], int]] = None   # (miners, absolute line number) - first in batch
+    completed_session: Optional[int] = None           # max session id seen reaching State=6
+
+class DetectorEngine:
+    """
+    Single-pass line dispatcher. `feed(st, lines)` appends to st.buf, updates
+    st's incremental state and returns a LineBatch. With profile=True it also
+    accumulates CPU nanoseconds and hit counts per detector (plus 'dispatch'
+    for the marker scan itself) in `cpu_ns` / `hits`.
+    """
+    def __init__(self, profile: bool = False):
+        self.profile = profile
+        self.cpu_ns: Dict[str, int] = {name: 0 for name in ("dispatch",) + DETECTOR_NAMES}
+        self.hits: Dict[str, int] = {name: 0 for name in DETECTOR_NAMES}
+        self.lines = 0
+        self._handlers = {
+            "traceback": self._on_traceback,
+            "pingfail": self._on_pingfail,
+            "node_pool_stale": self._on_node_pool_stale,
+            "assigned_miners": self._on_assigned_miners,
+            "cognitive_level": self._on_cognitive_level,
+            "session_state": self._on_session_state,
+            "user_mode": self._on_user_mode,
+        }
+
+    def feed(self, st: "NodeState", lines: List[str], prime: bool = False) -> LineBatch:
+        batch = LineBatch()
+        clock = time.process_time_ns if self.profile else None
+        for ln in lines:
+            st.buf.append(ln)
+            st.line_no += 1
+            self.lines += 1
+            if clock:
+                t0 = clock()
+            hit = {m.lastgroup for m in DETECTOR_MARKERS_RE.finditer(ln)}
+            if clock:
+                self.cpu_ns["dispatch"] += clock() - t0
+            if not hit:
+                continue
+            for name in DETECTOR_NAMES:
+                if name not in hit:
+                    continue
+                self.hits[name] += 1
+                if clock:
+                    t0 = clock()
+                    self._handlers[name](st, ln, batch, prime)
+                    self.cpu_ns[name] += clock() - t0
+                else:
+                    self._handlers[name](st, ln, batch, prime)
+        return batch
+
+    # ---- handlers: one line each; windows are judged on NodeState ----
+
+    def _on_traceback(self, st, ln, batch, prime):
+        if not prime and batch.traceback is None:
+            batch.traceback = st.line_no
+
+    def _on_pingfail(self, st, ln, batch, prime):
+        if ln.strip().startswith(PING_FAIL_PATTERN):
+            st.ping_fail_lines.append(st.line_no)
+
+    def _on_node_pool_stale(self, st, ln, batch, prime):
+        if not prime and not batch.node_pool_stale and saw_node_pool_stale([ln]):
+            batch.node_pool_stale = st.line_no
+
+    def _on_assigned_miners(self, st, ln, batch, prime):
+        if prime or batch.assigned is not None:
+            return
         m = ASSIGNED_MINERS_RE.search(ln)
         if m:
-            # Extract addresses robustly from the remainder of the line
-            miners = extract_addresses(m.group(1))
-            return miners, idx
-    return None
+            batch.assigned = (extract_addresses(m.group(1)), st.line_no)
+
+    def _on_cognitive_level(self, st, ln, batch, prime):
+        maybe_update_cognitive_level(st, ln)
+
+    def _on_session_state(self, st, ln, batch, prime):
+        res = parse_session_state_from_line(ln)
+        if res:
+            st.last_session_id, st.last_state = res
+            if st.last_state == 6:
+                batch.completed_session = max(batch.completed_session or st.last_session_id, st.last_session_id)
+            return
+        sid_only = parse_latest_id_only(ln)
+        if sid_only is not None:
+            st.last_session_id = sid_only
+        st_only = parse_latest_state_only(ln)
+        if st_only is not None:
+            st.last_state = st_only
+            if st_only == 6 and st.last_session_id is not None:
+                batch.completed_session = max(batch.completed_session or st.last_session_id, st.last_session_id)
+
+    def _on_user_mode(self, st, ln, batch, prime):
+        st.last_user_line = st.line_no
 
 # -------------------------
 # Utilities
@@ -644,13 +952,6 @@ def clear_screen():
     except Exception:
         pass
 
-def line_idx_in_buf(buf: deque[str], pattern: re.Pattern) -> Optional[int]:
-    arr = list(buf)
-    for i in range(len(arr) - 1, -1, -1):
-        if pattern.search(arr[i]):
-            return i
-    return None
-
 def extract_context(buf: deque[str], idx: Optional[int], radius: int = 20) -> List[str]:
     if idx is None:
         return list(buf)[-radius:]
@@ -665,17 +966,130 @@ def _restart_if_enabled(restarter: RestartManager, st: NodeState, reason: str, f
         return
     restarter.attempt_restart(st.cfg.service, reason, evidence)
 
-def _consume_recent_pattern(buf: deque[str], startswith: str, window: int = 52):
-    if not buf:
-        return
-    recent = list(buf)
-    keep_prefix = recent[:-window] if window < len(recent) else []
-    tail = recent[-window:]
-    tail_filtered = [ln for ln in tail if not ln.strip().startswith(startswith)]
-    new_list = keep_prefix + tail_filtered
-    buf.clear()
-    for ln in new_list[-buf.maxlen:]:
-        buf.append(ln)
+# -------------------------
+# Restart Rules
+# -------------------------
+
+class RuleSet:
+    """
+    Turns each cycle's LineBatches into restart decisions. Holds the rule
+    thresholds and the cross-node Assigned Miners snapshot; `evaluate()`
+    returns True when cfg["nodes"] changed and config.json should be saved.
+    """
+    def __init__(self, cfg: dict, restarter: RestartManager):
+        self.cfg = cfg
+        self.restarter = restarter
+        self.flags = cfg.get("restart_flags", {})
+        self.pingfail_threshold = int(cfg.get("pingfail_threshold", 2))
+        self.pingfail_window = int(cfg.get("pingfail_window", 52))
+        self.traceback_grace = int(cfg.get("traceback_recovery_seconds", 240))
+        self.assigned_snapshot: Optional[AssignedMinersSnapshot] = None
+        self.assigned_trigger: Optional[Tuple[int, int]] = None  # (node index, line number)
+
+    def restart(self, st: NodeState, reason: str, evidence: List[str],
+                trigger: Optional[Tuple[int, int]]) -> None:
+        """`trigger` is the (node index, line number) that caused it; used by replay_bench.py."""
+        _restart_if_enabled(self.restarter, st, reason, self.flags, evidence)
+
+    def evaluate(self, now: datetime, states: Dict[int, NodeState], batches: Dict[int, LineBatch]) -> bool:
+        dirty = False
+
+        # Wrong User State snapshot
+        src_idx_found = None
+        miners_found: Optional[set[str]] = None
+        line_no = None
+        for idx, batch in batches.items():
+            if batch.assigned:
+                miners_found, line_no = batch.assigned
+                src_idx_found = idx
+                break
+
+        if miners_found is not None and src_idx_found is not None:
+            src_state = states[src_idx_found]
+            ctx = extract_context(src_state.buf, src_state.buf_index(line_no), radius=20)
+            self.assigned_snapshot = AssignedMinersSnapshot(
+                at=now,
+                source_service=src_state.cfg.service,
+                miners=miners_found,  # canonicalized
+                context=ctx
+            )
+            self.assigned_trigger = (src_idx_found, line_no)
+            print(f"[ASSIGN] Snapshot from {src_state.cfg.service} at {self.assigned_snapshot.at.isoformat()} "
+                  f"miners={sorted(list(self.assigned_snapshot.miners))}")
+
+        # Apply wrong_user_state rule (flag default False per your config)
+        if self.assigned_snapshot and self.flags.get("wrong_user_state", False):
+            for idx, st in states.items():
+                if st.is_user_mode_recent():
+                    in_list = st.cfg.address in self.assigned_snapshot.miners
+                    snapshot_ts = self.assigned_snapshot.at
+                    if in_list and (st.last_assignment_snapshot_at != snapshot_ts):
+                        ev = []
+                        ev.append(f"Assigned Miners snapshot @ {self.assigned_snapshot.at.isoformat()} from {self.assigned_snapshot.source_service}")
+                        ev.extend(self.assigned_snapshot.context or [])
+                        ev.append("")
+                        ev.append(f"USER-mode detected in recent logs of {st.cfg.service}")
+                        self.restart(st, "wrong_user_state", ev, self.assigned_trigger)
+                        st.last_assignment_snapshot_at = snapshot_ts
+
+        # Error scans
+        for idx, st in states.items():
+            batch = batches[idx]
+
+            # Traceback immediate
+            if batch.traceback:
+                st.traceback_last_seen = now
+                if st.traceback_first_detected is None:
+                    st.traceback_first_detected = now
+
+                if self.flags.get("traceback", False):
+                    evidence = list(st.buf)[-50:]
+                    evidence.append(f"[meta] immediate traceback at {now.isoformat()}")
+                    self.restart(st, "traceback", evidence, (idx, batch.traceback))
+                    st.traceback_first_detected = None
+                    st.traceback_last_seen = None
+
+            # Traceback unrecovered
+            if self.flags.get("traceback_unrecovered", True) and st.traceback_first_detected:
+                elapsed = (now - st.traceback_first_detected).total_seconds()
+                recent_tracebacks = (st.traceback_last_seen is not None) and \
+                                    ((now - st.traceback_last_seen).total_seconds() <= self.traceback_grace)
+                if elapsed >= self.traceback_grace and recent_tracebacks:
+                    evidence = list(st.buf)[-100:]
+                    evidence.append(f"[meta] unrecovered traceback; first={st.traceback_first_detected.isoformat()} "
+                                    f"last={st.traceback_last_seen.isoformat()} window={self.traceback_grace}s")
+                    self.restart(st, "traceback_unrecovered", evidence, None)  # time-based, no single line
+                    st.traceback_first_detected = None
+                    st.traceback_last_seen = None
+
+            # Ping fail
+            if self.flags.get("pingfail", True) and st.ping_fail_count(self.pingfail_window) >= self.pingfail_threshold:
+                evidence = list(st.buf)[-self.pingfail_window:]
+                self.restart(st, "pingfail", evidence, (idx, st.ping_fail_lines[-1]))
+                st.ping_fail_lines.clear()  # consumed: the same fails must not trigger again
+
+            # Node pool stale
+            if batch.node_pool_stale and self.flags.get("node_pool_stale", True):
+                evidence = list(st.buf)[-50:]
+                self.restart(st, "node_pool_stale", evidence, (idx, batch.node_pool_stale))
+
+        # Update "last_selected_task" persistence when selected in State 3/4
+        if self.assigned_snapshot:
+            for idx, st in states.items():
+                if st.last_session_id is not None and st.last_state in (3, 4):
+                    selected = st.cfg.address in self.assigned_snapshot.miners
+                    if selected:
+                        # Only update if changed
+                        if st.cfg.last_selected_task != st.last_session_id:
+                            st.cfg.last_selected_task = st.last_session_id
+                            # reflect into cfg["nodes"] and mark dirty
+                            for n in self.cfg["nodes"]:
+                                if n.get("index") == st.cfg.index:
+                                    n["last_selected_task"] = st.cfg.last_selected_task
+                                    break
+                            dirty = True
+
+        return dirty
 
 # -------------------------
 # Main Orchestration
@@ -705,12 +1119,9 @@ def main():
     save_config(CONFIG_PATH, cfg)
 
     tail_lines = int(cfg.get("tail_lines", 200))
-    pingfail_threshold = int(cfg.get("pingfail_threshold", 2))
-    pingfail_window = int(cfg.get("pingfail_window", 52))
-    traceback_grace = int(cfg.get("traceback_recovery_seconds", 240))
     cooldown_minutes = int(cfg.get("cooldown_minutes", 2))
     interval = float(cfg.get("check_interval_seconds", 30.0))
-    flags = cfg.get("restart_flags", {})
+    poll_interval = float(cfg.get("poll_interval_seconds", 0.5))
     dry_run = bool(cfg.get("restart_dry_run", False))
 
     # systemctl/sudo integration
@@ -733,27 +1144,14 @@ def main():
             )
         )
 
+    watch = InotifyWatch.create()
+    engine = DetectorEngine()
     states: Dict[int, NodeState] = {}
     for nd in nodes_cfg:
-        tailer = FileTailer(nd.log_path, init_tail_lines=tail_lines)
+        tailer = FileTailer(nd.log_path, init_tail_lines=tail_lines, watch=watch)
         st = NodeState(cfg=nd, tailer=tailer, buf=deque(maxlen=tail_lines))
-        primed = tailer.prime_tail()
-        for ln in primed:
-            st.buf.append(ln)
-            maybe_update_cognitive_level(st, ln)
-            # initialize session/state from primed lines
-            res = parse_session_state_from_line(ln)
-            if res:
-                sid, state = res
-                st.last_session_id = sid
-                st.last_state = state
-            else:
-                sid_only = parse_latest_id_only(ln)
-                if sid_only is not None:
-                    st.last_session_id = sid_only
-                st_only = parse_latest_state_only(ln)
-                if st_only is not None:
-                    st.last_state = st_only
+        # primed lines only seed display/window state; they never trigger restarts
+        engine.feed(st, tailer.prime_tail(), prime=True)
         states[nd.index] = st
 
     restarter = RestartManager(
@@ -763,9 +1161,14 @@ def main():
         sudo_path=sudo_path,
         sudo_non_interactive=sudo_non_interactive,
         systemctl_path=systemctl_path,
+        workers=int(cfg.get("restart_workers", 4)),
+        timeout_seconds=float(cfg.get("restart_timeout_seconds", 60)),
+        # optional per-node override: "cooldown_minutes" on an entry in cfg["nodes"]
+        node_cooldown_minutes={n["service"]: float(n["cooldown_minutes"]) for n in cfg["nodes"]
+                               if n.get("cooldown_minutes") is not None and n.get("service")},
     )
 
-    assigned_snapshot: Optional[AssignedMinersSnapshot] = None
+    rules = RuleSet(cfg, restarter)
     last_complete_session: Optional[int] = None
 
     # After priming, compute last_complete_session if any state==6
@@ -785,9 +1188,17 @@ def main():
         except Exception:
             pass
 
-    # Main loop
+    # Main loop: one loop multiplexes every node. It sleeps on the shared inotify
+    # fd (or polls every poll_interval without inotify), runs detectors as soon
+    # as lines arrive, and only redraws the status table every `interval`.
     config_dirty = False  # write config.json only when needed
+    next_render = 0.0
     while running:
+        wait_s = max(0.0, min(next_render - time.monotonic(), 1.0))
+        if watch is not None:
+            watch.wait(wait_s)
+        elif wait_s > 0:
+            time.sleep(min(wait_s, poll_interval))
         now = datetime.now(timezone.utc)
 
         # --- Daily version re-check ---
@@ -801,134 +1212,17 @@ def main():
                 version_status = f"please update ({rt})"
             last_version_check = now
 
-        # Read new lines and update buffers
-        new_lines_by_idx: Dict[int, List[str]] = {}
+        # Read new lines and update buffers (with inotify, only files that changed are touched)
+        batches: Dict[int, LineBatch] = {}
         for idx, st in states.items():
-            new_lines = st.tailer.read_new_lines()
-            if new_lines:
-                for ln in new_lines:
-                    st.buf.append(ln)
-                    maybe_update_cognitive_level(st, ln)
-
-                    # Combined parse first
-                    res = parse_session_state_from_line(ln)
-                    if res:
-                        sid, state = res
-                        st.last_session_id = sid
-                        st.last_state = state
-                        if state == 6 and sid is not None:
-                            last_complete_session = sid if last_complete_session is None else max(last_complete_session, sid)
-                        continue
-
-                    # If not combined, try split (ID only / State only)
-                    sid_only = parse_latest_id_only(ln)
-                    if sid_only is not None:
-                        st.last_session_id = sid_only
-
-                    st_only = parse_latest_state_only(ln)
-                    if st_only is not None:
-                        st.last_state = st_only
-                        if st_only == 6 and st.last_session_id is not None:
-                            last_complete_session = st.last_session_id if last_complete_session is None else max(last_complete_session, st.last_session_id)
-
-            new_lines_by_idx[idx] = new_lines
+            batch = engine.feed(st, st.tailer.read_new_lines())
+            if batch.completed_session is not None:
+                sid = batch.completed_session
+                last_complete_session = sid if last_complete_session is None else max(last_complete_session, sid)
+            batches[idx] = batch
 
-        # Wrong User State snapshot
-        src_idx_found = None
-        miners_found: Optional[set[str]] = None
-        line_idx = None
-        for idx, lines in new_lines_by_idx.items():
-            if not lines:
-                continue
-            res = scan_assigned_miners_from_lines(lines)
-            if res:
-                miners_found, line_idx = res
-                src_idx_found = idx
-                break
-
-        if miners_found is not None and src_idx_found is not None:
-            src_state = states[src_idx_found]
-            ctx = extract_context(src_state.buf, line_idx_in_buf(src_state.buf, ASSIGNED_MINERS_RE), radius=20)
-            assigned_snapshot = AssignedMinersSnapshot(
-                at=now,
-                source_service=src_state.cfg.service,
-                miners=miners_found,  # canonicalized
-                context=ctx
-            )
-            print(f"[ASSIGN] Snapshot from {src_state.cfg.service} at {assigned_snapshot.at.isoformat()} "
-                  f"miners={sorted(list(assigned_snapshot.miners))}")
-
-        # Apply wrong_user_state rule (flag default False per your config)
-        if assigned_snapshot and flags.get("wrong_user_state", False):
-            for idx, st in states.items():
-                if st.is_user_mode_recent():
-                    in_list = st.cfg.address in assigned_snapshot.miners
-                    snapshot_ts = assigned_snapshot.at
-                    if in_list and (st.last_assignment_snapshot_at != snapshot_ts):
-                        ev = []
-                        ev.append(f"Assigned Miners snapshot @ {assigned_snapshot.at.isoformat()} from {assigned_snapshot.source_service}")
-                        ev.extend(assigned_snapshot.context or [])
-                        ev.append("")
-                        ev.append(f"USER-mode detected in recent logs of {st.cfg.service}")
-                        _restart_if_enabled(restarter, st, "wrong_user_state", flags, ev)
-                        st.last_assignment_snapshot_at = snapshot_ts
-
-        # Error scans
-        for idx, st in states.items():
-            lines = new_lines_by_idx[idx]
-
-            # Traceback immediate
-            if lines and saw_traceback(lines):
-                st.traceback_last_seen = now
-                if st.traceback_first_detected is None:
-                    st.traceback_first_detected = now
-
-                if flags.get("traceback", False):
-                    evidence = list(st.buf)[-50:]
-                    evidence.append(f"[meta] immediate traceback at {now.isoformat()}")
-                    _restart_if_enabled(restarter, st, "traceback", flags, evidence)
-                    st.traceback_first_detected = None
-                    st.traceback_last_seen = None
-
-            # Traceback unrecovered
-            if flags.get("traceback_unrecovered", True) and st.traceback_first_detected:
-                elapsed = (now - st.traceback_first_detected).total_seconds()
-                recent_tracebacks = (st.traceback_last_seen is not None) and \
-                                    ((now - st.traceback_last_seen).total_seconds() <= traceback_grace)
-                if elapsed >= traceback_grace and recent_tracebacks:
-                    evidence = list(st.buf)[-100:]
-                    evidence.append(f"[meta] unrecovered traceback; first={st.traceback_first_detected.isoformat()} "
-                                    f"last={st.traceback_last_seen.isoformat()} window={traceback_grace}s")
-                    _restart_if_enabled(restarter, st, "traceback_unrecovered", flags, evidence)
-                    st.traceback_first_detected = None
-                    st.traceback_last_seen = None
-
-            # Ping fail
-            if flags.get("pingfail", True) and saw_ping_fail(st.buf, pingfail_threshold, pingfail_window):
-                evidence = list(st.buf)[-pingfail_window:]
-                _restart_if_enabled(restarter, st, "pingfail", flags, evidence)
-                _consume_recent_pattern(st.buf, PING_FAIL_PATTERN)
-
-            # Node pool stale
-            if lines and flags.get("node_pool_stale", True) and saw_node_pool_stale(lines):
-                evidence = list(st.buf)[-50:]
-                _restart_if_enabled(restarter, st, "node_pool_stale", flags, evidence)
-
-        # Update "last_selected_task" persistence when selected in State 3/4
-        if assigned_snapshot:
-            for idx, st in states.items():
-                if st.last_session_id is not None and st.last_state in (3, 4):
-                    selected = st.cfg.address in assigned_snapshot.miners
-                    if selected:
-                        # Only update if changed
-                        if st.cfg.last_selected_task != st.last_session_id:
-                            st.cfg.last_selected_task = st.last_session_id
-                            # reflect into cfg["nodes"] and mark dirty
-                            for n in cfg["nodes"]:
-                                if n.get("index") == st.cfg.index:
-                                    n["last_selected_task"] = st.cfg.last_selected_task
-                                    break
-                            config_dirty = True
+        if rules.evaluate(now, states, batches):
+            config_dirty = True
 
         # Persist config if modified
         if config_dirty:
@@ -936,6 +1230,9 @@ def main():
             config_dirty = False
 
         # Render status
+        if time.monotonic() < next_render:
+            continue
+        next_render = time.monotonic() + interval
         clear_screen()
         lcs = last_complete_session if last_complete_session is not None else "-"
         print(
@@ -944,9 +1241,11 @@ def main():
             f"| last_complete_session={lcs} | dry_run={dry_run} ==="
         )
         print("Flags: " + ", ".join(f"{k}={'on' if v else 'off'}" for k, v in cfg.get("restart_flags", {}).items()))
+        assigned_snapshot = rules.assigned_snapshot
         if assigned_snapshot:
             ago = int((now - assigned_snapshot.at).total_seconds())
             print(f"[ASSIGN] last from {assigned_snapshot.source_service} {ago}s ago; miners={len(assigned_snapshot.miners)}")
+        restarting = restarter.in_flight()
         for idx in sorted(states):
             st = states[idx]
             # Build session/state display like "11090/State=3 Selected" or "... Not Selected"
@@ -969,10 +1268,12 @@ def main():
             lts = st.cfg.last_selected_task if st.cfg.last_selected_task is not None else "-"
             addr_disp = short_addr(st.cfg.address)
 
-            print(f"[{st.cfg.service}] addr={addr_disp} | {sess_disp} | CL:{cl} | last_task={lts} | last_restart={lr}")
-
-        time.sleep(interval)
+            busy = " (restarting)" if st.cfg.service in restarting else ""
+            print(f"[{st.cfg.service}] addr={addr_disp} | {sess_disp} | CL:{cl} | last_task={lts} | last_restart={lr}{busy}")
 
+    restarter.shutdown(wait=True)
+    if watch is not None:
+        watch.close()
     print("[INFO] Exited cleanly.")
 
 # -------------------------
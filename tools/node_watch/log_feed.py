@@ -4,43 +4,493 @@ log_feed.py
 
 Provides LogFeed class to subscribe to Docker container logs in-memory,
 rather than re-reading files each interval. Buffers the last N lines per container.
+
+Feeds share one DockerLogMux: a single background thread that talks to the
+Docker Engine API over its socket and follows every container's log stream
+(plus one `docker events` subscription) from one selector loop. Frames are
+demultiplexed into per-container ring buffers, reconnects resume with `since`
+so no lines are lost or repeated, and streams are attached as soon as a
+container (re)starts and dropped when it is removed.
 """
+import os
+import re
+import json
+import time
+import ssl
+import socket
+import calendar
+import selectors
 import threading
 from collections import deque
-import docker
-import time
+from urllib.parse import urlencode, quote
 
-class LogFeed:
-    def __init__(self, container_name, tail_lines=60):
-        self.container_name = container_name
+DEFAULT_DOCKER_SOCKET = '/var/run/docker.sock'
+_TS_RE = re.compile(rb'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d{1,9}))?Z ')
+
+
+def docker_address(base_url=None):
+    """
+    (family, address) for base_url / DOCKER_HOST: unix://PATH, tcp://HOST:PORT
+    (http:// and https:// too) or a bare socket path. Other schemes (ssh://,
+    npipe://) raise ValueError rather than being mistaken for a socket path.
+    """
+    url = base_url or os.environ.get('DOCKER_HOST') or f'unix://{DEFAULT_DOCKER_SOCKET}'
+    if url.startswith('unix://'):
+        return socket.AF_UNIX, url[len('unix://'):]
+    for scheme in ('tcp://', 'http://', 'https://'):
+        if url.startswith(scheme):
+            host, _, port = url[len(scheme):].rstrip('/').rpartition(':')
+            if not host or not port.isdigit():
+                raise ValueError(f"Docker host {url!r}: expected {scheme}HOST:PORT")
+            return socket.AF_INET, (host.strip('[]'), int(port))
+    if '://' in url:
+        raise ValueError(f"Docker host {url!r}: unsupported scheme (use unix:// or tcp://; "
+                         f"forward an ssh:// daemon's socket locally first)")
+    return socket.AF_UNIX, url
+
+
+def docker_tls_context(base_url=None, env=None):
+    """
+    SSLContext for a TLS-protected daemon, following docker.from_env(): TLS is
+    on for tcp:// when DOCKER_TLS_VERIFY or DOCKER_CERT_PATH is set (and for
+    https://); certificates come from DOCKER_CERT_PATH (default ~/.docker).
+    None means plain HTTP.
+    """
+    env = os.environ if env is None else env
+    url = base_url or env.get('DOCKER_HOST') or ''
+    if '://' not in url or url.startswith('unix://'):
+        return None
+    verify = env.get('DOCKER_TLS_VERIFY', '') != ''
+    cert_dir = env.get('DOCKER_CERT_PATH') or ''
+    if not (verify or cert_dir or url.startswith('https://')):
+        return None
+    cert_dir = cert_dir or os.path.join(os.path.expanduser('~'), '.docker')
+    ca, cert, key = (os.path.join(cert_dir, f) for f in ('ca.pem', 'cert.pem', 'key.pem'))
+    if verify:
+        if not os.path.exists(ca):
+            raise ValueError(f"DOCKER_TLS_VERIFY is set but {ca} does not exist")
+        ctx = ssl.create_default_context(cafile=ca)
+    else:
+        ctx = ssl.create_default_context()
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    if os.path.exists(cert) and os.path.exists(key):
+        ctx.load_cert_chain(cert, key)
+    return ctx
+
+
+def parse_ts_ns(line):
+    """Split a `timestamps=1` log line into (unix ns, rest); (None, line) if it carries no timestamp."""
+    m = _TS_RE.match(line)
+    if not m:
+        return None, line
+    secs = calendar.timegm(time.strptime(m.group(1).decode(), '%Y-%m-%dT%H:%M:%S'))
+    frac = (m.group(2) or b'').decode().ljust(9, '0')
+    return secs * 1_000_000_000 + int(frac), line[m.end():]
+
+
+def ns_to_since(ns):
+    return f"{ns // 1_000_000_000}.{ns % 1_000_000_000:09d}"
+
+
+class _HttpResponse:
+    """Incremental HTTP/1.1 response parser: status + headers, then (de-chunked) body bytes."""
+
+    def __init__(self):
+        self._buf = b''
+        self.status = None
+        self.headers = {}
+        self.done = False
+        self._chunked = False
+        self._chunk_left = 0
+        self._need_crlf = False
+
+    def feed(self, data):
+        """Return the body bytes contained in `data`."""
+        self._buf += data
+        if self.status is None:
+            head, sep, rest = self._buf.partition(b'\r\n\r\n')
+            if not sep:
+                return b''
+            lines = head.decode('latin-1').split('\r\n')
+            self.status = int(lines[0].split()[1])
+            for ln in lines[1:]:
+                k, _, v = ln.partition(':')
+                self.headers[k.strip().lower()] = v.strip()
+            self._chunked = 'chunked' in self.headers.get('transfer-encoding', '').lower()
+            self._buf = rest
+        if not self._chunked:
+            out, self._buf = self._buf, b''
+            return out
+        out = []
+        while not self.done:
+            if self._chunk_left:
+                if not self._buf:
+                    break
+                take = self._buf[:self._chunk_left]
+                self._buf = self._buf[len(take):]
+                self._chunk_left -= len(take)
+                out.append(take)
+                if self._chunk_left:
+                    break
+                self._need_crlf = True
+            if self._need_crlf:
+                if len(self._buf) < 2:
+                    break
+                self._buf = self._buf[2:]
+                self._need_crlf = False
+            size_line, sep, rest = self._buf.partition(b'\r\n')
+            if not sep:
+                break
+            self._buf = rest
+            size = int(size_line.split(b';')[0], 16)
+            if size == 0:
+                self.done = True
+            self._chunk_left = size
+        return b''.join(out)
+
+
+class _LogStream:
+    """One `GET /containers/{name}/logs?follow=1` response: frames -> complete lines."""
+    MAX_LINE = 64 * 1024  # longer lines are cut so one runaway line can't grow memory
+
+    def __init__(self, sock, resume_ns):
+        self.sock = sock
+        self.resume_ns = resume_ns  # lines at or before this were already buffered
+        self.http = _HttpResponse()
+        self._multiplexed = None
+        self._frames = b''
+        self._partial = b''
+
+    def feed(self, data):
+        body = self.http.feed(data)
+        if not body or self.http.status != 200:
+            return []
+        if self._multiplexed is None:
+            ctype = self.http.headers.get('content-type', '')
+            if 'multiplexed' in ctype:
+                self._multiplexed = True
+            elif 'raw-stream' in ctype:
+                self._multiplexed = False
+        if self._multiplexed is False:
+            return self._split(body)
+        # multiplexed (non-TTY) stream: 8-byte header [stream, 0, 0, 0, size32be] + payload
+        self._frames += body
+        if self._multiplexed is None:
+            if len(self._frames) < 8:
+                return []
+            self._multiplexed = self._frames[0] in (0, 1, 2) and self._frames[1:4] == b'\0\0\0'
+            if not self._multiplexed:
+                body, self._frames = self._frames, b''
+                return self._split(body)
+        out = []
+        while len(self._frames) >= 8:
+            size = int.from_bytes(self._frames[4:8], 'big')
+            if len(self._frames) < 8 + size:
+                break
+            out.extend(self._split(self._frames[8:8 + size]))
+            self._frames = self._frames[8 + size:]
+        return out
+
+    def _split(self, payload):
+        parts = (self._partial + payload).split(b'\n')
+        self._partial = parts.pop()[:self.MAX_LINE]
+        return [p[:self.MAX_LINE] for p in parts]
+
+
+class _EventStream:
+    """`GET /events` response: one JSON object per line."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.http = _HttpResponse()
+        self._partial = b''
+
+    def feed(self, data):
+        body = self.http.feed(data)
+        if not body or self.http.status != 200:
+            return []
+        parts = (self._partial + body).split(b'\n')
+        self._partial = parts.pop()
+        events = []
+        for p in parts:
+            try:
+                events.append(json.loads(p))
+            except ValueError:
+                pass
+        return events
+
+
+class _Feed:
+    def __init__(self, name, tail_lines):
+        self.name = name
         self.tail_lines = tail_lines
-        self.docker_client = docker.from_env()
         self.buffer = deque(maxlen=tail_lines)
+        self.last_ns = None       # timestamp of the newest buffered line, for `since`
+        self.stream = None
+        self.retry_at = 0.0
+
+
+class DockerLogMux:
+    """
+    Follows the logs of many containers from one thread.
+
+    add()/remove()/get_lines() are safe to call from any thread. `base_url`
+    (or DOCKER_HOST) selects the API endpoint, e.g. unix:///tmp/fake.sock;
+    DOCKER_TLS_VERIFY / DOCKER_CERT_PATH switch tcp:// to TLS.
+    """
+    RETRY_SECONDS = 5.0
+    CONNECT_TIMEOUT = 5.0
+    EVENT_FILTERS = {'type': ['container'], 'event': ['start', 'destroy', 'rename']}
+
+    def __init__(self, base_url=None, tail_lines=60):
+        self.family, self.address = docker_address(base_url)
+        self.tls = docker_tls_context(base_url)
+        self.tail_lines = tail_lines
+        self._feeds = {}
+        self._lock = threading.Lock()
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._sel.register(self._wake_r, selectors.EVENT_READ, None)
+        self._events = None
+        self._events_since = None
+        self._events_retry_at = 0.0
         self._stop_event = threading.Event()
-        self._thread = threading.Thread(target=self._stream_logs, daemon=True)
+        self._thread = None
+
+    # ---- public API ----
 
     def start(self):
-        """Begin background thread streaming logs into buffer."""
-        self._stop_event.clear()
-        self._thread.start()
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='docker-log-mux', daemon=True)
+            self._thread.start()
 
     def stop(self):
-        """Signal the background thread to stop."""
         self._stop_event.set()
-        self._thread.join()
+        self._wake()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for feed in list(self._feeds.values()):
+            self._close_stream(feed)
+        if self._events is not None:
+            self._close(self._events.sock)
+            self._events = None
+        self._sel.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
+    def add(self, name, tail_lines=None):
+        with self._lock:
+            if name not in self._feeds:
+                self._feeds[name] = _Feed(name, tail_lines or self.tail_lines)
+        self._wake()
+
+    def remove(self, name):
+        with self._lock:
+            feed = self._feeds.pop(name, None)
+        if feed is not None:
+            feed.retry_at = float('inf')
+            self._wake()
+
+    def get_lines(self, name):
+        feed = self._feeds.get(name)
+        return list(feed.buffer) if feed is not None else []
+
+    def containers(self):
+        with self._lock:
+            return list(self._feeds)
 
-    def _stream_logs(self):
+    # ---- loop ----
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass
+
+    def _run(self):
         while not self._stop_event.is_set():
-            try:
-                container = self.docker_client.containers.get(self.container_name)
-                for raw in container.logs(stream=True, tail=self.tail_lines, timestamps=False):
-                    if self._stop_event.is_set():
-                        break
-                    line = raw.decode('utf-8', errors='ignore').rstrip()
-                    self.buffer.append(line)
-            except Exception:
-                time.sleep(5)
+            now = time.monotonic()
+            with self._lock:
+                feeds = list(self._feeds.values())
+                wanted = set(self._feeds)
+            # streams of removed containers are closed here, on the loop thread
+            for key in list(self._sel.get_map().values()):
+                st = key.data
+                if isinstance(st, tuple) and st[0].name not in wanted:
+                    self._close_stream(st[0])
+            next_at = now + 1.0
+            for feed in feeds:
+                if feed.stream is None:
+                    if now >= feed.retry_at:
+                        self._open_logs(feed)
+                    else:
+                        next_at = min(next_at, feed.retry_at)
+            if self._events is None:
+                if now >= self._events_retry_at:
+                    self._open_events()
+                else:
+                    next_at = min(next_at, self._events_retry_at)
+
+            for key, _ in self._sel.select(max(0.0, next_at - time.monotonic())):
+                if key.data is None:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except (BlockingIOError, InterruptedError):
+                        pass
+                elif key.data == 'events':
+                    self._read_events()
+                else:
+                    self._read_logs(key.data[0])
+
+    def _connect(self, path):
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.CONNECT_TIMEOUT)
+            sock.connect(self.address)
+            if self.tls is not None:
+                sock = self.tls.wrap_socket(sock, server_hostname=self.address[0])  # handshake while blocking
+            sock.sendall(f"GET {path} HTTP/1.1\r\nHost: docker\r\nUser-Agent: node_watch\r\n\r\n".encode())
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    @staticmethod
+    def _recv(sock):
+        """recv() that also drains bytes TLS has already decrypted; select() won't report those."""
+        data = sock.recv(65536)
+        while data and isinstance(sock, ssl.SSLSocket) and sock.pending():
+            data += sock.recv(sock.pending())
+        return data
+
+    def _close(self, sock):
+        try:
+            self._sel.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
+
+    def _close_stream(self, feed):
+        if feed.stream is not None:
+            self._close(feed.stream.sock)
+            feed.stream = None
+
+    def _open_logs(self, feed):
+        q = {'follow': 1, 'stdout': 1, 'stderr': 1, 'timestamps': 1}
+        if feed.last_ns is None:
+            q['tail'] = feed.tail_lines
+        else:
+            q['since'] = ns_to_since(feed.last_ns)
+        try:
+            sock = self._connect(f"/containers/{quote(feed.name)}/logs?{urlencode(q)}")
+        except OSError:
+            feed.retry_at = time.monotonic() + self.RETRY_SECONDS
+            return
+        feed.stream = _LogStream(sock, feed.last_ns)
+        self._sel.register(sock, selectors.EVENT_READ, (feed,))
+
+    def _read_logs(self, feed):
+        stream = feed.stream
+        if stream is None:
+            return
+        try:
+            data = self._recv(stream.sock)
+        except (BlockingIOError, InterruptedError, ssl.SSLWantReadError):
+            return
+        except OSError:
+            data = b''
+        lines = stream.feed(data)
+        ok = stream.http.status in (None, 200)
+        # an error response (404 no such container, 500 ...) carries a JSON
+        # message body, not log output: never buffer it
+        for raw in lines if ok else ():
+            ts, text = parse_ts_ns(raw)
+            if ts is not None:
+                if stream.resume_ns is not None and ts <= stream.resume_ns:
+                    continue  # `since` is inclusive: already buffered before the reconnect
+                feed.last_ns = ts if feed.last_ns is None else max(feed.last_ns, ts)
+            feed.buffer.append(text.decode('utf-8', errors='ignore').rstrip())
+        if not data or stream.http.done or not ok:
+            # container stopped, missing (404) or connection dropped; a start event
+            # reconnects immediately, otherwise retry like the old per-container thread
+            self._close_stream(feed)
+            feed.retry_at = time.monotonic() + self.RETRY_SECONDS
+
+    def _open_events(self):
+        q = {'filters': json.dumps(self.EVENT_FILTERS)}
+        if self._events_since is not None:
+            q['since'] = ns_to_since(self._events_since)
+        try:
+            sock = self._connect(f"/events?{urlencode(q)}")
+        except OSError:
+            self._events_retry_at = time.monotonic() + self.RETRY_SECONDS
+            return
+        self._events = _EventStream(sock)
+        self._sel.register(sock, selectors.EVENT_READ, 'events')
+
+    def _read_events(self):
+        ev_stream = self._events
+        try:
+            data = self._recv(ev_stream.sock)
+        except (BlockingIOError, InterruptedError, ssl.SSLWantReadError):
+            return
+        except OSError:
+            data = b''
+        for ev in ev_stream.feed(data):
+            if ev.get('timeNano'):
+                self._events_since = int(ev['timeNano']) + 1
+            name = (ev.get('Actor') or {}).get('Attributes', {}).get('name')
+            with self._lock:
+                feed = self._feeds.get(name)
+            if feed is None:
+                continue
+            action = ev.get('Action') or ev.get('status')
+            if action in ('start', 'rename'):
+                if feed.stream is None:
+                    feed.retry_at = 0.0
+            elif action == 'destroy':
+                # container is gone: drop its stream and lines; a recreated
+                # container with the same name starts from a fresh tail
+                self._close_stream(feed)
+                feed.buffer.clear()
+                feed.last_ns = None
+                feed.retry_at = time.monotonic() + self.RETRY_SECONDS
+        if not data or ev_stream.http.done or (ev_stream.http.status not in (None, 200)):
+            self._close(ev_stream.sock)
+            self._events = None
+            self._events_retry_at = time.monotonic() + self.RETRY_SECONDS
+
+
+class LogFeed:
+    """
+    Per-container view kept for existing callers. Pass a shared DockerLogMux
+    so all containers are followed from one thread; without one, the feed
+    gets a private mux.
+    """
+
+    def __init__(self, container_name, tail_lines=60, mux=None):
+        self.container_name = container_name
+        self.tail_lines = tail_lines
+        self._own_mux = mux is None
+        self.mux = mux or DockerLogMux(tail_lines=tail_lines)
+
+    def start(self):
+        """Begin following the container's logs into its buffer."""
+        self.mux.add(self.container_name, self.tail_lines)
+        self.mux.start()
+
+    def stop(self):
+        """Stop following; a private mux is shut down as well."""
+        self.mux.remove(self.container_name)
+        if self._own_mux:
+            self.mux.stop()
 
     def get_lines(self):
         """Return a list copy of the buffered log lines."""
-        return list(self.buffer)
\ No newline at end of file
+        return self.mux.get_lines(self.container_name)
@@ -14,7 +14,7 @@ import docker
 import requests
 
 from config_migrate import migrate_config
-from log_feed import LogFeed
+from log_feed import DockerLogMux, LogFeed
 from tx_check import LOG_STATE_RE, TxChecker, rpc_get_receipt
 from error_scan import saw_ping_fail, saw_traceback, saw_node_pool_stale
 from restarter import RestartManager
@@ -43,8 +43,9 @@ def main():
     rpc_url = cfg['rpc_url']
     tail = int(cfg['tail_lines'])
 
-    # Initialize log feeds
-    feeds = {cid: LogFeed(cid, tail_lines=tail) for cid in containers}
+    # Initialize log feeds (one shared Docker API reader for all containers)
+    log_mux = DockerLogMux(tail_lines=tail)
+    feeds = {cid: LogFeed(cid, tail_lines=tail, mux=log_mux) for cid in containers}
     for f in feeds.values():
         f.start()
 
@@ -371,6 +372,7 @@ def main():
     finally:
         for f in feeds.values():
             f.stop()
+        log_mux.stop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,344 @@
+import json
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import struct
+import sys
+import threading
+import time
+from urllib.parse import parse_qsl, unquote, urlparse
+
+import pytest
+
+THIS_DIR = os.path.dirname(__file__)
+TOOL_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
+if TOOL_DIR not in sys.path:
+    sys.path.insert(0, TOOL_DIR)
+
+import log_feed  # noqa: E402
+from log_feed import DockerLogMux, LogFeed, docker_address, docker_tls_context, parse_ts_ns  # noqa: E402
+
+
+class FakeDockerAPI:
+    """
+    Minimal Docker Engine API on a unix socket (or TLS on 127.0.0.1 when
+    `tls` is a server SSLContext): /containers/{name}/logs (follow, tail,
+    inclusive since, multiplexed or TTY raw frames) and /events. Responses
+    are sent in 7-byte pieces so frames and chunks arrive split.
+    """
+
+    def __init__(self, path, tty=False, chunked=True, tls=None):
+        self.path = path
+        self.tls = tls
+        self.tty = tty
+        self.chunked = chunked
+        self.logs = {}        # name -> [(ns, stream, text)]
+        self.running = {}
+        self.errors = {}      # name -> HTTP status returned instead of logs
+        self.events = []
+        self.requests = []
+        self.open_logs = 0    # log responses still streaming
+        self.cond = threading.Condition()
+        self.closed = False
+        if tls is None:
+            self.srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.srv.bind(path)
+        else:
+            self.srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.srv.bind(("127.0.0.1", 0))
+            self.path = "tcp://127.0.0.1:%d" % self.srv.getsockname()[1]
+        self.srv.listen(16)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.srv.close()
+
+    def create(self, name):
+        with self.cond:
+            self.logs[name] = []
+            self.running[name] = True
+            self.cond.notify_all()
+
+    def log(self, name, text, stream=1, ns=None):
+        with self.cond:
+            self.logs[name].append((ns or time.time_ns(), stream, text))
+            self.cond.notify_all()
+
+    def event(self, name, action):
+        with self.cond:
+            if action == "start":
+                self.running[name] = True
+            elif action in ("die", "destroy"):
+                self.running[name] = False
+            if action == "destroy":
+                del self.logs[name]
+            self.events.append({"Type": "container", "Action": action, "timeNano": time.time_ns(),
+                                "Actor": {"ID": "x", "Attributes": {"name": name}}})
+            self.cond.notify_all()
+
+    def log_requests(self, name):
+        return [q for p, q in self.requests if p == f"/containers/{name}/logs"]
+
+    # ---- server side ----
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.srv.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _send(self, conn, data):
+        if self.tls is not None:
+            conn.sendall(b"%x\r\n%s\r\n" % (len(data), data) if self.chunked else data)
+            return
+        for i in range(0, len(data), 7):
+            piece = data[i:i + 7]
+            conn.sendall(b"%x\r\n%s\r\n" % (len(piece), piece) if self.chunked else piece)
+
+    def _headers(self, conn, ctype):
+        conn.sendall(f"HTTP/1.1 200 OK\r\nContent-Type: {ctype}\r\n".encode()
+                     + (b"Transfer-Encoding: chunked\r\n" if self.chunked else b"") + b"\r\n")
+
+    def _frame(self, ns, stream, text):
+        secs, frac = divmod(ns, 1_000_000_000)
+        line = (time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(secs)) + f".{frac:09d}Z {text}\n").encode()
+        return line if self.tty else struct.pack(">BxxxI", stream, len(line)) + line
+
+    def _handle(self, conn):
+        try:
+            if self.tls is not None:
+                conn = self.tls.wrap_socket(conn, server_side=True)
+            req = b""
+            while b"\r\n\r\n" not in req:
+                req += conn.recv(4096)
+            url = urlparse(req.split(b" ")[1].decode())
+            q = dict(parse_qsl(url.query))
+            self.requests.append((url.path, q))
+            if url.path == "/events":
+                self._serve_events(conn)
+            else:
+                with self.cond:
+                    self.open_logs += 1
+                try:
+                    self._serve_logs(conn, unquote(url.path.split("/")[2]), q)
+                finally:
+                    with self.cond:
+                        self.open_logs -= 1
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def _serve_events(self, conn):
+        self._headers(conn, "application/json")
+        i = len(self.events)
+        while True:
+            with self.cond:
+                while i >= len(self.events) and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                new, i = self.events[i:], len(self.events)
+            for ev in new:
+                self._send(conn, (json.dumps(ev) + "\n").encode())
+
+    def _serve_logs(self, conn, name, q):
+        status = self.errors.get(name, 200 if name in self.logs else 404)
+        if status != 200:
+            body = json.dumps({"message": f"No such container: {name}" if status == 404 else "boom"}).encode() + b"\n"
+            conn.sendall(b"HTTP/1.1 %d Error\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                         % (status, len(body), body))
+            return
+        self._headers(conn, "application/vnd.docker.raw-stream" if self.tty
+                      else "application/vnd.docker.multiplexed-stream")
+        with self.cond:
+            entries = self.logs[name]
+            if "since" in q:
+                secs, _, frac = q["since"].partition(".")
+                since = int(secs) * 1_000_000_000 + int(frac.ljust(9, "0"))
+                i = next((k for k, e in enumerate(entries) if e[0] >= since), len(entries))  # inclusive
+            else:
+                i = max(0, len(entries) - int(q.get("tail", len(entries))))
+        while True:
+            with self.cond:
+                while (i >= len(entries) and self.running.get(name) and not self.closed
+                       and self.logs.get(name) is entries):
+                    self.cond.wait()
+                if self.closed or self.logs.get(name) is not entries:
+                    return
+                new, i = entries[i:], len(entries)
+                running = self.running.get(name)
+            self._send(conn, b"".join(self._frame(*e) for e in new))
+            if not running:
+                break
+        if self.chunked:
+            conn.sendall(b"0\r\n\r\n")
+
+
+def wait_for(pred, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not pred():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def docker(tmp_path, monkeypatch, request):
+    monkeypatch.setattr(DockerLogMux, "RETRY_SECONDS", 0.2)
+    opts = getattr(request, "param", {})
+    api = FakeDockerAPI(str(tmp_path / "docker.sock"), **opts)
+    mux = DockerLogMux(base_url=f"unix://{api.path}", tail_lines=5)
+    yield api, mux
+    mux.stop()
+    api.close()
+
+
+def test_parse_ts_ns():
+    ts, rest = parse_ts_ns(b"2024-01-02T03:04:05.5Z hello")
+    assert ts == 1704164645_500000000 and rest == b"hello"
+    assert parse_ts_ns(b"no timestamp") == (None, b"no timestamp")
+
+
+@pytest.mark.parametrize("docker", [{"chunked": True}, {"chunked": False}], indirect=True)
+def test_multiplexed_stdout_stderr_frames_are_demuxed(docker):
+    api, mux = docker
+    api.create("node1")
+    for k in range(8):
+        api.log("node1", f"line {k}", stream=1 if k % 2 else 2)
+    feed = LogFeed("node1", tail_lines=5, mux=mux)
+    feed.start()
+    assert wait_for(lambda: feed.get_lines() == [f"line {k}" for k in range(3, 8)]), feed.get_lines()
+    api.log("node1", "x" * 100, stream=2)
+    api.log("node1", "after")
+    assert wait_for(lambda: feed.get_lines()[-2:] == ["x" * 100, "after"]), feed.get_lines()
+    assert api.log_requests("node1")[0]["tail"] == "5"
+
+
+@pytest.mark.parametrize("docker", [{"tty": True}], indirect=True)
+def test_tty_raw_stream(docker):
+    api, mux = docker
+    api.create("node1")
+    api.log("node1", "first")
+    api.log("node1", "second")
+    mux.add("node1")
+    mux.start()
+    assert wait_for(lambda: mux.get_lines("node1") == ["first", "second"]), mux.get_lines("node1")
+
+
+def test_since_resume_drops_the_inclusive_overlap(docker, monkeypatch):
+    api, mux = docker
+    monkeypatch.setattr(DockerLogMux, "RETRY_SECONDS", 60.0)  # only the start event reconnects
+    api.create("node1")
+    base = time.time_ns()
+    api.log("node1", "a", ns=base)
+    api.log("node1", "b", ns=base + 1000)
+    mux.add("node1")
+    mux.start()
+    assert wait_for(lambda: mux.get_lines("node1") == ["a", "b"])
+
+    api.event("node1", "die")  # stream ends; lines written while stopped must not be lost
+    assert wait_for(lambda: api.open_logs == 0)
+    api.log("node1", "c", ns=base + 2000)
+    api.event("node1", "start")
+    assert wait_for(lambda: mux.get_lines("node1") == ["a", "b", "c"]), mux.get_lines("node1")
+
+    # the reconnect asked for everything from "b" on; since is inclusive, so "b" came back and was dropped
+    first, resume = api.log_requests("node1")
+    assert "since" not in first
+    assert resume["since"] == log_feed.ns_to_since(base + 1000)
+    assert "tail" not in resume
+
+
+def test_start_and_destroy_events(docker):
+    api, mux = docker
+    mux.add("late")
+    mux.start()
+    # not created yet: the 404 body is an error, not a log line
+    assert wait_for(lambda: len(api.log_requests("late")) >= 1)
+    api.create("late")
+    api.log("late", "hello")
+    api.event("late", "start")
+    assert wait_for(lambda: mux.get_lines("late") == ["hello"]), mux.get_lines("late")
+
+    api.event("late", "destroy")
+    assert wait_for(lambda: mux.get_lines("late") == [])
+    api.create("late")
+    api.log("late", "fresh")
+    api.event("late", "start")
+    assert wait_for(lambda: mux.get_lines("late") == ["fresh"]), mux.get_lines("late")
+    # a recreated container starts from a fresh tail, not from the old `since`
+    assert "tail" in api.log_requests("late")[-1]
+
+
+def test_error_responses_never_become_log_lines(docker):
+    api, mux = docker
+    api.create("broken")
+    api.errors["broken"] = 500
+    mux.add("broken")
+    mux.add("missing")
+    mux.start()
+    assert wait_for(lambda: len(api.log_requests("broken")) >= 2 and len(api.log_requests("missing")) >= 2)
+    assert mux.get_lines("broken") == []
+    assert mux.get_lines("missing") == []
+
+
+def test_docker_address_schemes():
+    assert docker_address("unix:///var/run/docker.sock") == (socket.AF_UNIX, "/var/run/docker.sock")
+    assert docker_address("/tmp/d.sock") == (socket.AF_UNIX, "/tmp/d.sock")
+    assert docker_address("tcp://10.0.0.5:2376") == (socket.AF_INET, ("10.0.0.5", 2376))
+    assert docker_address("https://docker.local:2376/") == (socket.AF_INET, ("docker.local", 2376))
+    for url in ("ssh://user@host", "npipe:////./pipe/docker_engine", "tcp://nohost"):
+        with pytest.raises(ValueError):
+            docker_address(url)
+
+
+def test_tls_context_follows_docker_env(tmp_path):
+    assert docker_tls_context("unix:///var/run/docker.sock", {"DOCKER_TLS_VERIFY": "1"}) is None
+    assert docker_tls_context("tcp://h:2375", {}) is None
+    ctx = docker_tls_context("tcp://h:2376", {"DOCKER_CERT_PATH": str(tmp_path)})
+    assert ctx is not None and ctx.verify_mode == ssl.CERT_NONE
+    with pytest.raises(ValueError):
+        docker_tls_context("tcp://h:2376", {"DOCKER_TLS_VERIFY": "1", "DOCKER_CERT_PATH": str(tmp_path)})
+
+
+@pytest.mark.skipif(shutil.which("openssl") is None, reason="needs openssl to make a test certificate")
+def test_tls_daemon_from_env(tmp_path, monkeypatch):
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+                    "-keyout", str(tmp_path / "server-key.pem"), "-out", str(tmp_path / "ca.pem")],
+                   check=True, capture_output=True)
+    server_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_ctx.load_cert_chain(tmp_path / "ca.pem", tmp_path / "server-key.pem")
+    api = FakeDockerAPI(None, tls=server_ctx)
+    monkeypatch.setenv("DOCKER_HOST", api.path)
+    monkeypatch.setenv("DOCKER_TLS_VERIFY", "1")
+    monkeypatch.setenv("DOCKER_CERT_PATH", str(tmp_path))
+    mux = DockerLogMux()
+    try:
+        api.create("node1")
+        # spans several 16 KiB TLS records
+        lines = [f"{k:04d} " + "x" * 120 for k in range(400)]
+        for text in lines:
+            api.log("node1", text)
+        mux.add("node1", tail_lines=400)
+        mux.start()
+        assert wait_for(lambda: mux.get_lines("node1") == lines), len(mux.get_lines("node1"))
+    finally:
+        mux.stop()
+        api.close()
+
+
+def test_every_complete_line_is_capped(monkeypatch):
+    monkeypatch.setattr(log_feed._LogStream, "MAX_LINE", 8)
+    stream = log_feed._LogStream(None, None)
+    assert stream._split(b"short\n" + b"y" * 50 + b"\n" + b"z" * 50) == [b"short", b"y" * 8]
+    assert stream._split(b"\n") == [b"z" * 8]